@@ -0,0 +1,40 @@
+#! /usr/bin/env python
+'''NumericalAnswer benchmark.
+
+Reads the formatted values of many numerical answers the way a quiz build does:
+the units check in Question._add_answer, the Bb emitter (value and uncertainty),
+and an answer key (quantity), each more than once. The uncached case clears the
+answer's derived values before every read, which is what reading them used to cost.
+'''
+
+import os, sys, random, timeit, argparse
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) )
+
+from pyHomework.Answer import NumericalAnswer, Q_
+
+def reads( a, clear ):
+  for name in ['units','units','value','uncertainty','quantity','value','uncertainty','quantity']:
+    if clear:
+      a._derived = None
+    getattr( a, name )
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Time reading the formatted values of numerical answers.')
+  parser.add_argument('--answers', '-n', type=int, default=10000, help="Number of answers.")
+  parser.add_argument('--repeat', '-r', type=int, default=3, help="Number of timing repeats.")
+  args = parser.parse_args()
+
+  unit_names = ['m','m/s','m/s^2','N','J','kg m^2/s']
+  answers = [ NumericalAnswer( Q_( random.uniform(0.1,100), random.choice(unit_names) ) ) for i in range(args.answers) ]
+
+  def run( clear ):
+    for a in answers:
+      a._derived = None
+      reads( a, clear )
+
+  print "%d answers" % len(answers)
+  print "%-10s %10s %15s" % ('case','min (s)','per answer (us)')
+  for name,clear in [ ('uncached', True), ('cached', False) ]:
+    t = min( timeit.repeat( lambda : run( clear ), number=1, repeat=args.repeat ) )
+    print "%-10s %10.4f %15.1f" % (name, t, 1e6*t/len(answers))
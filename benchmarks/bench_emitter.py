@@ -0,0 +1,81 @@
+#! /usr/bin/env python
+'''Emitter dispatch benchmark.
+
+Compares the cached dispatch table in Emitter.__call__ with the old lookup,
+which walked the object's base classes on every call. The micro-benchmark
+dispatches on bare objects. The quiz benchmark emits a large multiple-choice quiz.
+'''
+
+import os, sys, timeit, argparse
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) )
+
+from pyHomework.Emitter import *
+
+def legacy_handler(self,obj):
+  if hasattr( self, obj.__class__.__name__ ):
+    return getattr(self, obj.__class__.__name__)
+
+  bases = list( get_bases( obj ) )
+  bases.reverse()
+  for b in bases:
+    if hasattr( self, b.__name__ ):
+      return getattr(self, b.__name__)
+
+  return getattr(self, 'Default')
+
+def legacy_call(self,obj):
+  handler = legacy_handler(self,obj)
+  if getattr( handler, 'streaming', False ):
+    return ''.join( handler(obj) )
+  return handler(obj)
+
+def legacy( emitter ):
+  return type( 'Legacy'+emitter.__name__, (emitter,), { '__call__' : legacy_call } )
+
+class Node(object): pass
+class Leaf(Node): pass
+class DeepLeaf(Leaf): pass
+
+class MicroEmitter(Emitter):
+  def Node(self,obj):
+    return obj
+
+def make_quiz( n ):
+  from pyHomework.Quiz import Quiz
+  from pyHomework.Answer import MultipleChoiceAnswer
+  quiz = Quiz()
+  for i in range(n):
+    with quiz._add_question('Question %d. What is the answer?'%i, fmt=False) as q:
+      a = MultipleChoiceAnswer()
+      a.add_choices('''
+      *one
+      two
+      three
+      ''')
+      with q._add_answer( a, fmt=False ):
+        pass
+  return quiz
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Time emitter dispatch.')
+  parser.add_argument('--calls', '-n', type=int, default=100000, help="Number of dispatches for the micro-benchmark.")
+  parser.add_argument('--questions', '-q', type=int, default=10000, help="Number of questions in the quiz benchmark.")
+  parser.add_argument('--repeat', '-r', type=int, default=3, help="Number of timing repeats.")
+  args = parser.parse_args()
+
+  objs = [ Node(), Leaf(), DeepLeaf() ]*(args.calls/3)
+  print "dispatch micro-benchmark (%d calls)" % len(objs)
+  print "%-12s %10s %14s" % ('emitter','total (s)','per call (us)')
+  for name,emitter in [ ('legacy', legacy(MicroEmitter)()), ('cached', MicroEmitter()) ]:
+    t = min( timeit.repeat( lambda : [ emitter(o) for o in objs ], number=1, repeat=args.repeat ) )
+    print "%-12s %10.4f %14.2f" % (name, t, 1e6*t/len(objs))
+
+  quiz = make_quiz( args.questions )
+  print
+  print "quiz emission (%d questions)" % args.questions
+  print "%-24s %10s" % ('emitter','total (s)')
+  for emitter in [ BbEmitter, LatexEmitter ]:
+    for name,e in [ ('legacy '+emitter.__name__, legacy(emitter)), ('cached '+emitter.__name__, emitter) ]:
+      t = min( timeit.repeat( lambda : quiz.emit(e), number=1, repeat=args.repeat ) )
+      print "%-24s %10.4f" % (name, t)
@@ -0,0 +1,35 @@
+#! /usr/bin/env python
+'''EquationsCollection construction benchmark.
+
+The equations and symbols are built the first time they are used. This compares
+building the collection, building it and using one equation, and building it and
+using every equation (which is what the constructor used to do).
+'''
+
+import os, sys, timeit, argparse
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) )
+
+from pyHomework.sympy.Equations import EquationsCollection
+
+def build_all():
+  e = EquationsCollection(snapshot=False)
+  for name in e._equations:
+    getattr( e, name )
+  return e
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Time EquationsCollection construction.')
+  parser.add_argument('--number', '-n', type=int, default=20, help="Number of collections to build for each case.")
+  parser.add_argument('--repeat', '-r', type=int, default=3, help="Number of timing repeats.")
+  args = parser.parse_args()
+
+  cases = [ ('constructor'        , lambda : EquationsCollection(snapshot=False))
+          , ('one equation'       , lambda : EquationsCollection(snapshot=False).LensEquation)
+          , ('every equation'     , build_all)
+          ]
+
+  print "%-16s %14s" % ('case','per build (ms)')
+  for name,func in cases:
+    t = min( timeit.repeat( func, number=args.number, repeat=args.repeat ) )
+    print "%-16s %14.3f" % (name, 1e3*t/args.number)
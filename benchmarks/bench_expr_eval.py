@@ -0,0 +1,46 @@
+#! /usr/bin/env python
+'''expr_eval benchmark.
+
+Evaluates an expression for a set of random parameter sets with sy.lambdify
+called for every evaluation (what expr_eval used to do), with the compiled
+function cache, and with one batched call.
+'''
+
+import os, sys, random, timeit, argparse
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) )
+
+import sympy as sy
+from pyHomework.sympy.Utils import expr_eval, expr_eval_batch, lambdify_cache
+
+def legacy_expr_eval( expr, context ):
+  symbols = context.keys()
+  vals = [ context[k] for k in symbols ]
+  f = sy.lambdify( symbols, expr, "numpy" )
+  return f( *vals )
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Time expr_eval for many parameter sets.')
+  parser.add_argument('--contexts', '-n', type=int, default=500, help="Number of parameter sets.")
+  parser.add_argument('--repeat', '-r', type=int, default=3, help="Number of timing repeats.")
+  args = parser.parse_args()
+
+  mu0, i, R, z = sy.symbols(r'\mu_0 i R z')
+  expr = (mu0 * R**2 * i) / ( 2*sy.sqrt(R**2 + z**2)**3 )
+  contexts = [ { mu0 : 4e-7*3.14159, i : random.uniform(1,10), R : random.uniform(0.1,1), z : random.uniform(0,1) } for n in range(args.contexts) ]
+
+  def cold_run():
+    lambdify_cache.clear()
+    return [ expr_eval( expr, c ) for c in contexts ]
+
+  cases = [ ('lambdify per call', lambda : [ legacy_expr_eval( expr, c ) for c in contexts ])
+          , ('cached (cold)'    , cold_run)
+          , ('cached (warm)'    , lambda : [ expr_eval( expr, c ) for c in contexts ])
+          , ('batch'            , lambda : expr_eval_batch( expr, contexts ))
+          ]
+
+  print "%d parameter sets" % len(contexts)
+  print "%-18s %10s %14s" % ('case','min (s)','per set (us)')
+  for name,func in cases:
+    t = min( timeit.repeat( func, number=1, repeat=args.repeat ) )
+    print "%-18s %10.4f %14.1f" % (name, t, 1e6*t/len(contexts))
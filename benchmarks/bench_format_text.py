@@ -0,0 +1,64 @@
+#! /usr/bin/env python
+'''format_text benchmark.
+
+Formats a set of question sized text fragments with the compiled template
+cache and with the pyparsing grammar that format_text used to build on every call.
+'''
+
+import os, sys, timeit, argparse
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) )
+
+import pyparsing as pp
+from pyHomework.Utils import format_text, _template_cache
+
+def pyparsing_format_text(text, delimiters=('{','}'), **context):
+  def replaceToken(text, loc, toks):
+    try:
+      return ('{'+toks[1]+'}').format(**context)
+    except Exception:
+      return None
+  token = pp.Literal(delimiters[0]) + pp.SkipTo(pp.Literal(delimiters[1]), failOn=pp.Literal(delimiters[0])) + pp.Literal(delimiters[1])
+  token.setParseAction(replaceToken)
+  return token.transformString( text )
+
+def make_texts( n ):
+  texts = []
+  for i in range(n):
+    texts.append( r'A \SI{%d}{\kilo\gram} mass is moving at {v:.2f} when it hits a spring with constant {k}. (variant %d)' % (i,i%10) )
+    texts.append( r'Give your answer in {units}.' )
+  return texts
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Time format_text.')
+  parser.add_argument('--fragments', '-n', type=int, default=1000, help="Number of distinct question texts.")
+  parser.add_argument('--repeat', '-r', type=int, default=3, help="Number of timing repeats.")
+  args = parser.parse_args()
+
+  texts = make_texts( args.fragments )
+  context = { 'v' : 2.5, 'k' : '10 N/m', 'units' : 'meter' }
+
+  def pyparsing_run():
+    for t in texts:
+      pyparsing_format_text( t, **context )
+  def cold_run():
+    _template_cache.clear()
+    for t in texts:
+      format_text( t, **context )
+  def warm_run():
+    for t in texts:
+      format_text( t, **context )
+
+  # format_text prints warnings for the fields it can't replace
+  stdout = sys.stdout
+  sys.stdout = open(os.devnull,'w')
+  try:
+    results = [ (name, min( timeit.repeat( func, number=1, repeat=args.repeat ) ))
+                for name,func in [ ('pyparsing', pyparsing_run), ('compiled (cold)', cold_run), ('compiled (warm)', warm_run) ] ]
+  finally:
+    sys.stdout = stdout
+
+  print "%d fragments" % len(texts)
+  print "%-16s %10s %14s" % ('case','total (s)','per call (us)')
+  for name,t in results:
+    print "%-16s %10.4f %14.1f" % (name, t, 1e6*t/len(texts))
@@ -0,0 +1,39 @@
+#! /usr/bin/env python
+'''Cold-start import time benchmark.
+
+Each measurement runs in a fresh interpreter so that nothing is cached in
+sys.modules. The "lazy" case is what scripts like QuizGen pay, the "eager" case
+forces the sympy and numpy layers to load (this is what every import cost before
+they were made lazy).
+'''
+
+import os, sys, subprocess, timeit, argparse
+
+root = os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) )
+
+cases = [ ('lazy'      , 'import pyHomework')
+        , ('quiz'      , 'from pyHomework.Quiz import BbQuiz')
+        , ('eager'     , 'from pyHomework import *')
+        , ('equations' , 'import pyHomework; pyHomework.EquationsCollection')
+        ]
+
+def run( code, n ):
+  env = dict(os.environ)
+  env['PYTHONPATH'] = os.pathsep.join( [root, env.get('PYTHONPATH','')] )
+  times = []
+  for i in range(n):
+    t = timeit.default_timer()
+    subprocess.check_call( [sys.executable, '-c', code], env=env )
+    times.append( timeit.default_timer() - t )
+  return times
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Time cold imports of pyHomework.')
+  parser.add_argument('--repeat', '-n', type=int, default=5, help="Number of fresh interpreters to time for each case.")
+  args = parser.parse_args()
+
+  baseline = min( run('pass', args.repeat) )
+  print "%-10s %10s %10s" % ('case','min (s)','median (s)')
+  for name,code in cases:
+    times = sorted( [ t - baseline for t in run(code, args.repeat) ] )
+    print "%-10s %10.3f %10.3f" % (name, times[0], times[len(times)/2])
@@ -0,0 +1,64 @@
+#! /usr/bin/env python
+'''BbQuiz macro expansion benchmark.
+
+Expands the macros in a generated quiz text with BbQuiz.expand_macros and with
+the old expansion loop, which built the pyparsing macro grammar on every write
+and ran it over the whole text until nothing changed.
+'''
+
+import os, sys, re, shutil, tempfile, timeit, argparse
+
+root = os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) )
+sys.path.insert( 0, root )
+
+import pyparsing as pp
+from pyHomework.Quiz import BbQuiz
+
+def legacy_expand_macros( quiz, text ):
+  def expand_macro(toks):
+    options   = [ str(o)[1:-1] for o in toks.options ]
+    arguments = [ str(x)[1:-1] for x in toks.arguments ]
+    return quiz.expand_macro( str(toks.command), options, arguments )
+
+  command = pp.Word(pp.alphas)
+  options = pp.originalTextFor( pp.nestedExpr( '[', ']' ) )
+  arguments = pp.originalTextFor( pp.nestedExpr( '{', '}' ) )
+
+  macro = pp.Combine( pp.Literal("\\") + command("command") + pp.ZeroOrMore(options)("options") + pp.ZeroOrMore(arguments)("arguments") )
+  macro.setParseAction( expand_macro )
+
+  while True:
+    newtext = macro.transformString( text )
+    if newtext == text:
+      break
+    text = newtext
+  return text
+
+def make_quiz_text( n, image ):
+  lines = []
+  for i in range(n):
+    lines.append( r'MC	Question %d: which \emph{one} of these is \textbf{\emph{correct}}? \includegraphics[width=100]{%s}	\textbf{this}	correct	\vec{F} = m\vec{a}	incorrect' % (i,image) )
+  return '\n'.join(lines)
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Time BbQuiz macro expansion.')
+  parser.add_argument('--questions', '-n', type=int, default=1000, help="Number of questions. Each one has five macros that are expanded and two that are not.")
+  parser.add_argument('--repeat', '-r', type=int, default=3, help="Number of timing repeats.")
+  args = parser.parse_args()
+
+  d = tempfile.mkdtemp()
+  try:
+    image = os.path.join( d, 'image.png' )
+    shutil.copy( os.path.join( root, 'testing', 'test1.png' ), image )
+    text = make_quiz_text( args.questions, image )
+    quiz = BbQuiz()
+
+    assert legacy_expand_macros( quiz, text ) == quiz.expand_macros( text )
+
+    print "%d questions, %d macros" % (args.questions, 7*args.questions)
+    print "%-10s %10s" % ('case','min (s)')
+    # the legacy loop is slow, so it is only timed once
+    for name,func,repeat in [ ('legacy', lambda : legacy_expand_macros( quiz, text ), 1), ('current', lambda : quiz.expand_macros( text ), args.repeat) ]:
+      print "%-10s %10.4f" % (name, min( timeit.repeat( func, number=1, repeat=repeat ) ))
+  finally:
+    shutil.rmtree(d)
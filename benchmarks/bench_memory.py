@@ -0,0 +1,68 @@
+#! /usr/bin/env python
+'''Question bank memory benchmark.
+
+Builds a bank of questions in a fresh interpreter and reports the growth of the
+resident set size per question. Each question has text, an instruction, a scratch
+variable, a multiple choice or numerical answer and (for every other question) a part.
+Pass --baseline with the path of another checkout (i.e. made with git worktree) to
+measure it too.
+'''
+
+import os, sys, subprocess, argparse
+
+root = os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) )
+
+code = r'''
+import sys, gc, resource
+from pyHomework.Question import Question
+from pyHomework.Answer import NumericalAnswer, MultipleChoiceAnswer, Q_
+
+def rss():
+  with open('/proc/self/statm') as f:
+    return int( f.read().split()[1] )*resource.getpagesize()
+
+n = int(sys.argv[1])
+values = [ Q_(i,'m') for i in range(100) ]
+choices = '\n'.join( [ '*correct', 'wrong', 'also wrong', 'not even close' ] )
+
+gc.collect()
+start = rss()
+bank = []
+for i in range(n):
+  q = Question('Question %d: how long is the rod?' % i)
+  q.add_instruction('Ignore friction.')
+  q.scratch.L = values[i%100]
+  if i % 2:
+    a = MultipleChoiceAnswer()
+    a.add_choices( choices )
+  else:
+    a = NumericalAnswer( values[i%100] )
+  with q._add_answer( a ):
+    pass
+  if i % 2 == 0:
+    with q._add_part('How long is half of it?') as p:
+      pass
+  bank.append( q )
+gc.collect()
+print float( rss()-start )/n
+'''
+
+def run( path, n ):
+  env = dict(os.environ)
+  env['PYTHONPATH'] = os.pathsep.join( [path, env.get('PYTHONPATH','')] )
+  return float( subprocess.check_output( [sys.executable, '-c', code, str(n)], env=env, cwd=path ).split()[-1] )
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Measure the memory used per question in a question bank.')
+  parser.add_argument('--questions', '-n', type=int, default=50000, help="Number of questions in the bank.")
+  parser.add_argument('--baseline', '-b', help="Path to another checkout to measure for comparison.")
+  args = parser.parse_args()
+
+  cases = [ ('current', root) ]
+  if args.baseline:
+    cases.insert( 0, ('baseline', os.path.abspath( args.baseline )) )
+
+  print "%d questions" % args.questions
+  print "%-10s %20s" % ('case','bytes per question')
+  for name,path in cases:
+    print "%-10s %20.0f" % (name, run( path, args.questions ))
@@ -0,0 +1,64 @@
+#! /usr/bin/env python
+'''Question pool benchmark.
+
+Draws a quiz of questions by topic and difficulty from a bank of questions. The
+bank is either a JSON file of question specs that is loaded and filtered as a
+whole, or a QuestionPool, which only reads the index and the rows it draws.
+'''
+
+import os, sys, json, random, tempfile, shutil, timeit, argparse
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) )
+
+from pyHomework.Quiz import BbQuiz
+from pyHomework.Pool import QuestionPool
+
+topics = [ 'kinematics', 'forces', 'energy', 'momentum', 'rotation', 'gravity', 'fluids', 'waves', 'heat', 'optics' ]
+
+def make_spec( i ):
+  return { 'text' : 'Question %d: a ball is thrown at some speed and angle. How far does it go?' % i
+         , 'instructions' : 'Ignore air resistance.'
+         , 'answer' : { 'choices' : [ '*%d m' % i, '%d m' % (i+1), '%d m' % (i+2), '%d m' % (i+3) ] }
+         , 'tags' : [ topics[i%len(topics)] ]
+         , 'difficulty' : 1 + (i//len(topics))%5 }
+
+def draw_from_file( fn, n, tag, difficulty ):
+  with open( fn ) as f:
+    bank = json.load( f )
+  matches = [ s for s in bank if tag in s['tags'] and difficulty[0] <= s['difficulty'] <= difficulty[1] ]
+  quiz = BbQuiz()
+  quiz.load( { 'questions' : random.sample( matches, n ) } )
+  return quiz
+
+def draw_from_pool( fn, n, tag, difficulty ):
+  with QuestionPool( fn ) as pool:
+    quiz = BbQuiz()
+    pool.draw_into( quiz, n, tags=tag, difficulty=difficulty )
+  return quiz
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Time drawing questions from a question bank.')
+  parser.add_argument('--questions', '-n', type=int, default=50000, help="Number of questions in the bank.")
+  parser.add_argument('--draw', '-d', type=int, default=20, help="Number of questions to draw.")
+  parser.add_argument('--repeat', '-r', type=int, default=3, help="Number of timing repeats.")
+  args = parser.parse_args()
+
+  d = tempfile.mkdtemp()
+  try:
+    specs = [ make_spec(i) for i in range(args.questions) ]
+    json_fn = os.path.join( d, 'bank.json' )
+    with open( json_fn, 'w' ) as f:
+      json.dump( specs, f )
+    pool_fn = os.path.join( d, 'bank.db' )
+    start = timeit.default_timer()
+    with QuestionPool( pool_fn ) as pool:
+      pool.add_many( specs )
+    build = timeit.default_timer() - start
+
+    print "%d questions, drawing %d (built the pool in %.2f s)" % (args.questions, args.draw, build)
+    print "%-10s %10s" % ('case','min (s)')
+    for name,func,fn in [ ('json file', draw_from_file, json_fn), ('pool', draw_from_pool, pool_fn) ]:
+      t = min( timeit.repeat( lambda : func( fn, args.draw, 'energy', (2,3) ), number=1, repeat=args.repeat ) )
+      print "%-10s %10.4f" % (name, t)
+  finally:
+    shutil.rmtree( d )
@@ -0,0 +1,59 @@
+#! /usr/bin/env python
+'''quantity_calcs benchmark.
+
+Computes the dot product, cross product, magnitude and direction of many random
+vectors, one vector at a time with the old functions (a Python sum over the
+components) and with one call on an array of vectors.
+'''
+
+import os, sys, random, timeit, argparse
+import numpy as np
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) )
+
+from pyHomework.numpy.quantity_calcs import make_vec, dot, cross, magnitude, direction, unitof, magof, Q_
+
+def legacy_dot(v1,v2):
+  return sum( [ x[0]*x[1] for x in zip(v1,v2) ] )
+
+def legacy_cross(v1,v2):
+  return np.cross(v1,v2)*Q_(1,unitof(v1))*Q_(1,unitof(v2))
+
+def legacy_magnitude( vec ):
+  return np.sqrt( legacy_dot( vec, vec ) )
+
+def legacy_direction( vec ):
+  ret = np.arctan2( vec[1], vec[0] )
+  if ret < Q_(0,'radian'):
+    ret += Q_(2*3.14159,'radian')
+  return ret
+
+def legacy_make_vec( components ):
+  u = unitof( components[0] )
+  return Q_( [ magof(x.to(u)) for x in components ], u )
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Time quantity_calcs for many vectors.')
+  parser.add_argument('--vectors', '-n', type=int, default=200, help="Number of vectors.")
+  parser.add_argument('--repeat', '-r', type=int, default=3, help="Number of timing repeats.")
+  args = parser.parse_args()
+
+  comps = [ [ random.uniform(-10,10) for i in range(3) ] for n in range(args.vectors) ]
+
+  def per_vector():
+    for x,y,z in comps:
+      v = legacy_make_vec( [Q_(x,'m'), Q_(y,'m'), Q_(z,'m')] )
+      F = legacy_make_vec( [Q_(y,'N'), Q_(z,'N'), Q_(x,'N')] )
+      legacy_dot(v,F), legacy_cross(v,F), legacy_magnitude(v), legacy_direction(v)
+
+  def batch():
+    x,y,z = np.array( comps ).T
+    v = make_vec( [Q_(x,'m'), Q_(y,'m'), Q_(z,'m')] )
+    F = make_vec( [Q_(y,'N'), Q_(z,'N'), Q_(x,'N')] )
+    dot(v,F), cross(v,F), magnitude(v), direction(v)
+
+  print "%d vectors" % args.vectors
+  print "%-12s %10s %15s" % ('case','min (s)','per vector (us)')
+  for name,func in [ ('per vector', per_vector), ('batch', batch) ]:
+    t = min( timeit.repeat( func, number=1, repeat=args.repeat ) )
+    print "%-12s %10.4f %15.1f" % (name, t, 1e6*t/args.vectors)
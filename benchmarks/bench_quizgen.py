@@ -0,0 +1,131 @@
+#! /usr/bin/env python
+'''QuizGen markdown parser benchmark.
+
+Parses generated quiz files of increasing size with parse_markdown and with
+the old parser, which tried every pyparsing grammar on every line and searched
+the spec with dpath to count the questions. The old parser is only run on
+quizzes up to --legacy-max questions, because it is quadratic in quiz size.
+'''
+
+import os, sys, re, imp, timeit, argparse, StringIO
+
+root = os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) )
+sys.path.insert( 0, root )
+
+import dpath.util
+import pyparsing as parse
+
+QuizGen = imp.load_source( 'QuizGen', os.path.join( root, 'scripts', 'QuizGen.py' ) )
+
+def legacy_parse_markdown( fh ):
+  text = fh.read()
+  text = re.sub( re.compile('^\s{0,3}([0-9]+\.)', re.M), '1.', text )
+  text = re.sub( re.compile('^\s{4,7}([0-9]+\.)', re.M), '    a.', text )
+  text = re.sub( re.compile('\s*#.*$', re.M),'',text)
+  text = re.sub( re.compile('\s*[^#]#.*$', re.M),'',text)
+  for qc,rep in [ (r'**', r'\textbf{%s}')
+                , (r'*', r'\emph{%s}')
+                ]:
+    text = parse.QuotedString(quoteChar=qc,convertWhitespaceEscapes=False).setParseAction(lambda toks: rep%toks[0]).transformString( text )
+
+  parsers = { 'question'   : parse.Suppress(parse.Word(parse.nums)+'.'+parse.White()) + parse.restOfLine
+            , 'mc_answer'  : parse.Suppress(parse.Word(parse.alphas)+'.'+parse.White()) + parse.restOfLine
+            , 'num_answer' : parse.Suppress(parse.White()+parse.Literal('answer')+parse.Optional(parse.White())+':'+parse.Optional(parse.White())) + parse.restOfLine
+            , 'config_var' : parse.Word(parse.alphanums+'/_')+parse.Suppress(':'+parse.White())+parse.restOfLine
+            }
+
+  spec = dict()
+  path = None
+  stage = list()
+
+  def get(path):
+    vals = dpath.util.values(spec, path)
+    if len(vals) > 0:
+      return vals[0]
+    return {}
+
+  def set(path, v):
+    return dpath.util.new(spec, path, v)
+
+  def matches( line ):
+    matches = 0
+    for k in parsers:
+      try:
+        parsers[k].parseString(line)
+        matches += 1
+      except:
+        pass
+    return matches > 0
+
+  lines = text.split('\n')
+  lines.append("finished: true")
+  for line in lines:
+    matched = matches(line)
+    if matched and path:
+      set( path, "".join(stage) )
+      stage = list()
+
+    try:
+      var,val = parsers['config_var'].parseString(line)
+      if not var == 'answer':
+        dpath.util.new( spec, var.lower(), val )
+        continue
+    except:
+      pass
+
+    try:
+      line = parsers['question'].parseString(line)[0]
+      path = [ "questions", len(get("questions")), "text" ]
+    except:
+      pass
+
+    try:
+      line = parsers['mc_answer'].parseString(line)[0]
+      path =[ "questions", len(get("questions"))-1, "answer", "choices" ]
+      path.append( len( get(path) ) )
+    except:
+      pass
+
+    try:
+      line = parsers['num_answer'].parseString(line)[0]
+      path =[ "questions", len(get("questions"))-1, "answer", "value" ]
+    except:
+      pass
+
+    if line:
+      stage.append(line)
+
+  return spec
+
+def make_quiz_text( n ):
+  lines = [ 'title : Benchmark Quiz', 'configuration/make_key : True', '' ]
+  for i in range(n):
+    if i % 2:
+      lines.append( '# numerical answer' )
+      lines.append( '1. (Numerical Answer) A **%d kg** mass moves at *%d m/s*. What is its momentum?' % (i,i%10) )
+      lines.append( '   Give your answer in SI units.' )
+      lines.append( '   answer : %d kg m/s' % (i*(i%10)) )
+    else:
+      lines.append( '1. (Multiple Choice) Which of these is question %d about?' % i )
+      lines.append( '    a. ^this one' )
+      lines.append( '    a. not this one' )
+      lines.append( '    a. not this one either' )
+    lines.append( '' )
+  return '\n'.join(lines)
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Time the QuizGen markdown parser.')
+  parser.add_argument('--sizes', '-s', type=int, nargs='+', default=[100,1000,10000], help="Quiz sizes (number of questions) to parse.")
+  parser.add_argument('--legacy-max', type=int, default=100, help="Largest quiz to parse with the old parser.")
+  parser.add_argument('--repeat', '-r', type=int, default=3, help="Number of timing repeats.")
+  args = parser.parse_args()
+
+  print "%-10s %12s %12s" % ('questions','current (s)','legacy (s)')
+  for n in args.sizes:
+    text = make_quiz_text( n )
+    t = min( timeit.repeat( lambda : QuizGen.parse_markdown( StringIO.StringIO(text) ), number=1, repeat=args.repeat ) )
+    if n <= args.legacy_max:
+      tl = "%12.4f" % min( timeit.repeat( lambda : legacy_parse_markdown( StringIO.StringIO(text) ), number=1, repeat=1 ) )
+    else:
+      tl = "%12s" % '-'
+    print "%-10d %12.4f %s" % (n, t, tl)
@@ -0,0 +1,92 @@
+#! /usr/bin/env python
+'''Signal benchmark.
+
+Compares Signal with the old implementation, which kept the slots in a list:
+connecting and disconnecting n method slots (the old connect and disconnect
+scanned the list), and calling a signal with no slots and with a few slots.
+'''
+
+import os, sys, timeit, argparse, inspect
+from weakref import ref
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) )
+
+from pyHomework.Signal import Signal, WeakMethod
+
+class LegacySignal:
+    def __init__(self):
+        self.slots = []
+        self.funchost = []
+
+    def __call__(self, *args, **kwargs):
+        r = []
+        for i, slot in enumerate(self.slots):
+            if slot != None:
+                rr = slot(*args, **kwargs)
+                if not rr is None:
+                  r.append( rr )
+            else:
+                del self.slots[i]
+        return r
+
+    def connect(self, slot):
+        self.disconnect(slot)
+        if inspect.ismethod(slot):
+            self.slots.append(WeakMethod(slot))
+        else:
+            o = _WeakMethod_FuncHost(slot)
+            self.slots.append(WeakMethod(o.func))
+            self.funchost.append(o)
+
+    def disconnect(self, slot):
+        try:
+            for i, wm in enumerate(self.slots):
+                if inspect.ismethod(slot):
+                    if wm.f == slot.im_func and wm.c() == slot.im_self:
+                        del self.slots[i]
+                        return
+                else:
+                    if wm.c().hostedFunction == slot:
+                        del self.slots[i]
+                        return
+        except:
+            pass
+
+class _WeakMethod_FuncHost:
+    def __init__(self, func):
+        self.hostedFunction = func
+    def func(self, *args, **kwargs):
+        return self.hostedFunction(*args, **kwargs)
+
+class Listener(object):
+  def slot(self, i, question):
+    return None
+
+def connect_disconnect( cls, listeners ):
+  sig = cls()
+  for l in listeners:
+    sig.connect( l.slot )
+  for l in listeners:
+    sig.disconnect( l.slot )
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Time Signal against the old list based implementation.')
+  parser.add_argument('--slots', '-n', type=int, default=1000, help="Number of slots to connect and disconnect.")
+  parser.add_argument('--calls', type=int, default=100000, help="Number of signal calls.")
+  parser.add_argument('--repeat', '-r', type=int, default=3, help="Number of timing repeats.")
+  args = parser.parse_args()
+
+  listeners = [ Listener() for i in range(args.slots) ]
+
+  print "%-32s %12s %12s" % ('case','legacy (s)','current (s)')
+  row = [ min( timeit.repeat( lambda : connect_disconnect( cls, listeners ), number=1, repeat=args.repeat ) ) for cls in [LegacySignal,Signal] ]
+  print "%-32s %12.4f %12.4f" % tuple( ['connect+disconnect %d slots' % args.slots] + row )
+
+  for nslots in [0,3]:
+    row = list()
+    for cls in [LegacySignal,Signal]:
+      sig = cls()
+      for l in listeners[:nslots]:
+        sig.connect( l.slot )
+      row.append( min( timeit.repeat( lambda : sig(i=1,question=None), number=args.calls, repeat=args.repeat ) ) )
+    print "%-32s %12.4f %12.4f" % tuple( ['%d calls, %d slots' % (args.calls,nslots)] + row )
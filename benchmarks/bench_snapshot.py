@@ -0,0 +1,58 @@
+#! /usr/bin/env python
+'''Equations snapshot benchmark.
+
+Times how long a fresh interpreter takes to evaluate a few equations (after
+importing sympy), and counts the calls to sy.solve. The cold case starts with an empty
+cache directory, the warm case uses the snapshot written by the cold run.
+'''
+
+import os, sys, subprocess, tempfile, shutil, argparse
+
+root = os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) )
+
+code = r'''
+import timeit
+from pyHomework.sympy import Equations
+start = timeit.default_timer()
+solve = Equations.sy.solve
+calls = []
+def counting_solve(*args,**kwargs):
+  calls.append(args)
+  return solve(*args,**kwargs)
+Equations.sy.solve = counting_solve
+
+e = Equations.EquationsCollection()
+s = e.s
+e.eval( e.LensEquation, s.di, { s.do : 2., s.f : 1.5 } )
+e.eval( e.MagneticFieldCircularLoop, s.i, { s.B : 1e-5, s.mu0_ : 1.2566e-6, s.R : 0.1, s.z : 0.2 } )
+e.eval( e.SnellsLaw, s.thr, { s.ni : 1., s.nr : 1.33, s.thi : 0.5 } )
+e.eval( e.RLVoltageRise, s.t, { s.v : 1., s.Vp : 2., s.L : 1., s.R : 10. } )
+print timeit.default_timer() - start, len(calls)
+'''
+
+def run( cache_dir ):
+  env = dict(os.environ)
+  env['PYTHONPATH'] = os.pathsep.join( [root, env.get('PYTHONPATH','')] )
+  env['PYHOMEWORK_CACHE_DIR'] = cache_dir
+  t,calls = subprocess.check_output( [sys.executable, '-c', code], env=env ).split()
+  return float(t),int(calls)
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Time a fresh process evaluating equations with and without the snapshot.')
+  parser.add_argument('--repeat', '-n', type=int, default=3, help="Number of fresh interpreters to time for each case.")
+  args = parser.parse_args()
+
+  d = tempfile.mkdtemp()
+  try:
+    cold = []
+    for i in range(args.repeat):
+      shutil.rmtree( d )
+      os.mkdir( d )
+      cold.append( run( d ) )
+    warm = [ run( d ) for i in range(args.repeat) ]
+  finally:
+    shutil.rmtree( d )
+
+  print "%-6s %10s %12s" % ('case','min (s)','solve calls')
+  for name,results in [ ('cold', cold), ('warm', warm) ]:
+    print "%-6s %10.3f %12d" % (name, min( t for t,n in results ), max( n for t,n in results ))
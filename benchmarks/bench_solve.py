@@ -0,0 +1,43 @@
+#! /usr/bin/env python
+'''EquationsCollection.eval benchmark.
+
+Evaluates a few equations from the collection many times with different values,
+like an assignment that builds a question from the same equation repeatedly.
+The uncached case sets the size of the solution cache to zero, so every
+call runs sy.solve again.
+'''
+
+import os, sys, timeit, argparse
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) )
+
+from pyHomework.sympy.Equations import EquationsCollection, solve_cache
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Time EquationsCollection.eval with and without the solution cache.')
+  parser.add_argument('--calls', '-n', type=int, default=100, help="Number of evaluations of each equation.")
+  parser.add_argument('--repeat', '-r', type=int, default=3, help="Number of timing repeats.")
+  args = parser.parse_args()
+
+  e = EquationsCollection(snapshot=False)
+  s = e.s
+  cases = [ (e.LensEquation    , s.di, { s.do : 2., s.f : 1.5 })
+          , (e.KineticEnergy   , s.v , { s.K : 10., s.m : 2. })
+          , (e.SnellsLaw       , s.thr, { s.ni : 1., s.nr : 1.33, s.thi : 0.5 })
+          , (e.CoulombForce    , s.r , { s.F : 1., s.k_ : 8.99e9, s.qi[1] : 1e-6, s.qi[2] : 2e-6 })
+          ]
+
+  def run():
+    for i in range(args.calls):
+      for eq,var,context in cases:
+        e.eval( eq, var, context )
+
+  maxsize = solve_cache.maxsize
+  print "%d evaluations" % (args.calls*len(cases))
+  print "%-10s %10s %14s" % ('case','min (s)','per call (ms)')
+  for name,size in [ ('uncached', 0), ('cached', maxsize) ]:
+    solve_cache.clear()
+    solve_cache.maxsize = size
+    t = min( timeit.repeat( run, number=1, repeat=args.repeat ) )
+    print "%-10s %10.4f %14.3f" % (name, t, 1e3*t/(args.calls*len(cases)))
+  print "cache hits: %d, misses: %d" % (solve_cache.hits, solve_cache.misses)
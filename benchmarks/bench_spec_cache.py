@@ -0,0 +1,41 @@
+#! /usr/bin/env python
+'''QuizGen parsed spec cache benchmark.
+
+Times load_spec (read, render and parse a quiz file) on generated quiz files of
+increasing size. The cold case starts with an empty cache directory, the warm case
+reads the spec cached by the cold run.
+'''
+
+import os, sys, imp, timeit, tempfile, shutil, argparse
+
+root = os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) )
+sys.path.insert( 0, root )
+
+QuizGen = imp.load_source( 'QuizGen', os.path.join( root, 'scripts', 'QuizGen.py' ) )
+bench_quizgen = imp.load_source( 'bench_quizgen', os.path.join( root, 'benchmarks', 'bench_quizgen.py' ) )
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Time loading quiz files with a cold and a warm spec cache.')
+  parser.add_argument('--sizes', '-s', type=int, nargs='+', default=[100,1000,10000], help="Quiz sizes (number of questions) to load.")
+  parser.add_argument('--render', action='store_true', help="Render the quiz files as templates too.")
+  parser.add_argument('--repeat', '-r', type=int, default=3, help="Number of timing repeats.")
+  args = parser.parse_args()
+
+  d = tempfile.mkdtemp()
+  os.environ['PYHOMEWORK_CACHE_DIR'] = os.path.join( d, 'cache' )
+  load_args = argparse.Namespace( render=args.render, cache=True )
+  try:
+    print "%-10s %10s %10s" % ('questions','cold (s)','warm (s)')
+    for n in args.sizes:
+      fn = os.path.join( d, 'quiz-%d.md' % n )
+      with open( fn, 'w' ) as f:
+        f.write( bench_quizgen.make_quiz_text( n ) )
+
+      cold = []
+      for i in range(args.repeat):
+        shutil.rmtree( os.environ['PYHOMEWORK_CACHE_DIR'], ignore_errors=True )
+        cold.append( min( timeit.repeat( lambda : QuizGen.load_spec( fn, load_args ), number=1, repeat=1 ) ) )
+      warm = min( timeit.repeat( lambda : QuizGen.load_spec( fn, load_args ), number=1, repeat=args.repeat ) )
+      print "%-10d %10.4f %10.4f" % (n, min(cold), warm)
+  finally:
+    shutil.rmtree( d )
@@ -0,0 +1,90 @@
+#! /usr/bin/env python
+'''Streaming BbQuiz.write benchmark.
+
+Writes a quiz with an embedded image in every question to /dev/null with
+BbQuiz.write, which expands and writes one question at a time, and with the
+old write, which emitted the whole quiz into one string and expanded the macros
+in it. Each case runs in a forked process and the growth in peak memory
+(resident set size) during the write is reported.
+'''
+
+import os, sys, resource, tempfile, shutil, timeit, argparse
+import cPickle as pickle
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) )
+
+from pyHomework.Quiz import BbQuiz
+from pyHomework.Answer import MultipleChoiceAnswer
+
+def legacy_write( quiz, stream ):
+  text = quiz.emit()
+  text = quiz.math_pattern.sub( lambda m: r'\math{%s}'%m.group(0)[1:-1], text )
+  quiz.render_math( quiz.collect_math( text ) )
+  text = quiz.expand_macros( text )
+  for line in text.split('\n'):
+    if line.startswith('MC') or line.startswith('MA'):
+      if not "\tcorrect" in line:
+        print "WARNING: A multiple choice/answer question does not have a correct answer."
+  stream.write( text )
+
+def streaming_write( quiz, stream ):
+  quiz.write( stream )
+
+def make_quiz( n, image ):
+  quiz = BbQuiz()
+  for i in range(n):
+    with quiz._add_question(r'Question %d: which \emph{one} of these is correct? \includegraphics{%s}'%(i,image), fmt=False) as q:
+      a = MultipleChoiceAnswer()
+      a.add_choices('''
+      *one
+      two
+      ''')
+      with q._add_answer( a, fmt=False ):
+        pass
+  return quiz
+
+def rss():
+  with open('/proc/self/statm') as f:
+    return int( f.read().split()[1] )*resource.getpagesize()/1024
+
+def run( write, quiz, repeat ):
+  '''Run a write in a child process. Returns the time and the growth of the peak memory in kB.'''
+  r,w = os.pipe()
+  pid = os.fork()
+  if pid == 0:
+    os.close(r)
+    with open(os.devnull,'w') as stream:
+      start = rss()
+      t = min( timeit.repeat( lambda : write( quiz, stream ), number=1, repeat=repeat ) )
+      peak = resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss
+    with os.fdopen(w,'wb') as f:
+      pickle.dump( (t, peak-start), f )
+    os._exit(0)
+
+  os.close(w)
+  with os.fdopen(r,'rb') as f:
+    result = pickle.load(f)
+  os.waitpid(pid,0)
+  return result
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Measure the time and peak memory of BbQuiz.write.')
+  parser.add_argument('--questions', '-n', type=int, default=200, help="Number of questions.")
+  parser.add_argument('--image-size', '-s', type=int, default=256, help="Size of the image embedded in each question (kB).")
+  parser.add_argument('--repeat', '-r', type=int, default=3, help="Number of timing repeats.")
+  args = parser.parse_args()
+
+  d = tempfile.mkdtemp()
+  try:
+    image = os.path.join( d, 'image.png' )
+    with open(image,'wb') as f:
+      f.write( os.urandom( 1024*args.image_size ) )
+    quiz = make_quiz( args.questions, image )
+
+    print "%d questions, %d kB image in each" % (args.questions, args.image_size)
+    print "%-10s %10s %16s" % ('case','min (s)','peak growth (MB)')
+    for name,write in [ ('joined', legacy_write), ('streaming', streaming_write) ]:
+      t,peak = run( write, quiz, args.repeat )
+      print "%-10s %10.4f %16.1f" % (name, t, peak/1024.)
+  finally:
+    shutil.rmtree(d)
@@ -0,0 +1,177 @@
+#! /usr/bin/env python
+'''Quiz build pipeline benchmark suite.
+
+Times each stage of building a quiz and a homework assignment on synthetic input
+(see synthetic.py) of increasing size:
+
+  format_text       formatting question templates with format_text
+  parse_markdown    parsing a QuizGen markdown file
+  load              loading a quiz spec into a BbQuiz
+  emit              emitting a loaded quiz with the BbEmitter
+  expand_macros     expanding the macros (and embedding the images) in the emitted quiz
+  bbquiz_write      BbQuiz.write (emit, render math and expand macros)
+  assignment_build  building a HomeworkAssignment with parts and quiz questions
+  assignment_write  HomeworkAssignment.write (the LaTeX document)
+  assignment_quiz   HomeworkAssignment.write_quiz (the Bb quiz with the references replaced)
+
+latexmk and tex2im are not run. The results can be saved as JSON and compared with
+the results from another commit:
+
+  git checkout A; python benchmarks/bench_suite.py -o A.json
+  git checkout B; python benchmarks/bench_suite.py -o B.json --compare A.json
+'''
+
+import os, sys, imp, json, timeit, platform, datetime, subprocess, argparse, StringIO
+
+root = os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) )
+sys.path.insert( 0, root )
+
+import synthetic
+from pyHomework.Quiz import BbQuiz
+from pyHomework.Emitter import BbEmitter
+from pyHomework.Utils import format_text
+
+QuizGen = imp.load_source( 'QuizGen', os.path.join( root, 'scripts', 'QuizGen.py' ) )
+
+# bump this if the layout of the results file changes
+RESULTS_VERSION = 1
+
+def clear_image_cache():
+  # each build encodes its images, like the first build in a process does
+  BbQuiz.image_cache.clear()
+
+def load_quiz( spec ):
+  quiz = BbQuiz()
+  quiz.load( spec )
+  return quiz
+
+# each stage takes the quiz size and returns a setup function (run before each timing, or None)
+# and the function to time.
+
+def stage_format_text( n ):
+  templates = synthetic.make_templates( n )
+  def run():
+    for text,context in templates:
+      format_text( text, **context )
+  return None, run
+
+def stage_parse_markdown( n ):
+  text = synthetic.make_quiz_markdown( n )
+  return None, lambda : QuizGen.parse_markdown( StringIO.StringIO( text ) )
+
+def stage_load( n ):
+  spec = synthetic.make_quiz_spec( n )
+  return None, lambda : load_quiz( spec )
+
+def stage_emit( n ):
+  quiz = load_quiz( synthetic.make_quiz_spec( n ) )
+  return None, lambda : quiz.emit( BbEmitter )
+
+def stage_expand_macros( n ):
+  quiz = load_quiz( synthetic.make_quiz_spec( n ) )
+  text = quiz.emit( BbEmitter )
+  return clear_image_cache, lambda : quiz.expand_macros( text )
+
+def stage_bbquiz_write( n ):
+  quiz = load_quiz( synthetic.make_quiz_spec( n ) )
+  return clear_image_cache, lambda : quiz.write( StringIO.StringIO() )
+
+def stage_assignment_build( n ):
+  return None, lambda : synthetic.make_assignment( n )
+
+def stage_assignment_write( n ):
+  ass = synthetic.make_assignment( n )
+  return None, lambda : ass.write( StringIO.StringIO() )
+
+def stage_assignment_quiz( n ):
+  ass = synthetic.make_assignment( n )
+  return clear_image_cache, lambda : ass.write_quiz( StringIO.StringIO() )
+
+stages = [ ( 'format_text'      , stage_format_text )
+         , ( 'parse_markdown'   , stage_parse_markdown )
+         , ( 'load'             , stage_load )
+         , ( 'emit'             , stage_emit )
+         , ( 'expand_macros'    , stage_expand_macros )
+         , ( 'bbquiz_write'     , stage_bbquiz_write )
+         , ( 'assignment_build' , stage_assignment_build )
+         , ( 'assignment_write' , stage_assignment_write )
+         , ( 'assignment_quiz'  , stage_assignment_quiz )
+         ]
+
+def time_stage( setup, run, repeat ):
+  times = list()
+  for i in range(repeat):
+    if setup is not None:
+      setup()
+    start = timeit.default_timer()
+    run()
+    times.append( timeit.default_timer() - start )
+  return times
+
+def git( *args ):
+  try:
+    with open( os.devnull, 'w' ) as null:
+      return subprocess.check_output( ['git'] + list(args), cwd=root, stderr=null ).strip()
+  except Exception:
+    return None
+
+def run_suite( names, sizes, repeat ):
+  results = { 'version'  : RESULTS_VERSION
+            , 'commit'   : git( 'rev-parse', 'HEAD' )
+            , 'dirty'    : bool( git( 'status', '--porcelain', '--untracked-files=no' ) )
+            , 'date'     : datetime.datetime.now().isoformat()
+            , 'python'   : platform.python_version()
+            , 'platform' : platform.platform()
+            , 'repeat'   : repeat
+            , 'stages'   : dict()
+            }
+  for name,stage in stages:
+    if not name in names:
+      continue
+    results['stages'][name] = dict()
+    for n in sizes:
+      setup,run = stage( n )
+      times = sorted( time_stage( setup, run, repeat ) )
+      results['stages'][name][str(n)] = { 'min' : times[0], 'median' : times[len(times)//2], 'times' : times }
+      print "%-18s %8d %10.4f %10.4f %10.1f" % (name, n, times[0], times[len(times)//2], 1e6*times[0]/n)
+      sys.stdout.flush()
+  return results
+
+def compare( base, results ):
+  '''Print the ratio of the min times in results to the ones in base, for the stages and sizes in both.'''
+  print
+  print "%-18s %8s %10s %10s %8s" % ('stage','n','base (s)','new (s)','new/base')
+  for name,stage in stages:
+    if not name in base['stages'] or not name in results['stages']:
+      continue
+    for n in sorted( results['stages'][name], key=int ):
+      if not n in base['stages'][name]:
+        continue
+      t0 = base['stages'][name][n]['min']
+      t1 = results['stages'][name][n]['min']
+      print "%-18s %8s %10.4f %10.4f %8.2f" % (name, n, t0, t1, t1/t0)
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Time the stages of a quiz and homework assignment build on synthetic input.')
+  parser.add_argument('--stages', nargs='+', default=[ name for name,stage in stages ], choices=[ name for name,stage in stages ], help="Stages to time. Default is all of them.")
+  parser.add_argument('--sizes', '-s', type=int, nargs='+', default=[100,1000,10000], help="Quiz sizes (number of questions).")
+  parser.add_argument('--repeat', '-r', type=int, default=3, help="Number of timing repeats.")
+  parser.add_argument('--output', '-o', help="Write the results to a JSON file.")
+  parser.add_argument('--compare', '-c', help="Compare the results with the results saved in a JSON file.")
+  parser.add_argument('--load', '-l', help="Read the results from a JSON file instead of running the suite (use with --compare).")
+  args = parser.parse_args()
+
+  if args.load:
+    with open( args.load ) as f:
+      results = json.load( f )
+  else:
+    print "%-18s %8s %10s %10s %10s" % ('stage','n','min (s)','median (s)','us/question')
+    results = run_suite( args.stages, args.sizes, args.repeat )
+
+  if args.output:
+    with open( args.output, 'w' ) as f:
+      json.dump( results, f, indent=2, sort_keys=True )
+
+  if args.compare:
+    with open( args.compare ) as f:
+      compare( json.load( f ), results )
@@ -0,0 +1,51 @@
+#! /usr/bin/env python
+'''Timing instrumentation overhead benchmark.
+
+Times the cost of a timed function and a stage with timing disabled and enabled,
+compared with a plain function call, and the cost of the instrumentation on a
+BbQuiz.write of a synthetic quiz.
+'''
+
+import os, sys, timeit, argparse, StringIO
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) )
+
+import synthetic
+from pyHomework import Timing
+from pyHomework.Quiz import BbQuiz
+
+def plain():
+  pass
+
+timed = Timing.timed('bench')(plain)
+
+def staged():
+  with Timing.stage('bench'):
+    pass
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Time the overhead of the timing instrumentation.')
+  parser.add_argument('--number', '-n', type=int, default=200000, help="Number of calls for the micro-benchmarks.")
+  parser.add_argument('--size', '-s', type=int, default=1000, help="Quiz size (number of questions).")
+  parser.add_argument('--repeat', '-r', type=int, default=3, help="Number of timing repeats.")
+  args = parser.parse_args()
+
+  print "%-24s %12s %12s" % ('case','disabled','enabled')
+  for name,f in [ ('plain call (us)', plain), ('timed call (us)', timed), ('stage (us)', staged) ]:
+    row = list()
+    for enable in [False,True]:
+      if enable:
+        Timing.enable()
+      row.append( 1e6*min( timeit.repeat( f, number=args.number, repeat=args.repeat ) )/args.number )
+      Timing.disable()
+    print "%-24s %12.3f %12.3f" % tuple( [name] + row )
+
+  quiz = BbQuiz()
+  quiz.load( synthetic.make_quiz_spec( args.size ) )
+  row = list()
+  for enable in [False,True]:
+    if enable:
+      Timing.enable()
+    row.append( min( timeit.repeat( lambda : quiz.write( StringIO.StringIO() ), number=1, repeat=args.repeat ) ) )
+    Timing.disable()
+  print "%-24s %12.4f %12.4f" % tuple( ['BbQuiz.write (s)'] + row )
@@ -0,0 +1,39 @@
+#! /usr/bin/env python
+'''Unit registry start up benchmark.
+
+Compares building a plain pint registry (what Answer.py and quantity_calcs.py
+each did before they shared one) with building the cached registry with and
+without a cache file.
+'''
+
+import os, sys, timeit, tempfile, shutil, argparse
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) )
+
+import pint
+from pyHomework.Units import CachedUnitRegistry
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Time unit registry construction.')
+  parser.add_argument('--repeat', '-n', type=int, default=10, help="Number of registries to build for each case.")
+  args = parser.parse_args()
+
+  d = tempfile.mkdtemp()
+  cache_file = os.path.join(d,'registry.pickle')
+  def cold():
+    if os.path.exists( cache_file ):
+      os.remove( cache_file )
+    CachedUnitRegistry( cache_file )
+  def warm():
+    CachedUnitRegistry( cache_file )
+
+  cases = [ ('plain pint registry', lambda : pint.UnitRegistry())
+          , ('cached (cold)'      , cold)
+          , ('cached (warm)'      , warm)
+          ]
+  try:
+    print "%-20s %10s" % ('case','min (s)')
+    for name,func in cases:
+      print "%-20s %10.4f" % (name, min( timeit.repeat( func, number=1, repeat=args.repeat ) ))
+  finally:
+    shutil.rmtree(d)
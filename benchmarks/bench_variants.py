@@ -0,0 +1,85 @@
+#! /usr/bin/env python
+'''Quiz variant benchmark.
+
+Makes a variant of a small quiz for each student, by building the quiz again for
+every student (drawing the parameters and computing the answers one student at a
+time), and with QuizVariants (building the quiz once and computing the answers
+for all students in one call). Both cases emit the Bb text for every variant.
+'''
+
+import os, sys, timeit, argparse
+import numpy
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) )
+
+from pyHomework.Quiz import BbQuiz
+from pyHomework.Answer import NumericalAnswer, MultipleChoiceAnswer, Q_
+from pyHomework.Variants import QuizVariants, uniform
+
+g = Q_(9.8,'m/s^2')
+
+def height( v0 ):
+  return v0**2/(2*g)
+
+def time_of_flight( v0, theta ):
+  return 2*v0*numpy.sin(theta)/g
+
+def add_questions( quiz, v0=None, theta=None, fmt=True ):
+  with quiz._add_question('A ball is thrown straight up at {v0:~}. How high does it go?', fmt=fmt) as q1:
+    q1.scratch.v0 = v0
+    with q1._add_answer( NumericalAnswer( height(v0) if v0 is not None else Q_(1,'m') ) ):
+      pass
+  with quiz._add_question('A ball is thrown at {v0:~} and {theta:~} above the ground. How long is it in the air?', fmt=fmt) as q2:
+    q2.scratch.v0 = v0
+    q2.scratch.theta = theta
+    with q2._add_answer( NumericalAnswer( time_of_flight(v0,theta) if v0 is not None else Q_(1,'s') ) ):
+      pass
+  with quiz._add_question('Which of these is a unit of length?') as q3:
+    a = MultipleChoiceAnswer()
+    a.add_choices('''
+    *meter
+    second
+    kilogram
+    ''')
+    with q3._add_answer( a ):
+      pass
+  return q1,q2
+
+def rebuild( students ):
+  texts = []
+  for s in students:
+    rng = numpy.random.RandomState( hash(s) & 0xffffffff )
+    quiz = BbQuiz()
+    add_questions( quiz, Q_(rng.uniform(5,15),'m/s'), Q_(rng.uniform(0.2,1.2),'rad') )
+    texts.append( quiz.emit() )
+  return texts
+
+def engine( students ):
+  quiz = BbQuiz()
+  q1,q2 = add_questions( quiz, fmt=False )
+  variants = QuizVariants( quiz )
+  variants.param( q1, 'v0', uniform( 5, 15, 'm/s' ) )
+  variants.answer( q1, height )
+  variants.param( q2, 'v0', uniform( 5, 15, 'm/s' ) )
+  variants.param( q2, 'theta', uniform( 0.2, 1.2, 'rad' ) )
+  variants.answer( q2, time_of_flight )
+
+  texts = []
+  for v in variants.generate( students ):
+    with variants.bind( v ):
+      texts.append( quiz.emit() )
+  return texts
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Time making per-student quiz variants.')
+  parser.add_argument('--students', '-n', type=int, default=200, help="Number of students.")
+  parser.add_argument('--repeat', '-r', type=int, default=3, help="Number of timing repeats.")
+  args = parser.parse_args()
+
+  students = [ 'student%03d' % i for i in range(args.students) ]
+
+  print "%d students" % len(students)
+  print "%-10s %10s %16s" % ('case','min (s)','per student (ms)')
+  for name,func in [ ('rebuild', rebuild), ('variants', engine) ]:
+    t = min( timeit.repeat( lambda : func( students ), number=1, repeat=args.repeat ) )
+    print "%-10s %10.4f %16.3f" % (name, t, 1e3*t/len(students))
@@ -0,0 +1,134 @@
+'''Synthetic quizzes and homework assignments for the benchmarks.
+
+Everything is generated from a seed, so the same sizes and seed give the same
+input on every commit. The quizzes mix the answer types (multiple choice, multiple
+answer, numerical, true/false and ordered), use the \\emph and \\textbf macros, and
+include an image every image_every questions. Math ($...$) is not used, because
+it needs tex2im.
+'''
+
+import os, sys, random
+
+root = os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) )
+if not root in sys.path:
+  sys.path.insert( 0, root )
+
+from pyHomework.HomeworkAssignment import *
+
+# a small image that ships with the tests
+default_image = os.path.join( root, 'testing', 'test1.png' )
+
+kinds = [ 'mc', 'ma', 'num', 'tf', 'ordered' ]
+units = [ 'm', 'm/s', 'kg', 'N', 'J', 's' ]
+names = [ 'Alice', 'Bob', 'Carol', 'Dave', 'Erin', 'Frank' ]
+objects = [ 'ball', 'block', 'cart', 'rocket', 'spring', 'pendulum' ]
+
+def make_text( rng, i, bold=r'\textbf{%s}', emph=r'\emph{%s}' ):
+  '''Return the text of question i, with some markup (latex macros by default).'''
+  return '%s pushes a %s across the floor (question %d). What is the %s of the %s?' % ( rng.choice(names), bold % rng.choice(objects), i, emph % rng.choice(['speed','momentum','energy']), rng.choice(objects) )
+
+def make_answer_spec( rng, kind ):
+  if kind == 'mc':
+    correct = rng.randint(0,3)
+    return { 'choices' : [ ('*' if j == correct else '') + 'choice %d' % rng.randint(0,1000) for j in range(4) ] }
+  if kind == 'ma':
+    return { 'choices' : [ ('*' if rng.random() < 0.5 or j == 0 else '') + 'option %d' % rng.randint(0,1000) for j in range(5) ] }
+  if kind == 'num':
+    value = '%.3g %s' % ( rng.uniform(1,1000), rng.choice(units) )
+    if rng.random() < 0.3:
+      value = '%.3g +/- %.2g %s' % ( rng.uniform(1,1000), rng.uniform(0.1,10), rng.choice(units) )
+    return { 'value' : value }
+  if kind == 'tf':
+    return { 'logical' : rng.random() < 0.5 }
+  if kind == 'ordered':
+    return { 'ordered' : [ 'step %d' % j for j in range(4) ] }
+
+def make_quiz_spec( n, seed=0, image=default_image, image_every=10 ):
+  '''Return a quiz spec (see Quiz.load) with n questions.'''
+  rng = random.Random( seed )
+  questions = list()
+  for i in range(n):
+    text = make_text( rng, i )
+    if image and i % image_every == 0:
+      text += r' \includegraphics[width=100]{%s}' % image
+    questions.append( { 'text' : text, 'answer' : make_answer_spec( rng, kinds[i % len(kinds)] ) } )
+  return { 'title' : 'Synthetic Quiz', 'configuration' : { 'make_key' : True }, 'questions' : questions }
+
+def make_quiz_markdown( n, seed=0, image=default_image, image_every=10 ):
+  '''Return the markdown (see QuizGen) for a quiz with n questions.
+
+  Markdown only supports multiple choice and numerical answers.'''
+  rng = random.Random( seed )
+  lines = [ 'title : Synthetic Quiz', 'configuration/make_key : True', '' ]
+  for i in range(n):
+    text = make_text( rng, i, '**%s**', '*%s*' )
+    if image and i % image_every == 0:
+      text += r' \includegraphics[width=100]{%s}' % image
+    lines.append( '# question %d' % i )
+    lines.append( '1. %s' % text )
+    if i % 3 == 2:
+      lines.append( '   answer : %.3g %s' % ( rng.uniform(1,1000), rng.choice(units) ) )
+    else:
+      correct = rng.randint(0,3)
+      for j in range(4):
+        lines.append( '    a. %schoice %d' % ( '^' if j == correct else '', rng.randint(0,1000) ) )
+    lines.append( '' )
+  return '\n'.join( lines )
+
+def make_templates( n, seed=0 ):
+  '''Return n (text, context) pairs for format_text.'''
+  rng = random.Random( seed )
+  templates = list()
+  for i in range(n):
+    context = { 'name' : rng.choice(names), 'obj' : rng.choice(objects), 'm' : rng.uniform(1,10), 'v' : rng.uniform(1,10), 'i' : i }
+    templates.append( ( 'Question {i}: {name} throws a {m:.2f} kg {obj} at {v:.1f} m/s. What is its kinetic energy? (use m = {m:.2f} kg)', context ) )
+  return templates
+
+def make_assignment( n, seed=0, image=default_image, image_every=10 ):
+  '''Return a HomeworkAssignment with n questions, each with up to two parts and a quiz question.
+
+  The question texts are formatted with variables from the scratch pad. A figure is added
+  every image_every questions. The references that latexmk would read from the aux file
+  are filled in, so the quiz can be written without building the PDF.'''
+  rng = random.Random( seed )
+  ass = HomeworkAssignment()
+  ass.config( 'title', value='Synthetic Assignment' )
+  refs = dict()
+  for i in range(n):
+    if image and i % image_every == 0:
+      f = Figure()
+      f.set_filename( image )
+      f.add_caption( 'Figure for question %d.' % (i+1) )
+      f.add_label( 'fig-%d' % i )
+      f.add_option( 'width=2in' )
+      ass.add_figure( f )
+
+    # text with macros is added after formatting, because the macro arguments would be taken as replacement fields
+    with ass._add_question( fmt=False ) as q:
+      q.scratch.m = Q_( round( rng.uniform(1,10), 2 ), 'kg' )
+      q.scratch.v = Q_( round( rng.uniform(1,10), 1 ), 'm/s' )
+      q.scratch.name = rng.choice(names)
+      q.add_text( '{name} throws a {m:~} ball at {v:~}.' )
+      q.format_text()
+      q.add_text( r'\textbf{Find} the following.' )
+      refs[id(q)] = str(i+1)
+
+      with ass.quiz._add_question() as qq:
+        qq.add_text( 'What is the momentum of the ball?' )
+        with qq._set_answer( NumericalAnswer( q.scratch.m*q.scratch.v ) ):
+          pass
+
+      for j in range( i % 3 ):
+        with q._add_part( '{name} throws it again, %d times faster.' % (j+2), fmt=False ) as p:
+          p.format_text()
+          p.add_text( r'What is the \emph{kinetic energy} now?' )
+          refs[id(p)] = '%d%s' % (i+1, 'abc'[j])
+          with ass.quiz._add_question() as qq:
+            qq.add_text( 'Which is larger?' )
+            a = MultipleChoiceAnswer()
+            a.add_choices( '*the energy\nthe momentum' )
+            with qq._set_answer( a ):
+              pass
+
+  ass._latex_refs.update( refs )
+  return ass
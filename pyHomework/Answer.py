@@ -1,6 +1,8 @@
 # local modules
-from .Utils import format_text, Bunch
+from .Utils import format_text, compile_text, Bunch
 from .Emitter import *
+from .Units import uconv, units, UQ_, Q_
+from . import Timing
 
 # standard imports
 import re,sys,inspect, random
@@ -11,17 +13,54 @@ from pyErrorProp.util import sigfig_round
 from pyErrorProp import UncertaintyConvention
 from pyErrorProp import UncertainQuantity
 
-uconv = UncertaintyConvention()
-units = uconv._UNITREGISTRY
-UQ_ = uconv.UncertainQuantity
-Q_  = UQ_.Quantity
+# maps answer spec keys (e.g. 'value', 'choices') to the answer class that loads them
+answer_types = dict()
+
+class AnswerType(type):
+  '''Registers answer classes by the spec keys they load.
+
+  Only classes that set spec_keys in their own body are registered, so subclasses
+  don't claim their parent's keys unless they ask to.'''
+  def __init__(cls, name, bases, attrs):
+    super(AnswerType,cls).__init__(name, bases, attrs)
+    for key in attrs.get('spec_keys',[]):
+      answer_types[key] = cls
 
 class Answer(object):
+  __metaclass__ = AnswerType
   DefaultEmitter = PlainEmitter
+  spec_keys = []
+
+  # answers are kept in slots, like questions. other attributes go in the instance
+  # dict, which is only created when one is set.
+  __slots__ = ( '_scratch', '__dict__', '__weakref__' )
 
   def __init__(self):
-    # a scratch pad that can be used to store vars and stuff...
-    self.scratch = Bunch()
+    # a scratch pad that can be used to store vars and stuff. it is created when first used.
+    self._scratch = None
+
+  @property
+  def scratch(self):
+    if self._scratch is None:
+      self._scratch = Bunch()
+    return self._scratch
+
+  @scratch.setter
+  def scratch(self,v):
+    self._scratch = v
+
+  def _attributes(self):
+    '''Return the answer's attributes (its slots, scratch pad and anything in the instance dict) in a dict.'''
+    attrs = dict()
+    for cls in reversed( type(self).__mro__ ):
+      for name in cls.__dict__.get('__slots__',()):
+        if not name in ('_scratch','__dict__','__weakref__') and hasattr(self,name):
+          attrs[name] = getattr(self,name)
+    # the scratch pad is only included if it exists, so formatting doesn't create it
+    if self._scratch is not None:
+      attrs['scratch'] = self._scratch
+    attrs.update( self.__dict__ )
+    return attrs
 
   # other useful names for the scratchpad
   @property
@@ -49,10 +88,13 @@ class Answer(object):
       kwargs['formatter'] = 'format'
 
     # if no arguments (other than the formatter) were given, use
-    # our __dict__ and scratch
+    # our attributes and scratch
     if len(args) == 0 and len(kwargs.keys()) == 1:
-      kwargs.update( self.__dict__ )
-      kwargs.update( self.scratch )
+      # text without replacement fields doesn't change (and the context doesn't need to be built)
+      if not any( compile_text(x).has_fields for x in X ):
+        return
+      kwargs.update( self._attributes() )
+      kwargs.update( self._scratch or {} )
 
     for i in range(len(X)):
       X[i] = format_text( X[i], *args, **kwargs )
@@ -62,6 +104,8 @@ class Answer(object):
 
 
 class RawAnswer(Answer):
+  __slots__ = ( '_text', )
+
   def __init__(self, text=None):
     super(RawAnswer,self).__init__()
     self._text = text
@@ -82,6 +126,9 @@ class RawAnswer(Answer):
     self.format_X([self._text], *args,**kwargs)
 
 class EssayAnswer(RawAnswer):
+  __slots__ = ()
+  spec_keys = ['text']
+
   def __init__(self, text=None):
     super(EssayAnswer,self).__init__()
     self._text = text
@@ -90,13 +137,39 @@ class EssayAnswer(RawAnswer):
     self.answer = spec['text']
 
 class ShortAnswer(RawAnswer):
+  __slots__ = ()
+
   def __init__(self, text=None):
     super(ShortAnswer,self).__init__()
     self._text = text
 
+def derived(f):
+  '''Make a property getter that computes its value once and stores it in the instance's _derived dict.
+
+  Setters reset the dict when something the values depend on changes.'''
+  name = f.__name__
+  # the values are formatted by pint
+  f = Timing.timed('pint')(f)
+  def get(self):
+    if self._derived is None:
+      self._derived = dict()
+    try:
+      return self._derived[name]
+    except KeyError:
+      val = self._derived[name] = f(self)
+      return val
+  get.__name__ = name
+  get.__doc__ = f.__doc__
+  return get
+
 class NumericalAnswer(Answer):
+  __slots__ = ( '_derived', '_quant', '_unc', '_sigfigs', '_min_relative_unc' )
+  spec_keys = ['value']
+
   def __init__(self, quantity = None, units = "", uncertainty = '1%', sigfigs = 3):
     super(NumericalAnswer,self).__init__()
+    # formatted values computed from the quantity. see derived.
+    self._derived = None
     self.quantity = quantity
     self.uncertainty = uncertainty
     self.sigfigs  = sigfigs
@@ -133,6 +206,7 @@ class NumericalAnswer(Answer):
     return val
 
   @property
+  @derived
   def quantity(self):
     # let pint format the quantity as a string, but remove "diemensionless" from dimensionless quantities.
     return re.sub(' dimensionless$','','{{:.{:d}E}}'.format( self.sigfigs-1 ).format( self._quant ))
@@ -148,8 +222,28 @@ class NumericalAnswer(Answer):
       v = Q_(v,'')
 
     self._quant = v
+    self._derived = None
 
   @property
+  def sigfigs(self):
+    return self._sigfigs
+
+  @sigfigs.setter
+  def sigfigs(self,v):
+    self._sigfigs = v
+    self._derived = None
+
+  @property
+  def min_relative_unc(self):
+    return self._min_relative_unc
+
+  @min_relative_unc.setter
+  def min_relative_unc(self,v):
+    self._min_relative_unc = v
+    self._derived = None
+
+  @property
+  @derived
   def latex(self):
     val = self.value
     unc = self.uncertainty
@@ -175,6 +269,7 @@ class NumericalAnswer(Answer):
 
 
   @property
+  @derived
   def value(self):
     val = self._quant
 
@@ -185,6 +280,7 @@ class NumericalAnswer(Answer):
     return '{{:.{:d}E}}'.format( self.sigfigs-1 ).format( val )
 
   @property
+  @derived
   def uncertainty(self):
     fmt = '{{:.{:d}E}}'.format( self.sigfigs-1 )
 
@@ -225,8 +321,10 @@ class NumericalAnswer(Answer):
   @uncertainty.setter
   def uncertainty(self,v):
     self._unc = v
+    self._derived = None
 
   @property
+  @derived
   def units(self):
     unit = ""
     if isinstance( self._quant, UncertainQuantity._UncertainQuantity ):
@@ -242,7 +340,9 @@ class NumericalAnswer(Answer):
   @units.setter
   def units(self,v):
     self._quant.ito(v)
+    self._derived = None
 
+  @Timing.timed('pint')
   def load(self,spec):
     val = str(spec['value'])
     if len( val.strip().split() ) < 2:
@@ -258,20 +358,21 @@ class NumericalAnswer(Answer):
       self.uncertainty = unc
 
 class MultipleChoiceAnswer(Answer):
+  __slots__ = ( '_choices', '_order', '_correct' )
+  spec_keys = ['choices']
+
+  # shared defaults. setting them on the class sets a default for all instances.
+  _correct_regex = r'[\*\^]'
+  randomize = False
+  add_none_answer = False
+  default_answer = None
+
   def __init__(self):
     super(MultipleChoiceAnswer,self).__init__()
     # controlled access members
     self._choices = []
     self._order   = []
     self._correct = set()
-    self._correct_regex = r'[\*\^]'
-
-    if not hasattr(self,"randomize"): # this allows the user to set a default for all instances
-      self.randomize = False
-    if not hasattr(self,"add_none_answer"):
-      self.add_none_answer = False
-    if not hasattr(self,"default_answer"):
-      self.default_answer = None
 
 
   @property
@@ -358,6 +459,9 @@ class MultipleChoiceAnswer(Answer):
         return -1
 
 class OrderedAnswer(Answer):
+  __slots__ = ( 'items', )
+  spec_keys = ['ordered']
+
   def __init__(self):
     super(OrderedAnswer,self).__init__()
     self.items = []
@@ -380,6 +484,9 @@ class OrderedAnswer(Answer):
       self.add_item( item )
 
 class TrueFalseAnswer(Answer):
+  __slots__ = ( 'answer', )
+  spec_keys = ['logical']
+
   def __init__(self):
     super(TrueFalseAnswer,self).__init__()
     self.answer = None
@@ -388,14 +495,14 @@ class TrueFalseAnswer(Answer):
     self.answer = spec['logical']
 
 def make_answer( spec ):
-  for name,obj in inspect.getmembers(sys.modules[__name__]):
-    if inspect.isclass(obj) and issubclass( obj, Answer ):
-      try:
-        a = obj()
-        a.load( spec )
-        return a
-      except:
-        pass
-
-
-  raise RuntimeError("Could not build answer instance from spec '%s'."%spec)
+  '''Create an answer from a spec. The answer type is picked by the spec keys it contains (see answer_types).'''
+  keys = [ k for k in spec if k in answer_types ]
+  types = set( answer_types[k] for k in keys )
+  if len(types) == 0:
+    raise RuntimeError("Could not build answer instance from spec '%s'. Spec needs one of the keys: %s."%(spec,', '.join(sorted(answer_types))))
+  if len(types) > 1:
+    raise RuntimeError("Ambiguous answer spec '%s'. Keys %s are loaded by different answer types."%(spec,', '.join(sorted(keys))))
+
+  a = types.pop()()
+  a.load( spec )
+  return a
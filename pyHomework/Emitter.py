@@ -2,7 +2,7 @@
 from .Signal import *
 
 # standard modules
-import inspect, operator, functools
+import inspect, functools
 
 def get_bases( cls ):
   if not inspect.isclass( cls ):
@@ -14,25 +14,113 @@ def get_bases( cls ):
         yield bb
     yield b
 
+def streaming(handler):
+  '''Mark an emitter handler as streaming.
+
+  A streaming handler returns an iterator over fragments of text instead of a string.
+  Emitter.fragments and Emitter.write use the fragments directly, and calling the
+  emitter joins them into a string.'''
+  handler.streaming = True
+  return handler
+
+def join_fragments(sep, items):
+  '''Iterator version of sep.join(items).'''
+  first = True
+  for item in items:
+    if not first:
+      yield sep
+    yield item
+    first = False
+
+class EmitterType(type):
+  '''Gives each emitter class its own dispatch tables.'''
+  def __init__(cls, name, bases, attrs):
+    super(EmitterType,cls).__init__(name, bases, attrs)
+    cls._dispatch = dict()
+    cls._fragments_dispatch = dict()
+
 class Emitter(object):
-  sig_pre_question  = Signal()
-  sig_post_question = Signal()
+  __metaclass__ = EmitterType
 
-  def __call__(self,obj):
-    if hasattr( self, obj.__class__.__name__ ):
-      return getattr(self, obj.__class__.__name__)(obj)
+  # each emitter has its own signals
+  sig_pre_question  = InstanceSignal('sig_pre_question')
+  sig_post_question = InstanceSignal('sig_post_question')
 
-    bases = list( get_bases( obj ) )
+  def __call__(self,obj):
+    try:
+      handler = self._dispatch[obj.__class__]
+    except KeyError:
+      handler = self.resolve( obj.__class__ )
+    return handler(self,obj)
+
+  def fragments(self,obj):
+    '''Return an iterator over the fragments of text emitted for obj.
+
+    Handlers that are not streaming give a single fragment.'''
+    try:
+      handler = self._fragments_dispatch[obj.__class__]
+    except KeyError:
+      handler = self.resolve_fragments( obj.__class__ )
+    return handler(self,obj)
+
+  def write(self,obj,stream):
+    '''Write the text emitted for obj to a stream, one fragment at a time.'''
+    for fragment in self.fragments(obj):
+      stream.write( fragment )
+
+  @classmethod
+  def find_handler(cls, objcls):
+    '''Return the handler for objects of type objcls, and whether it is streaming.
+
+    The handler is the method named after the object's class, or its nearest base class,
+    or Default if there isn't one. It is only looked up once for each object type, so handlers
+    need to be defined on the emitter class (not the instance).'''
+    bases = list( get_bases( objcls ) )
     bases.reverse()
-    for b in bases:
-      if hasattr( self, b.__name__ ):
-        return getattr(self, b.__name__)(obj)
-
-    return getattr(self, 'Default')(obj)
+    for name in [objcls.__name__] + [b.__name__ for b in bases] + ['Default']:
+      if hasattr( cls, name ):
+        handler = getattr( cls, name )
+        break
+
+    is_streaming = getattr( handler, 'streaming', False )
+    if not (inspect.ismethod(handler) and handler.im_self is None):
+      # static methods and plain callables don't take the emitter instance
+      handler = functools.partial( _call_without_emitter, handler )
+
+    return handler,is_streaming
+
+  @classmethod
+  def resolve(cls, objcls):
+    '''Return the handler used to emit objects of type objcls as a string.'''
+    handler,is_streaming = cls.find_handler( objcls )
+    if is_streaming:
+      handler = functools.partial( _join_fragments, handler )
+
+    cls._dispatch[objcls] = handler
+    return handler
+
+  @classmethod
+  def resolve_fragments(cls, objcls):
+    '''Return the handler used to emit objects of type objcls as fragments.'''
+    handler,is_streaming = cls.find_handler( objcls )
+    if not is_streaming:
+      handler = functools.partial( _single_fragment, handler )
+
+    cls._fragments_dispatch[objcls] = handler
+    return handler
 
   def Default(self,obj):
     return ""
 
+def _call_without_emitter(f, emitter, obj):
+  return f(obj)
+
+def _join_fragments(f, emitter, obj):
+  return ''.join( f(emitter, obj) )
+
+def _single_fragment(f, emitter, obj):
+  yield f(emitter, obj)
+
 
 class PlainEmitter(Emitter):
   def Default(self, obj):
@@ -127,12 +215,9 @@ class BbEmitter(Emitter):
 
     return '\t'.join( tokens )
 
+  @streaming
   def Quiz(self,obj):
-    tokens = []
-    for q in obj.questions:
-      tokens.append( q.emit(self) )
-
-    return '\n'.join(tokens)
+    return join_fragments( '\n', ( q.emit(self) for q in obj.questions ) )
 
 
 
@@ -173,46 +258,54 @@ class LatexEmitter(Emitter):
     return '\n'.join(tokens)
 
 
+  @streaming
   def Question(self,obj):
-    tokens = []
-
     lbl = ""
     if self.labels == True:
       lbl = LatexEmitter.make_label(obj)
 
     if self.listtype.lower() == 'easylist':
-      tokens.append( '@ '+lbl+obj.question_str )
+      yield '@ '+lbl+obj.question_str
       for answer in obj._answers:
-        tokens.append( answer.emit(self).replace( '@ ', '@@ ' ) )
+        yield '\n' + answer.emit(self).replace( '@ ', '@@ ' )
       for part in obj._parts:
-        tokens.append( part.emit(self).replace( '@ ', '@@ ' ) )
+        yield '\n' + part.emit(self).replace( '@ ', '@@ ' )
     else:
-      tokens.append( r'\item '+lbl+obj.question_str )
+      yield r'\item '+lbl+obj.question_str
       for answer in obj._answers:
-        tokens.append( answer.emit(self) )
+        yield '\n' + answer.emit(self)
       for part in obj._parts:
-        t = []
-        t.append( part.emit(self) )
-        LatexEmitter.wrap_in_environment( t, self.listtype.lower() )
-        tokens += t
-
-    return '\n'.join( tokens )
+        yield '\n' + r'\begin{'+self.listtype.lower()+r'}' + '\n'
+        for fragment in self.fragments(part):
+          yield fragment
+        yield '\n' + r'\end{'+self.listtype.lower()+'}'
 
+  @streaming
   def Quiz(self,obj):
-    tokens = []
+    # the signals are only called if something is connected to them. they leave out None results.
+    pre  = self.sig_pre_question
+    post = self.sig_post_question
+    yield r'\begin{'+self.listtype+r'}'
     i = 0
-    tokens += filter( functools.partial(operator.is_not, None), self.sig_post_question(i=i,question=None) )
+    if post:
+      for t in post(i=i,question=None):
+        yield '\n' + t
     for q in obj.questions:
       i += 1
-      tokens += filter( functools.partial(operator.is_not, None), self.sig_pre_question(i=i,question=q) )
-      tokens.append( q.emit(self) )
-      tokens += filter( functools.partial(operator.is_not, None), self.sig_post_question(i=i,question=q) )
+      if pre:
+        for t in pre(i=i,question=q):
+          yield '\n' + t
+      yield '\n'
+      for fragment in self.fragments(q):
+        yield fragment
+      if post:
+        for t in post(i=i,question=q):
+          yield '\n' + t
     i += 1
-    tokens += filter( functools.partial(operator.is_not, None), self.sig_pre_question(i=i,question=None) )
-
-    LatexEmitter.wrap_in_environment( tokens, self.listtype )
-
-    return '\n'.join(tokens)
+    if pre:
+      for t in pre(i=i,question=None):
+        yield '\n' + t
+    yield '\n' + r'\end{'+self.listtype+'}'
 
 
 class LatexKeyEmitter(LatexEmitter):
@@ -240,10 +333,7 @@ class LatexKeyEmitter(LatexEmitter):
     tokens.append( ", ".join(t) )
     return " ".join(tokens)
 
+  @streaming
   def Quiz(self,obj):
-    tokens = []
-    for q in obj.questions:
-      tokens.append( q.emit(self) )
-
-    return '\n\n'.join(tokens)
+    return join_fragments( '\n\n', ( q.emit(self) for q in obj.questions ) )
 
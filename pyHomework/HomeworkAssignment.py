@@ -1,6 +1,6 @@
 #! /usr/bin/env python
 
-import os, StringIO, contextlib, types
+import os, StringIO, contextlib, types, hashlib, shutil
 from subprocess import call
 from collections import OrderedDict
 
@@ -8,6 +8,7 @@ from .Quiz import *
 from .Emitter import *
 from .File import *
 from .Utils import *
+from . import Timing
 from pyErrorProp import *
 
 import tempita
@@ -251,6 +252,10 @@ class HomeworkAssignment(Quiz):
     self._figures = OrderedDict()
     self._latex_refs = OrderedDict()
     self._labels = OrderedDict()
+
+    # the directory that PDFs are built in. it is kept between builds so that latexmk
+    # can reuse the aux files. if None, <basename>-build next to the .tex file is used.
+    self.build_dir = None
     
     
     self.add_package('amsmath')
@@ -300,11 +305,10 @@ class HomeworkAssignment(Quiz):
 
       return None
 
+    # the signals belong to the emitter instance, so the same emitter has to be used.
     emitter = LatexEmitter(labels=True)
     emitter.sig_post_question.connect( insert_paragraph )
-    text = self.emit(LatexEmitter(labels=True))
-    emitter.sig_post_question.disconnect( insert_paragraph )
-    return text
+    return self.emit(emitter)
 
   @property
   def preamble_latex(self):
@@ -583,36 +587,109 @@ class HomeworkAssignment(Quiz):
 
 
   def write(self, stream):
-    context = { 'preamble'    : self.preamble_latex
-              , 'body'        : self.body_latex
-              , 'figures'     : self.figures_latex
-              , 'key'         : self.key_latex
-              }
-    context.update( self._config )
-    text = tempita.sub( self.latex_template, **context )
+    with Timing.stage('latex'):
+      context = { 'preamble'    : self.preamble_latex
+                , 'body'        : self.body_latex
+                , 'figures'     : self.figures_latex
+                , 'key'         : self.key_latex
+                }
+      context.update( self._config )
+      text = tempita.sub( self.latex_template, **context )
 
     stream.write(text)
 
   def write_file(self, filename="/dev/stdout"):
-    if filename.endswith('.pdf'):
-      texfile = self.get_fn( filename, 'tex' )
-    else:
-      texfile = filename
+    if not filename.endswith('.pdf'):
+      with open(filename, 'w') as f:
+        self.write( f )
+      return
 
-    with open(texfile, 'w') as f:
-      self.write( f )
+    texfile = self.get_fn( filename, 'tex' )
+    stream = StringIO.StringIO()
+    self.write( stream )
+    text = stream.getvalue()
+
+    # don't touch the .tex file or run latexmk if nothing has changed since the last build,
+    # and the .tex and PDF files are still the ones that it produced.
+    basename = os.path.join( self.get_build_dir( texfile ), os.path.splitext( os.path.basename(texfile) )[0] )
+    hashfile = basename+'.hash'
+    digest = self.build_hash( text )
+    if os.path.isfile( filename ) and os.path.isfile( texfile ) and os.path.isfile( hashfile ):
+      with open(hashfile,'r') as f:
+        state = f.read()
+      with open(texfile,'r') as f:
+        tex_digest = hashlib.sha1( f.read() ).hexdigest()
+      if state == self.build_state( digest, tex_digest, filename ):
+        if os.path.isfile( basename+'.aux' ):
+          self._latex_refs.update( parse_aux( basename+'.aux' ) )
+        return
 
-    if filename.endswith( '.pdf' ):
-      self.latexmk( texfile )
+    with open(texfile, 'w') as f:
+      f.write( text )
+
+    if self.latexmk( texfile, filename ) == 0 and os.path.isfile( filename ):
+      with open(hashfile,'w') as f:
+        f.write( self.build_state( digest, hashlib.sha1( text ).hexdigest(), filename ) )
+    elif os.path.isfile( hashfile ):
+      os.remove( hashfile )
+
+  def build_state(self, digest, tex_digest, pdffile):
+    '''Return the text of the .hash file for a build: the build hash, a hash of the .tex file, and the size and modification time of the PDF.'''
+    st = os.stat( pdffile )
+    return 'build %s\ntex %s\npdf %d %r\n' % ( digest, tex_digest, st.st_size, st.st_mtime )
+
+  def get_build_dir(self, texfile):
+    build_dir = self.build_dir
+    if build_dir is None:
+      build_dir = os.path.splitext( texfile )[0] + '-build'
+    if not os.path.isdir( build_dir ):
+      os.makedirs( build_dir )
+    return build_dir
+
+  # the extensions that pdflatex tries, in order, for an \includegraphics file name without one
+  figure_extensions = ['.pdf', '.png', '.jpg', '.mps', '.jpeg', '.jbig2', '.jb2', '.eps']
+
+  def figure_file(self, fn):
+    '''Return the file that LaTeX includes for a figure's file name, or None if there isn't one.'''
+    if os.path.splitext( fn )[1] == '':
+      for ext in self.figure_extensions:
+        if os.path.isfile( fn+ext ):
+          return fn+ext
+    if os.path.isfile( fn ):
+      return fn
+    return None
 
+  def build_hash(self, text):
+    '''Return a hash of the LaTeX code for the assignment and the figure files it includes.'''
+    h = hashlib.sha1( text )
+    for k in self._figures:
+      fn = self.figure_file( self._figures[k].filename )
+      h.update( '%s\0' % fn )
+      if fn is not None:
+        with open(fn,'rb') as f:
+          for chunk in iter( lambda : f.read(2**16), '' ):
+            h.update( chunk )
+    return h.hexdigest()
+
+  def latexmk( self, texfile, pdffile=None ):
+    '''Build a PDF from a .tex file with latexmk and return latexmk's exit status.
+
+    LaTeX is run in the build directory, and the aux files are left there so that the
+    next build only needs as many passes as the changes require.'''
+    if pdffile is None:
+      pdffile = self.get_fn( texfile, 'pdf' )
+    build_dir = self.get_build_dir( texfile )
+    basename = os.path.join( build_dir, os.path.splitext( os.path.basename(texfile) )[0] )
+
+    with open(basename+'.latexmk-cmd.log','w') as f, Timing.stage('latexmk',file=texfile):
+      status = call( ['latexmk', '-latexoption=-interaction=nonstopmode', '-pdf', '-outdir='+build_dir, texfile ], stdout=f, stderr=f )
+    if os.path.isfile( basename+'.aux' ):
+      self._latex_refs.update( parse_aux( basename+'.aux' ) )
+    if os.path.isfile( basename+'.pdf' ) and os.path.abspath( basename+'.pdf' ) != os.path.abspath( pdffile ):
+      shutil.copyfile( basename+'.pdf', pdffile )
 
-  def latexmk( self, texfile ):
-    with open(texfile+'latexmk-cmd.log','w') as f:
-      status = call( ['latexmk', '-latexoption=-interaction=nonstopmode', '-pdf', texfile ], stdout=f, stderr=f )
-      self._latex_refs.update( parse_aux( self.get_fn( texfile, 'aux' ) ) )
-      call( ['latexmk', '-c', texfile ], stdout=f, stderr=f )
     if status:
-      with open(texfile+'latexmk-cmd.log','r') as f:
+      with open(basename+'.latexmk-cmd.log','r') as f:
         lines = f.readlines()
       print "====================================="
       print "THERE WAS AND ERROR."
@@ -621,10 +698,8 @@ class HomeworkAssignment(Quiz):
       print ''.join(lines)
       print "====================================="
       print "====================================="
-    
-
 
-        
+    return status
 
 
   # LEGACY Interface
@@ -0,0 +1,156 @@
+'''A pool of reusable questions stored in a SQLite file.
+
+Questions are stored as specs (the dicts that Quiz.load reads), with a difficulty
+and any number of tags (topics for example). The tags and difficulty are indexed,
+so questions can be drawn at random by tag and difficulty without loading the
+rest of the pool.
+
+  pool = QuestionPool('physics.db')
+  pool.add( { 'text' : 'How long is a football field?', 'answer' : { 'value' : '100 yd' } }
+          , tags=['units'], difficulty=1 )
+
+  quiz = BbQuiz()
+  pool.draw_into( quiz, 10, tags=['units'], difficulty=(1,2) )
+'''
+
+# standard modules
+import sqlite3, json, random
+
+schema = '''
+CREATE TABLE IF NOT EXISTS questions ( id INTEGER PRIMARY KEY, difficulty REAL, spec TEXT NOT NULL );
+CREATE INDEX IF NOT EXISTS questions_difficulty ON questions ( difficulty );
+CREATE TABLE IF NOT EXISTS tags ( tag TEXT NOT NULL, question INTEGER NOT NULL, UNIQUE ( tag, question ) );
+CREATE INDEX IF NOT EXISTS tags_question ON tags ( question );
+'''
+
+def _str( obj ):
+  '''Convert the unicode strings that json returns to str where possible, like yaml does.'''
+  if isinstance( obj, unicode ):
+    try:
+      return obj.encode('ascii')
+    except UnicodeEncodeError:
+      return obj
+  if isinstance( obj, list ):
+    return [ _str(x) for x in obj ]
+  if isinstance( obj, dict ):
+    return dict( (_str(k),_str(v)) for k,v in obj.items() )
+  return obj
+
+class QuestionPool(object):
+  '''A pool of question specs stored in a SQLite file.
+
+  Specs can carry their own tags and difficulty (spec keys 'tags' and 'difficulty'),
+  which are used if none are given when they are added.'''
+
+  def __init__(self, filename=':memory:'):
+    self.filename = filename
+    self._db = sqlite3.connect( filename )
+    self._db.executescript( schema )
+
+  def close(self):
+    self._db.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+  def __len__(self):
+    return self._db.execute('SELECT COUNT(*) FROM questions').fetchone()[0]
+
+  def add(self, spec, tags=None, difficulty=None):
+    '''Add a question spec to the pool. Returns its id.'''
+    return self.add_many( [spec], tags, difficulty )[0]
+
+  def add_many(self, specs, tags=None, difficulty=None):
+    '''Add a list of question specs (i.e. the 'questions' of a quiz spec) in one transaction. Returns their ids.'''
+    rows = list()
+    tag_rows = list()
+    with self._db:
+      # the ids are assigned here so that all of the rows can be inserted with executemany
+      first = self._db.execute('SELECT COALESCE( MAX(id), 0 ) + 1 FROM questions').fetchone()[0]
+      for i,spec in enumerate(specs):
+        t = tags if tags is not None else spec.get('tags',[])
+        d = difficulty if difficulty is not None else spec.get('difficulty',None)
+        if isinstance( t, (str,unicode) ):
+          t = [t]
+        rows.append( ( first+i, d, json.dumps( spec ) ) )
+        tag_rows += [ (tag,first+i) for tag in t ]
+      self._db.executemany( 'INSERT INTO questions ( id, difficulty, spec ) VALUES ( ?, ?, ? )', rows )
+      self._db.executemany( 'INSERT OR IGNORE INTO tags ( tag, question ) VALUES ( ?, ? )', tag_rows )
+    return [ row[0] for row in rows ]
+
+  def remove(self, ids):
+    with self._db:
+      self._db.executemany( 'DELETE FROM tags WHERE question = ?', [ (i,) for i in ids ] )
+      self._db.executemany( 'DELETE FROM questions WHERE id = ?', [ (i,) for i in ids ] )
+
+  def tags(self):
+    '''Return a dict with the number of questions for each tag.'''
+    return dict( self._db.execute('SELECT tag, COUNT(*) FROM tags GROUP BY tag') )
+
+  def _filter(self, tags=None, difficulty=None):
+    '''Return the WHERE clause and parameters that select questions with all of the tags and a difficulty.
+
+    difficulty can be a value or a (min,max) tuple (either can be None).'''
+    clauses = list()
+    params = list()
+    if isinstance( tags, (str,unicode) ):
+      tags = [tags]
+    if tags:
+      tags = sorted( set( tags ) )
+      clauses.append( 'id IN ( SELECT question FROM tags WHERE tag IN ( %s ) GROUP BY question HAVING COUNT(*) = ? )'
+                    % ','.join( '?'*len(tags) ) )
+      params += tags + [ len(tags) ]
+    if isinstance( difficulty, (tuple,list) ):
+      lo,hi = difficulty
+      if lo is not None:
+        clauses.append( 'difficulty >= ?' )
+        params.append( lo )
+      if hi is not None:
+        clauses.append( 'difficulty <= ?' )
+        params.append( hi )
+    elif difficulty is not None:
+      clauses.append( 'difficulty = ?' )
+      params.append( difficulty )
+
+    if len(clauses) == 0:
+      return '',params
+    return ' WHERE ' + ' AND '.join( clauses ), params
+
+  def select(self, tags=None, difficulty=None):
+    '''Return the ids of the questions with all of the tags and a difficulty. Only the indexes are read.'''
+    where,params = self._filter( tags, difficulty )
+    return [ row[0] for row in self._db.execute( 'SELECT id FROM questions' + where + ' ORDER BY id', params ) ]
+
+  def count(self, tags=None, difficulty=None):
+    where,params = self._filter( tags, difficulty )
+    return self._db.execute( 'SELECT COUNT(*) FROM questions' + where, params ).fetchone()[0]
+
+  def get(self, ids):
+    '''Return the specs for a list of ids, in the same order.'''
+    specs = dict()
+    # sqlite limits the number of parameters in a statement
+    for i in range( 0, len(ids), 500 ):
+      chunk = ids[i:i+500]
+      rows = self._db.execute( 'SELECT id, spec FROM questions WHERE id IN ( %s )' % ','.join( '?'*len(chunk) ), chunk )
+      for qid,spec in rows:
+        specs[qid] = _str( json.loads( spec ) )
+    return [ specs[i] for i in ids ]
+
+  def draw(self, n, tags=None, difficulty=None, rng=random):
+    '''Draw n questions at random (without replacement) from the questions with all of the tags and a difficulty.
+
+    Returns their specs. The python random module is used by default, so draws can be
+    repeated with random.seed (or pass a random.Random instance).'''
+    ids = self.select( tags, difficulty )
+    if n > len(ids):
+      raise RuntimeError("Cannot draw %d questions from the pool, only %d match tags %s and difficulty %s." % (n,len(ids),tags,difficulty))
+    return self.get( rng.sample( ids, n ) )
+
+  def draw_into(self, quiz, n, tags=None, difficulty=None, rng=random):
+    '''Draw n questions (see draw) and add them to a quiz.'''
+    specs = self.draw( n, tags, difficulty, rng )
+    quiz.load( { 'questions' : specs } )
+    return specs
@@ -1,5 +1,5 @@
 # local modules
-from .Utils import format_text, Bunch
+from .Utils import format_text, compile_text, Bunch
 from .Answer import *
 from .Emitter import *
 
@@ -9,6 +9,9 @@ import inspect, contextlib
 # non-standard modules
 import dpath.util
 
+# shared by all questions until something is added to the list
+_empty = ()
+
 class Question(object):
   """A class representing a question.
 
@@ -23,44 +26,73 @@ class Question(object):
   """
   DefaultEmitter = PlainEmitter
 
+  # question banks can hold many thousands of questions, so the lists and scratch pad
+  # are kept in slots. other attributes (set by users) go in the instance dict, which
+  # is only created when one is set.
+  __slots__ = ( '_texts', '_post_instructions', '_pre_instructions', '_answers', '_parts', '_questions'
+              , '_scratch', '__dict__', '__weakref__' )
+  _lists = ( '_texts', '_post_instructions', '_pre_instructions', '_answers', '_parts', '_questions' )
+
+  # regular members and config options. these are shared defaults, setting them on a question
+  # (or subclass) overrides them.
+  join_str = ' '
+  clean_text = True
+  auto_answer_instructions = True
+  _options = ( 'join_str', 'clean_text', 'auto_answer_instructions' )
+
   def __init__(self, text = None):
     # copy constructor
     if isinstance(text,Question):
-      self._texts = text._texts
-      self._post_instructions = text._post_instructions
-      self._pre_instructions = text._pre_instructions
-      self._answers = text._answers
-      self._parts = text._parts
-      self._questions = text._questions
-      self.join_str = text.join_str
-      self.clean_text = text.clean_text
-      self.auto_answer_instructions = text.auto_answer_instructions
-      self.scratch = text.scratch
+      # the lists and scratch pad are shared with the original, so they are created now if needed
+      for name in self._lists:
+        setattr( self, name, text._list(name) )
+      for name in self._options:
+        if getattr(text,name) != getattr(self,name):
+          setattr( self, name, getattr(text,name) )
+      self._scratch = text.scratch
 
       return
-    # controlled access members
-    self._texts = []
-    self._post_instructions = []
-    self._pre_instructions = []
-    self._answers = []
-    self._parts = []
-    self._questions = []
-
-    # regular members
-    self.join_str = ' '
-
-    # config options
-    if not hasattr(self,'clean_text'):
-      self.clean_text = True
-    if not hasattr(self,'atuo_answer_instructions'):
-      self.auto_answer_instructions = True
+    # controlled access members. empty lists are shared until something is added.
+    self._texts = _empty
+    self._post_instructions = _empty
+    self._pre_instructions = _empty
+    self._answers = _empty
+    self._parts = _empty
+    self._questions = _empty
+
+    # a scratch pad that can be used to store vars and stuff. it is created when first used.
+    self._scratch = None
 
     # add text if it was given
     if not text is None:
       self.add_text( text )
 
-    # a scratch pad that can be used to store vars and stuff...
-    self.scratch = Bunch()
+  def _list(self,name):
+    '''Return one of the question's lists, creating it the first time it is needed.'''
+    X = getattr(self,name)
+    if X is _empty:
+      X = []
+      setattr(self,name,X)
+    return X
+
+  def _attributes(self):
+    '''Return the question's attributes (the lists, options, scratch pad and anything in the instance dict) in a dict.'''
+    attrs = dict( (name,getattr(self,name)) for name in self._lists + self._options )
+    # the scratch pad is only included if it exists, so formatting doesn't create it
+    if self._scratch is not None:
+      attrs['scratch'] = self._scratch
+    attrs.update( self.__dict__ )
+    return attrs
+
+  @property
+  def scratch(self):
+    if self._scratch is None:
+      self._scratch = Bunch()
+    return self._scratch
+
+  @scratch.setter
+  def scratch(self,v):
+    self._scratch = v
 
 
   # other useful names for the scratchpad
@@ -73,8 +105,8 @@ class Question(object):
 
   def __getattr__(self,name):
     # check to see if the key is in the namespace
-    if name in self.scratch:
-      return self.scratch[name]
+    if name != '_scratch' and self._scratch is not None and name in self._scratch:
+      return self._scratch[name]
 
     raise AttributeError, "'Question' object has no attribute '"+name+"'"
 
@@ -110,10 +142,13 @@ class Question(object):
     return self.add_X(X,val)
 
   def format_X(self,X,*args,**kwargs):
+    # text without replacement fields doesn't change (and the context doesn't need to be built)
+    if not any( compile_text(x).has_fields for x in X ):
+      return
+
     # create a context to format text with
-    context = {}
-    context.update(self.__dict__)
-    context.update(self.scratch)
+    context = self._attributes()
+    context.update(self._scratch or {})
     context.update(kwargs)
     for i in range(len(args)):
       context[i] = args[i]
@@ -123,10 +158,10 @@ class Question(object):
 
 
   def add_text(self,v,prepend=False):
-    return self.add_X(self._texts,v,prepend)
+    return self.add_X(self._list('_texts'),v,prepend)
 
   def set_text(self,v=None):
-    return self.set_X(self._texts,v)
+    return self.set_X(self._list('_texts'),v)
 
   def format_text(self, *args, **kwargs):
     return self.format_X(self._texts,*args,**kwargs)
@@ -134,11 +169,11 @@ class Question(object):
 
 
   def add_post_instruction(self,v,prepend=False):
-    return self.add_X(self._post_instructions,v.strip(),prepend)
+    return self.add_X(self._list('_post_instructions'),v.strip(),prepend)
   add_instruction = add_post_instruction
 
   def set_post_instruction(self,v=None):
-    return self.set_X(self._post_instructions,v)
+    return self.set_X(self._list('_post_instructions'),v)
   set_instruction = set_post_instruction
 
   def format_post_instruction(self, *args, **kwargs):
@@ -148,10 +183,10 @@ class Question(object):
 
 
   def add_pre_instruction(self,v,prepend=False):
-    return self.add_X(self._pre_instructions,v.strip(),prepend)
+    return self.add_X(self._list('_pre_instructions'),v.strip(),prepend)
 
   def set_pre_instruction(self,v=None):
-    return self.set_X(self._pre_instructions,v)
+    return self.set_X(self._list('_pre_instructions'),v)
 
   def format_pre_instruction(self, *args, **kwargs):
     return self.format_X(self._pre_instructions,*args,**kwargs)
@@ -207,7 +242,8 @@ class Question(object):
   def _add_answer(self,a,fmt=True,prepend=False):
     if inspect.isclass( a ):
       a = a()
-    a.scratch.update(self.scratch)
+    if self._scratch:
+      a.scratch.update(self._scratch)
 
     # the "magic"
     yield a
@@ -220,10 +256,10 @@ class Question(object):
       if isinstance( a, NumericalAnswer ):
         if a.units != 'dimensionless' and a.units != '':
           self.add_instruction('Give your answer in %s.' % a.units,prepend=True)
-    self.add_X(self._answers,a,prepend)
+    self.add_X(self._list('_answers'),a,prepend)
 
   def _set_answer(self,*args,**kwargs):
-    del self._answers[:]
+    del self._list('_answers')[:]
     return self._add_answer(*args,**kwargs)
 
 
@@ -231,16 +267,17 @@ class Question(object):
   def _add_part(self,text=None,fmt=True,prepend=False):
     p = Question(text)
 
-    p.scratch.update(self.scratch)
+    if self._scratch:
+      p.scratch.update(self._scratch)
     # the "magic"
     yield p
     if fmt:
       p.format_question()
 
-    self.add_X(self._parts,p,prepend)
+    self.add_X(self._list('_parts'),p,prepend)
 
   def _set_part(self,*args,**kwargs):
-    del self._parts[:]
+    del self._list('_parts')[:]
     return self._add_part(*args,**kwargs)
 
   def format_part(self, *args, **kwargs):
@@ -255,16 +292,17 @@ class Question(object):
   def _add_question(self,text=None,fmt=True,prepend=False):
     q = Question(text)
 
-    q.scratch.update(self.scratch)
+    if self._scratch:
+      q.scratch.update(self._scratch)
     # the "magic"
     yield q
     if fmt:
       q.format_question()
 
-    self.add_X(self._questions,q,prepend)
+    self.add_X(self._list('_questions'),q,prepend)
 
   def _set_question(self,*args,**kwargs):
-    del self._questions[:]
+    del self._list('_questions')[:]
     return self._add_question(*args,**kwargs)
 
 
@@ -288,18 +326,22 @@ class Question(object):
   def _call(self, err, f, **kwargs):
     # get list of args required by f
     rargs = inspect.getargspec(f).args
-    # build args to pass to f from our __dict__ and kwargs.
-    # use the value in __dict__ unless an entry exists in kwargs
+    # build args to pass to f from our attributes and kwargs.
+    # use the value in our attributes unless an entry exists in kwargs
+    scratch = self._scratch or {}
+    attrs = self._attributes()
 
     args = dict()
     missing = list()
     for a in rargs:
       if a in kwargs:
         args[a] = kwargs[a]
-      elif a in self.scratch:
-        args[a] = self.scratch[a]
-      elif a in self.__dict__:
-        args[a] = self.__dict__[a]
+      elif a in scratch:
+        args[a] = scratch[a]
+      elif a == 'scratch':
+        args[a] = self.scratch
+      elif a in attrs:
+        args[a] = attrs[a]
       else:
         missing.append(a)
 
@@ -323,7 +365,7 @@ class Question(object):
     return self._call(True,f,**kwargs)
 
 class PlainTextQuestion(Question):
-  pass
+  __slots__ = ()
 
 class LatexQuestion(Question):
-  pass
+  __slots__ = ()
@@ -4,10 +4,12 @@ from .Answer import *
 from .Emitter import *
 from .File import *
 from .Utils import *
+from . import Timing
 
 # standard modules
-import os, sys, tempfile, subprocess, hashlib
-import contextlib, urlparse, urllib, StringIO, base64
+import os, sys, re, tempfile, subprocess, hashlib
+import contextlib, urlparse, urllib, StringIO, base64, pipes, multiprocessing, mmap
+from multiprocessing.pool import ThreadPool
 
 # non-standard modules
 import dpath.util
@@ -102,16 +104,39 @@ class Quiz(object):
       return self.emit( emitter() )
 
     if not emitter is None and hasattr(emitter,'__call__'):
-      return emitter(self)
+      with Timing.stage('emit'):
+        return emitter(self)
 
     raise RuntimeError("Unknown emitter type '%s' given." % emitter)
 
+  def emit_fragments(self,emitter=None):
+    '''Return an iterator over the fragments of text emitted for the quiz.
+
+    Joining the fragments gives the same text as emit. Emitters that are not
+    Emitter instances (plain functions) give a single fragment.'''
+    if emitter == None:
+      emitter = self.DefaultEmitter
+
+    if inspect.isclass( emitter ):
+      emitter = emitter()
+
+    if isinstance( emitter, Emitter ):
+      if self.config('randomize/answers', False):
+        for q in self._questions:
+          for a in q._answers:
+            a.randomize = True
+      return emitter.fragments(self)
+
+    return iter( [ self.emit(emitter) ] )
+
   def write(self, stream="/dev/stdout"):
     if isinstance(stream,(str,unicode)):
       with open(stream, 'w') as f:
         return self.write(f)
     
-    stream.write( self.emit() )
+    with Timing.stage('emit'):
+      for fragment in self.emit_fragments():
+        stream.write( fragment )
 
   def load(self,spec):
     self._config.update(spec.get('configuration',{}))
@@ -161,8 +186,76 @@ for p in passthroughs:
   passthrough_fn(p)
 
 
+# quoted strings are skipped when matching brackets, so the brackets inside of
+# them don't need to be balanced.
+quoted_string_patterns = { '"' : re.compile(r'"(?:[^"\n\r\\]|(?:"")|(?:\\(?:[^x]|x[0-9a-fA-F]+)))*')
+                         , "'" : re.compile(r"'(?:[^'\n\r\\]|(?:'')|(?:\\(?:[^x]|x[0-9a-fA-F]+)))*")
+                         }
+bracket_patterns = { '{' : ( '}', re.compile(r'''[{}"']''') )
+                   , '[' : ( ']', re.compile(r'''[\[\]"']''') )
+                   }
+
+def match_brackets( text, i ):
+  '''Return the index just past the bracket group that starts at text[i] ('{' or '['), or -1 if it is not closed.'''
+  opener = text[i]
+  closer,pattern = bracket_patterns[opener]
+  depth = 0
+  while True:
+    m = pattern.search( text, i )
+    if m is None:
+      return -1
+    i = m.start()
+    c = text[i]
+    if c == opener:
+      depth += 1
+      i += 1
+    elif c == closer:
+      depth -= 1
+      i += 1
+      if depth == 0:
+        return i
+    else:
+      end = quoted_string_patterns[c].match( text, i ).end()
+      if text.startswith( c, end ):
+        i = end+1
+      else:
+        i += 1
+
+def match_macro_groups( text, end ):
+  '''Return the [options] and {arguments} that follow a macro command ending at text[end], the index just past them,
+  and False if they stopped at a group that is not closed (True otherwise).'''
+  groups = { '[' : [], '{' : [] }
+  for opener in '[{':
+    while text.startswith( opener, end ):
+      e = match_brackets( text, end )
+      if e < 0:
+        return groups['['], groups['{'], end, False
+      groups[opener].append( text[end+1:e-1] )
+      end = e
+  return groups['['], groups['{'], end, True
+
+
 class BbQuiz(Quiz):
     DefaultEmitter = BbEmitter
+
+    # the patterns used to expand macros are built once, with the class.
+    math_pattern   = re.compile(r'\$(?:[^$\n\r])*\$')
+    macro_pattern  = re.compile(r'\\([a-zA-Z]+)')
+    # macro commands can't contain digits, so \tex2im{...} is never expanded. only \math{...} is.
+    math_macro_pattern = re.compile(r'\\(math)(?![a-zA-Z])')
+    image_option   = ( pp.Word(pp.alphas,pp.alphanums+'_') + pp.Suppress("=")
+                     + (pp.QuotedString(quoteChar='"') | pp.Word(pp.alphas,pp.alphanums+'_') | pp.Word( pp.nums+'.' )) )
+
+    # base64 encoded images (as tuples of chunks), shared by all quizzes. keyed by url (and
+    # modification time and size for local files). the cache is limited by the size of the
+    # encoded images, and larger images are not cached.
+    image_cache = LRUCache(1024, maxbytes=64*2**20, sizeof=lambda chunks : sum( len(c) for c in chunks ))
+    image_chunk_size = 3*2**16
+    # macros return this in place of an image while the quiz is written. write() replaces it
+    # with the image, which is encoded straight to the output stream.
+    image_placeholder = '\0img:%d\0'
+    image_placeholder_pattern = re.compile(r'\x00img:(\d+)\x00')
+
     def __init__(self,*args,**kwargs):
       super(BbQuiz,self).__init__(*args,**kwargs)
       self._config = { 'randomize' :
@@ -172,6 +265,15 @@ class BbQuiz(Quiz):
 
       if not hasattr(self,"tex2im_opts"):
         self.tex2im_opts = ""
+      if not hasattr(self,"tex2im_cache_dir"):
+        self.tex2im_cache_dir = get_cache_dir('tex2im')
+      if not hasattr(self,"tex2im_jobs"):
+        self.tex2im_jobs = multiprocessing.cpu_count()
+
+      # tex2im commands that failed. they are not retried.
+      self._tex2im_failed = set()
+      # the images that macros embedded in the text being written. None when not writing.
+      self._images = None
 
     def write(self, stream="/dev/stddev"):
       if isinstance(stream,(str,unicode)):
@@ -179,60 +281,91 @@ class BbQuiz(Quiz):
           return self.write(f)
       
 
-      sstream = StringIO.StringIO()
-      super(BbQuiz,self).write(sstream)
-
-      text = sstream.getvalue()
+      # the quiz is emitted one question at a time. the macros are expanded (and images embedded)
+      # in each question just before it is written, so the expanded text for the whole quiz
+      # is never held in memory.
 
       # replace $...$ with \math{...}
-      text = pp.QuotedString(quoteChar='$',convertWhitespaceEscapes=False).setParseAction(lambda toks: r'\math{%s}'%toks[0]).transformString( text )
-
-      # Replace macros.
-      command = pp.Word(pp.alphas)
-      options = pp.originalTextFor( pp.nestedExpr( '[', ']' ) )
-      arguments = pp.originalTextFor( pp.nestedExpr( '{', '}' ) )
+      with Timing.stage('emit'):
+        fragments = [ self.math_pattern.sub( lambda m: r'\math{%s}'%m.group(0)[1:-1], fragment ) for fragment in self.emit_fragments() ]
 
-      macro = pp.Combine( pp.Literal("\\") + command("command") + pp.ZeroOrMore(options)("options") + pp.ZeroOrMore(arguments)("arguments") )
-      macro.setParseAction( self.expand_macro )
-
-      # transform string until all macros have been expanded
-      while True:
-        newtext = macro.transformString( text )
-        if newtext == text:
-          break
-        text = newtext
+      # render the math images first, so that tex2im can be run in parallel
+      self.render_math( [ cmd for fragment in fragments for cmd in self.collect_math( fragment ) ] )
 
+      self._images = []
+      try:
+        for fragment in fragments:
+          # Replace macros.
+          with Timing.stage('macros'):
+            text = self.expand_macros( fragment )
+
+          # try to catch some syntax errors that will cause Bb to choke
+
+          # 1. MC or MA questions don't have a "correct" answer
+          for line in text.split('\n'):
+            if line.startswith('MC') or line.startswith('MA'):
+              if not "\tcorrect" in line:
+                print "WARNING: A multiple choice/answer question does not have a correct answer. Blackboard will not parse this."
+                print "\t",line[3:50],'...'
+                print
+
+          self.write_text( stream, text )
+      finally:
+        self._images = None
+
+    def write_text( self, stream, text ):
+      '''Write expanded text to a stream, writing the images for the image placeholders in it.'''
+      if not self._images:
+        stream.write( text )
+        return
+
+      parts = self.image_placeholder_pattern.split( text )
+      for i,part in enumerate(parts):
+        if i % 2 == 0:
+          stream.write( part )
+        else:
+          self.write_img_html( stream, *self._images[int(part)] )
+      del self._images[:]
 
 
-      # try to catch some syntax errors that will cause Bb to choke
-
-      # 1. MC or MA questions don't have a "correct" answer
-      for line in text.split('\n'):
-        if line.startswith('MC') or line.startswith('MA'):
-          if not re.search("\tcorrect", line):
-            print "WARNING: A multiple choice/answer question does not have a correct answer. Blackboard will not parse this."
-            print "\t",line[3:50],'...'
-            print
-
-      stream.write( text )
 
 
 
+    def img_html( self, fn, fmt=None, opts="" ):
+      '''Return html code with an image embedded, for macros.
 
+      While the quiz is written, a placeholder is returned instead, and the image is
+      written straight to the output stream by write().'''
+      if self._images is None:
+        return self.make_img_html( fn, fmt, opts )
+      self._images.append( (fn,fmt,opts) )
+      return self.image_placeholder % (len(self._images)-1)
 
     def make_img_html( self, fn, fmt=None, opts="" ):
       '''Read image from a file and return html code with the image embedded.'''
+      stream = StringIO.StringIO()
+      self.write_img_html( stream, fn, fmt, opts )
+      return stream.getvalue()
+
+    @Timing.timed('images')
+    def write_img_html( self, stream, fn, fmt=None, opts="" ):
+      '''Read image from a file and write html code with the image embedded to a stream.
+
+      The base64 encoded images are cached (see image_cache), so an image that is used
+      several times is only read and encoded once.'''
 
       url = urlparse.urlparse(fn)
       if url.scheme == '':
         url = url._replace(scheme='file')
 
+      path = None
       if url.scheme == 'file':
         fn = os.path.join( os.getcwd(), fn)
         fn = os.path.normpath(fn)
         if not os.path.isfile( fn ):
           raise RuntimeError("ERROR: could not find image file '%s'." % fn )
         url = url._replace(path=fn)
+        path = fn
 
 
       url = url.geturl()
@@ -240,23 +373,131 @@ class BbQuiz(Quiz):
       if fmt is None:
         fmt = os.path.splitext( fn )[-1][1:] # get extension and remove leading '.'
 
+      # local files are cached by their modification time and size too, so that changes are picked up.
+      key = (url,)
+      if path is not None:
+        st = os.stat( path )
+        key = (url, st.st_mtime, st.st_size)
+
+      stream.write( r'''<img src="data:image/{fmt};base64,'''.format(fmt=fmt) )
+      chunks = self.image_cache.get( key )
+      if chunks is None:
+        # the chunks are only kept if the encoded image fits in the cache
+        chunks = list()
+        nbytes = 0
+        maxbytes = self.image_cache.maxbytes
+        for chunk in self.encode_img( url, path ):
+          stream.write( chunk )
+          if chunks is not None:
+            chunks.append( chunk )
+            nbytes += len(chunk)
+            if maxbytes is not None and nbytes > maxbytes:
+              chunks = None
+        if chunks is not None:
+          self.image_cache.put( key, tuple(chunks) )
+      else:
+        for chunk in chunks:
+          stream.write( chunk )
+      stream.write( r'''" {opts}>'''.format(opts=opts) )
+
+    def encode_img( self, url, path=None ):
+      '''Read an image and yield its base64 encoding in chunks.'''
+      # each chunk of data is encoded separately, so chunks must be a multiple of 3 bytes long.
+      n = 3*(self.image_chunk_size//3)
+      if path is not None:
+        with open( path, 'rb' ) as f:
+          size = os.fstat( f.fileno() ).st_size
+          if size == 0:
+            return
+          data = mmap.mmap( f.fileno(), 0, access=mmap.ACCESS_READ )
+          try:
+            for i in xrange( 0, size, n ):
+              yield base64.b64encode( data[i:i+n] )
+          finally:
+            data.close()
+        return
+
       # we use urllib here so we can support specifying remote images
       f = urllib.urlopen(url)
-      code  = base64.b64encode(f.read())
-      f.close()
-      text  = r'''<img src="data:image/{fmt};base64,{code}" {opts}>'''.format(fmt=fmt,code=code,opts=opts)
+      try:
+        data = ''
+        while True:
+          chunk = f.read( n )
+          if not chunk:
+            break
+          data += chunk
+          if len(data) >= n:
+            yield base64.b64encode( data[:n] )
+            data = data[n:]
+        if data:
+          yield base64.b64encode( data )
+      finally:
+        f.close()
+
+    def expand_macros(self,text):
+      '''Expand all macros in a string.
+
+      Macros are expanded in a single pass. The text returned by a macro is expanded
+      before moving on, so macros may return other macros. Macros that are not
+      defined are left in the text with their arguments.
+
+      Macros are expanded from the outside in, the same order as the old loop: a macro is
+      given the raw text of its arguments, and the macros left in its replacement are
+      expanded after it. Expanding the innermost macros first would hand LaTeX macros
+      (\math, \tex2im, \shell) html instead of the LaTeX in their arguments.'''
+      tokens = []
+      self._expand_macros( text, tokens, True )
+      return ''.join( tokens )
+
+    def _expand_macros(self,text,tokens,last):
+      '''Expand the macros in text and append the result to tokens.
+
+      If last is False, text is the replacement of a macro. If a macro in it is followed by
+      a group that is not closed, the rest of the text is returned unexpanded, so it can be
+      expanded together with the text that follows the replacement (the group may be closed there).'''
+      pos = 0
+      while True:
+        m = self.macro_pattern.search( text, pos )
+        if m is None:
+          break
 
-      return text
+        # a macro is a command followed by any number of [options] and {arguments}
+        options,arguments,end,closed = match_macro_groups( text, m.end() )
 
-    def expand_macro(self,toks):
+        if not closed and not last:
+          tokens.append( text[pos:m.start()] )
+          return text[m.start():]
 
-      command   = str(toks.command)
-      # options and arguments are nested expressions. the token we get
-      # will be wrapped in [] (for options) and {} (for arguments), so we need
-      # to strip them off.
-      options   = [ oo.strip() for o in toks.options for oo in str(o)[1:-1].split(',') ]
-      arguments = [str(x)[1:-1] for x in toks.arguments]
+        try:
+          replacement = self.expand_macro( m.group(1), options, arguments )
+        except pp.ParseException:
+          # a macro that could not parse its options is left in the text,
+          # but the text inside of it is still expanded.
+          tokens.append( text[pos:m.start()+1] )
+          pos = m.start()+1
+          continue
 
+        if replacement is None:
+          tokens.append( text[pos:end] )
+        else:
+          tokens.append( text[pos:m.start()] )
+          rest = self._expand_macros( replacement, tokens, False )
+          if rest is not None:
+            # the replacement ends in a macro that is not closed. scan it again along with the text after it.
+            text = rest + text[end:]
+            pos = 0
+            continue
+        pos = end
+
+      tokens.append( text[pos:] )
+      return None
+
+    def expand_macro(self,command,options,arguments):
+      '''Return the replacement text for a macro, or None if it is not defined.
+
+      options and arguments are lists with the text inside of each [...] and {...} group.'''
+
+      options   = [ oo.strip() for o in options for oo in o.split(',') ]
 
       # replacement = getattr(self,"macro_"+command)(arguments,options)
       replacement = None
@@ -267,25 +508,23 @@ class BbQuiz(Quiz):
 
       if replacement:
         replacement = re.sub( "\n", " ", replacement )
+      elif replacement is not None:
+        replacement = ""
 
       return replacement
 
 
-    macro_emph   = lambda self,args,opts :  "<em>"+args[0]+"</em>"
-    macro_textbf = lambda self,args,opts :  "<strong>"+args[0]+"</strong>"
+    macro_emph   = lambda self,args,opts :  "<em>"+args[0]+"</em>" if len(args) > 0 else None
+    macro_textbf = lambda self,args,opts :  "<strong>"+args[0]+"</strong>" if len(args) > 0 else None
 
     def macro_includegraphics(self,args,opts):
 
       fn = args[0]
       fmt = None
-      identifier = pp.Word(pp.alphas,pp.alphanums+'_')
-      string = pp.QuotedString(quoteChar='"')
-      number = pp.Word( pp.nums+'.' )
-      optExp = identifier + pp.Suppress("=") + (string | identifier | number)
 
       newopts = list()
       for opt in opts:
-        k,v = optExp.parseString( opt )
+        k,v = self.image_option.parseString( opt )
         if k == 'fmt':
           fmt = v
         else:
@@ -298,7 +537,7 @@ class BbQuiz(Quiz):
 
 
 
-      text = self.make_img_html( args[0], fmt, " ".join(newopts) )
+      text = self.img_html( args[0], fmt, " ".join(newopts) )
       return text
 
     def macro_codecogs(self,args,opts):
@@ -312,10 +551,79 @@ class BbQuiz(Quiz):
       # get the image
       fmt = 'png'
       url = "https://latex.codecogs.com/{fmt}.latex?{latex}".format(fmt=fmt,latex=latex)
-      text = self.make_img_html( url, fmt, opts='alt="ERROR: Could not render math"' )
+      text = self.img_html( url, fmt, opts='alt="ERROR: Could not render math"' )
 
       return text
 
+    def tex2im_command(self,latex,opts):
+      '''Return the tex2im command for a LaTeX snippet, with a %s for the output file.'''
+      extra_opts=self.tex2im_opts
+      if len(opts) > 1:
+        extra_opts = opts[1]
+
+      return "tex2im -o %%s %s -- '%s' "%(extra_opts,latex)
+
+    def tex2im_file(self,cmd):
+      '''Return the name of the image file for a tex2im command.'''
+      # images are named with a hash of the command used to create them, so
+      # we can tell if an image has already been created before.
+      return os.path.join( self.tex2im_cache_dir or '', "%s.png"%hashlib.sha1(cmd).hexdigest() )
+
+    def collect_math(self,text):
+      '''Return the tex2im commands for the math macros in a string, including the ones inside of other macros.'''
+      cmds = []
+      for m in self.math_macro_pattern.finditer( text ):
+        if have_user_macros and hasattr(macros,m.group(1)):
+          continue
+        options,arguments,end,closed = match_macro_groups( text, m.end() )
+        if len(arguments) > 0:
+          cmds.append( self.tex2im_command( arguments[0], [ oo.strip() for o in options for oo in o.split(',') ] ) )
+      return cmds
+
+    def render_math(self,cmds):
+      '''Create the images for a list of tex2im commands that are not in the cache yet.
+
+      Up to tex2im_jobs images are rendered at the same time.'''
+      todo = list()
+      for cmd in cmds:
+        if not cmd in todo and not cmd in self._tex2im_failed and not os.path.exists( self.tex2im_file(cmd) ):
+          todo.append( cmd )
+      if len(todo) == 0:
+        return
+
+      print "creating %d image(s) with tex2im in '%s'" % (len(todo), self.tex2im_cache_dir or os.getcwd())
+      pool = ThreadPool( max( 1, min( self.tex2im_jobs, len(todo) ) ) )
+      try:
+        with Timing.stage('tex2im', images=len(todo)):
+          statuses = pool.map( self._run_tex2im, todo )
+      finally:
+        pool.close()
+        pool.join()
+
+      for cmd,status in zip(todo,statuses):
+        if status != 0:
+          self._tex2im_failed.add( cmd )
+          print "\tWARNING: there was a problem running tex2im:'"+cmd+"'"
+          print "\tWARNING: command output was left in %s"%(os.path.splitext(self.tex2im_file(cmd))[0]+'.log')
+          print "\tWARNING: replacing with $...$, which may not work..."
+
+    def _run_tex2im(self,cmd):
+      ofn = self.tex2im_file(cmd)
+      lfn = os.path.splitext(ofn)[0]+'.log'
+      # write to a temporary file first so that a partial image never ends up in the cache
+      fd,tfn = tempfile.mkstemp( suffix='.png', dir=os.path.dirname(ofn) or '.' )
+      os.close(fd)
+      try:
+        with open(lfn,'w') as f:
+          status = subprocess.call(cmd%pipes.quote(tfn),shell=True,stdout=f,stderr=f)
+        if status == 0:
+          os.rename( tfn, ofn )
+          os.remove( lfn )
+      finally:
+        if os.path.exists( tfn ):
+          os.remove( tfn )
+      return status
+
     def macro_tex2im(self,args,opts):
       # create an image of LaTeX code using tex2im
 
@@ -328,31 +636,15 @@ class BbQuiz(Quiz):
         self.mathimg_num = 0
       self.mathimg_num += 1
 
-      extra_opts=self.tex2im_opts
-      if len(opts) > 1:
-        extra_opts = opts[1]
+      # images are normally rendered by write() before macros are expanded, but
+      # macros can create math that it didn't see.
+      cmd = self.tex2im_command(args[0],opts)
+      self.render_math( [cmd] )
+      ofn = self.tex2im_file(cmd)
+      if not os.path.exists(ofn):
+        return "$"+args[0]+"$"
 
-
-      cmd = "tex2im -o %%s %s -- '%s' "%(extra_opts,args[0])
-      # create a hash of the command used to create the image to use as the image
-      # name. this way we can tell if the image has already been created before.
-      hash = hashlib.sha1(cmd).hexdigest()
-      ofn = "%s.png"%hash
-      lfn = "%s.log"%hash
-      cmd = cmd%ofn
-      print "creating image with:'"+cmd+"'"
-      if os.path.exists(ofn):
-        print "\tskipping because '"+ofn+"' already exists. please delete it if you want to force a rebuild."
-      else:
-        with open(lfn,'w') as f:
-          status = subprocess.call(cmd,shell=True,stdout=f,stderr=f)
-          if status != 0:
-            print "\tWARNING: there was a problem running tex2im."
-            print "\tWARNING: command output was left in %s"%(lfn)
-            print "\tWARNING: replacing with $...$, which may not work..."
-            return "$"+args[0]+"$"
-
-      text = self.make_img_html( ofn, 'png', opts='alt="ERROR: Could not render math"' )
+      text = self.img_html( ofn, 'png', opts='alt="ERROR: Could not render math"' )
 
       return text
 
@@ -1,71 +1,103 @@
 # standard modules
 from weakref import *
-import inspect
- 
-# https://pygame.org/wiki/SignalSlot
+import inspect, collections
+
+# based on https://pygame.org/wiki/SignalSlot
+
+class Signal(object):
+    '''A set of slots (functions or methods) that are called when the signal is called.
+
+    Slots are called in the order they were connected. Connecting a slot that is already
+    connected moves it to the end. Methods are held with weak references, so connecting
+    an object's method doesn't keep the object alive, and the slot is removed when the
+    object is garbage collected. Functions are held with normal references.
+
+    The slots are kept in an ordered dict keyed by the slot (or the object and function
+    for methods), so connect and disconnect don't depend on the number of slots.'''
+    __slots__ = ( '_slots', '_called', '__weakref__' )
 
-class Signal:
     def __init__(self):
-        self.slots = []
- 
-        # for keeping references to _WeakMethod_FuncHost objects.
-        # If we didn't, then the weak references would die for
-        # non-method slots that we've created.
-        self.funchost = []
- 
+        self._slots = collections.OrderedDict()
+        # a tuple of the slots, for calling. it is reset when a slot is added or removed,
+        # and rebuilt by the next call.
+        self._called = ()
+
+    @staticmethod
+    def _key(slot):
+        if inspect.ismethod(slot) and slot.im_self is not None:
+            return ( id(slot.im_self), slot.im_func )
+        return slot
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, slot):
+        return self._key(slot) in self._slots
+
     def __call__(self, *args, **kwargs):
+        '''Call the slots and return a list of the values they returned that are not None.'''
+        if not self._slots:
+            return []
+        # slots can be connected or disconnected (or die) while the signal is called. that
+        # resets _called, so the tuple that is being iterated doesn't change.
+        called = self._called
+        if called is None:
+            called = self._called = tuple(self._slots.values())
         r = []
-        for i, slot in enumerate(self.slots):
-            if slot != None:
-                rr = slot(*args, **kwargs)
-                if not rr is None:
-                  r.append( rr )
-            else:
-                del self.slots[i]
+        for slot in called:
+            rr = slot(*args, **kwargs)
+            if not rr is None:
+                r.append( rr )
         return r
-                
+
     def call(self, *args, **kwargs):
         self.__call__(*args, **kwargs)
- 
+
     def connect(self, slot):
-        self.disconnect(slot)
-        if inspect.ismethod(slot):
-            self.slots.append(WeakMethod(slot))
+        key = self._key(slot)
+        self._slots.pop(key, None)
+        if inspect.ismethod(slot) and slot.im_self is not None:
+            signal = ref(self)
+            def remove(r):
+                # the object died. the slot is only removed if it wasn't reconnected since.
+                s = signal()
+                if s is not None and s._slots.get(key) is wm:
+                    del s._slots[key]
+                    s._called = None
+            wm = WeakMethod(slot, remove)
+            self._slots[key] = wm
         else:
-            o = _WeakMethod_FuncHost(slot)
-            self.slots.append(WeakMethod(o.func))
-            # we stick a copy in here just to keep the instance alive
-            self.funchost.append(o)
- 
+            self._slots[key] = slot
+        self._called = None
+
     def disconnect(self, slot):
-        try:
-            for i, wm in enumerate(self.slots):
-                if inspect.ismethod(slot):
-                    if wm.f == slot.im_func and wm.c() == slot.im_self:
-                        del self.slots[i]
-                        return
-                else:
-                    if wm.c().hostedFunction == slot:
-                        del self.slots[i]
-                        return
-        except:
-            pass
- 
+        if self._slots.pop(self._key(slot), None) is not None:
+            self._called = None
+
     def disconnectAll(self):
-        self.slots = []
-        self.funchost = []
- 
-class _WeakMethod_FuncHost:
-    def __init__(self, func):
-        self.hostedFunction = func
-    def func(self, *args, **kwargs):
-        return self.hostedFunction(*args, **kwargs)
- 
+        self._slots.clear()
+        self._called = ()
+
+class InstanceSignal(object):
+    '''A Signal attribute that is created for each instance the first time it is used,
+    so instances of a class don't share slots.
+
+    name must be the name of the attribute, the signal is stored in the instance's dict under it.'''
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        s = obj.__dict__[self.name] = Signal()
+        return s
+
 # this class was generously donated by a poster on ASPN (aspn.activestate.com)
-class WeakMethod:
-    def __init__(self, f):
+class WeakMethod(object):
+    def __init__(self, f, callback=None):
         self.f = f.im_func
-        self.c = ref(f.im_self)
+        self.c = ref(f.im_self, callback)
     def __call__(self, *args, **kwargs):
-        if self.c() == None : return
-        return self.f(self.c(), *args, **kwargs)
+        c = self.c()
+        if c is None : return
+        return self.f(c, *args, **kwargs)
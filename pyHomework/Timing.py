@@ -0,0 +1,179 @@
+'''
+Timing of the stages of a build.
+
+The stages (text formatting, pint, sympy, emission, macro expansion, images, tex2im,
+latexmk, ...) are marked with the stage context manager or the timed decorator. Timing
+is off by default, and then a timed function only checks a flag before it is called.
+Timing is turned on with enable(), by QuizGen's --profile option, or by setting the
+PYHOMEWORK_PROFILE environment variable to the name of a trace file:
+
+  PYHOMEWORK_PROFILE=build.trace.json python build-hw-01.py
+
+which prints a summary of the time spent in each stage and writes the trace when
+the process exits. The trace is in the Chrome trace event format, and can be opened
+with chrome://tracing or https://ui.perfetto.dev (the file is loaded locally).
+'''
+
+# standard modules
+import os, sys, json, atexit, functools, threading, thread, timeit
+
+# the events recorded since timing was enabled, or None if timing is disabled.
+# each event is a (name, start, duration, self time, pid, thread, args) tuple.
+_events = None
+_start = None
+# the stages that are running in each thread
+_local = threading.local()
+
+timer = timeit.default_timer
+
+def enable():
+  '''Turn timing on and clear the events recorded so far.'''
+  global _events, _start
+  _events = list()
+  _start = timer()
+
+def disable():
+  global _events
+  _events = None
+
+def enabled():
+  return _events is not None
+
+def events( clear=False ):
+  '''Return the events recorded so far. If clear is True, they are removed.'''
+  evts = list( _events or [] )
+  if clear and _events is not None:
+    del _events[:]
+  return evts
+
+def add_events( events ):
+  '''Add events recorded by another process (see QuizGen.process_files).'''
+  if _events is not None:
+    _events.extend( events )
+
+def _stack():
+  try:
+    return _local.stack
+  except AttributeError:
+    _local.stack = list()
+    return _local.stack
+
+class _Stage(object):
+  __slots__ = ( 'name', 'args', '_start', '_children' )
+
+  def __init__(self, name, args):
+    self.name = name
+    self.args = args
+
+  def __enter__(self):
+    _stack().append( self )
+    self._children = 0.
+    self._start = timer()
+    return self
+
+  def __exit__(self, *exc):
+    duration = timer() - self._start
+    stack = _stack()
+    stack.pop()
+    if stack:
+      stack[-1]._children += duration
+    # timing may have been disabled while the stage was running
+    if _events is not None:
+      _events.append( ( self.name, self._start, duration, duration - self._children, os.getpid(), thread.get_ident(), self.args ) )
+    return False
+
+class _NullStage(object):
+  '''The stage used when timing is disabled.'''
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    return False
+
+_null_stage = _NullStage()
+
+def stage( name, **args ):
+  '''Return a context manager that times a stage of the build, if timing is enabled.
+
+  Stages can be nested. The self time of a stage does not include the time spent
+  in the stages inside of it. Keyword arguments are stored with the event (and shown
+  in the trace viewer).'''
+  if _events is None:
+    return _null_stage
+  return _Stage( name, args )
+
+def timed( name ):
+  '''Decorator that times each call of a function as a stage.'''
+  def decorator( f ):
+    @functools.wraps( f )
+    def wrapper( *args, **kwargs ):
+      if _events is None:
+        return f( *args, **kwargs )
+      with _Stage( name, {} ):
+        return f( *args, **kwargs )
+    return wrapper
+  return decorator
+
+def summary():
+  '''Return a dict with the number of calls, the total time and the self time of each stage.'''
+  stages = dict()
+  for name,start,duration,self_time,pid,tid,args in _events or []:
+    s = stages.setdefault( name, [0,0.,0.] )
+    s[0] += 1
+    s[1] += duration
+    s[2] += self_time
+  return stages
+
+def print_summary( stream=None ):
+  '''Print the time spent in each stage, sorted by self time.'''
+  if stream is None:
+    stream = sys.stdout
+  wall = timer() - _start if _start is not None else 0.
+  stages = summary()
+  stream.write( "%-16s %8s %11s %11s %7s\n" % ('stage','calls','total (s)','self (s)','self %') )
+  for name in sorted( stages, key=lambda name : -stages[name][2] ):
+    calls,total,self_time = stages[name]
+    stream.write( "%-16s %8d %11.4f %11.4f %7.1f\n" % (name, calls, total, self_time, 100*self_time/wall if wall > 0 else 0.) )
+  stream.write( "%-16s %8s %11.4f\n" % ('wall time','',wall) )
+
+def write_trace( filename ):
+  '''Write the recorded events to a file in the Chrome trace event format.'''
+  events = _events or []
+  origin = min( [ e[1] for e in events ] or [0] )
+  trace = [ { 'name' : name, 'cat' : 'pyHomework', 'ph' : 'X'
+            , 'ts' : 1e6*(start-origin), 'dur' : 1e6*duration
+            , 'pid' : pid, 'tid' : tid, 'args' : args }
+            for name,start,duration,self_time,pid,tid,args in events ]
+  with open( filename, 'w' ) as f:
+    json.dump( { 'traceEvents' : trace, 'displayTimeUnit' : 'ms' }, f )
+
+def report( filename=None ):
+  '''Print the summary and write the trace (if a file name is given).'''
+  print_summary()
+  if filename:
+    write_trace( filename )
+    print "profile trace written to '%s'" % filename
+
+# the file the trace is written to when the process exits, see enable_report.
+_report_target = None
+_report_registered = False
+
+def enable_report( filename=None ):
+  '''Turn timing on (if it isn't already), and report when the process exits.
+
+  The report is only made once. Calling this again (e.g. with PYHOMEWORK_PROFILE set and
+  QuizGen's --profile) only changes the file the trace is written to.'''
+  global _report_target, _report_registered
+  if not enabled():
+    enable()
+  if filename:
+    _report_target = filename
+  if not _report_registered:
+    atexit.register( _report_at_exit )
+    _report_registered = True
+
+def _report_at_exit():
+  report( _report_target )
+
+if os.environ.get('PYHOMEWORK_PROFILE'):
+  enable_report( os.environ['PYHOMEWORK_PROFILE'] )
@@ -0,0 +1,224 @@
+'''
+The unit registry shared by all pyHomework modules.
+
+Parsing pint's unit definitions is a large part of the start up time, so the
+parsed definitions are cached on disk and reused by later processes. The cache
+is keyed on the pint and pyErrorProp versions. pyErrorProp builds a default
+registry when it is imported, and it is given the shared registry instead.
+'''
+
+# local modules
+from .Utils import get_cache_dir
+
+# standard modules
+import os, sys, re, hashlib, tempfile, importlib
+import cPickle as pickle
+
+# non-standard modules
+import pint
+import pkg_resources
+from pint.util import ParserHelper, SourceIterator
+
+# bump this if the layout of the cached data changes
+REGISTRY_CACHE_VERSION = 1
+# CachedUnitRegistry reads and restores pint internals, so it is only used with the pint
+# versions it has been checked against. other versions get a plain registry.
+REGISTRY_CACHE_PINT_VERSIONS = ( '0.8', )
+
+def get_version( dist ):
+  try:
+    return pkg_resources.get_distribution(dist).version
+  except Exception:
+    return 'unknown'
+
+def registry_cache_file():
+  '''Return the name of the unit registry cache file, or None if caching is disabled.'''
+  d = get_cache_dir('units')
+  if d is None:
+    return None
+  key = 'v%d pint-%s pyErrorProp-%s python-%d.%d' % ( (REGISTRY_CACHE_VERSION, get_version('pint'), get_version('pyErrorProp')) + sys.version_info[:2] )
+  return os.path.join( d, 'registry-%s.pickle' % hashlib.sha1(key).hexdigest() )
+
+def split_blocks( lines ):
+  '''Return the @directive ... @end blocks (groups, systems, contexts, etc.) from a list of definition lines.'''
+  blocks = []
+  block = None
+  for line in lines:
+    line = line.split('#',1)[0].strip()
+    if not line:
+      continue
+    if block is None:
+      if line.startswith('@') and not line.startswith('@import'):
+        block = [line]
+    else:
+      block.append(line)
+      if line.startswith('@end'):
+        blocks.append(block)
+        block = None
+  return blocks
+
+
+class CachedUnitRegistry(pint.UnitRegistry):
+  '''A pint UnitRegistry that caches the parsed default definitions in a file.
+
+  On a cache hit, the unit, prefix and dimension definitions and the dimensionality
+  caches are loaded from the file. Only the directive blocks (groups, systems and contexts)
+  are parsed again, because pint builds them as registry specific objects.
+  '''
+
+  _definition_names = ['_defaults', '_dimensions', '_units', '_units_casei', '_prefixes', '_suffixes']
+
+  def __init__(self, cache_file=None, **kwargs):
+    self._cache_file = cache_file
+    self._cache_lines = None
+    self._cache_definitions = None
+    self._cache_restored = None
+    super(CachedUnitRegistry,self).__init__(**kwargs)
+
+  @property
+  def from_cache(self):
+    return self._cache_restored is not None
+
+  def _record_lines(self, lines):
+    for line in lines:
+      self._cache_lines.append(line)
+      yield line
+
+  def load_definitions(self, file, is_resource=False):
+    if self._cache_lines is not None:
+      # we are building the cache. record the lines read from the definition files
+      if not isinstance(file,(str,unicode)):
+        file = self._record_lines(file)
+      return super(CachedUnitRegistry,self).load_definitions(file, is_resource)
+
+    if self._initialized or self._cache_file is None or self._filename != '':
+      return super(CachedUnitRegistry,self).load_definitions(file, is_resource)
+
+    cache = self._read_cache()
+    if cache is not None:
+      self._restore_definitions(cache)
+      return
+
+    self._cache_lines = []
+    try:
+      super(CachedUnitRegistry,self).load_definitions(file, is_resource)
+    finally:
+      lines,self._cache_lines = self._cache_lines,None
+
+    # the definitions are pickled now because pint adds to them before the cache is built.
+    definitions = dict( (name,getattr(self,name)) for name in self._definition_names )
+    definitions['_blocks'] = split_blocks( lines )
+    definitions['_root_unit_names'] = self.get_group('root').non_inherited_unit_names
+    self._cache_definitions = pickle.dumps( definitions, pickle.HIGHEST_PROTOCOL )
+
+  def _build_cache(self):
+    if self._cache_restored is not None:
+      cache = self._cache_restored
+      self._root_units_cache = dict( (ParserHelper(1,k),v) for k,v in cache['_root_units_cache'] )
+      self._dimensionality_cache = dict( (ParserHelper(1,k),v) for k,v in cache['_dimensionality_cache'] )
+      self._dimensional_equivalents = cache['_dimensional_equivalents']
+      self._units.update( cache['_units'] )
+      return
+
+    # building the cache defines some prefixed units (millimeter, kilometer, etc.)
+    names = set(self._units)
+    super(CachedUnitRegistry,self)._build_cache()
+
+    if self._cache_definitions is not None:
+      # ParserHelper objects can't be unpickled as dict keys, so store the keys as plain dicts.
+      cache = { 'definitions'              : self._cache_definitions
+              , '_root_units_cache'        : [ (dict(k),v) for k,v in self._root_units_cache.items() ]
+              , '_dimensionality_cache'    : [ (dict(k),v) for k,v in self._dimensionality_cache.items() ]
+              , '_dimensional_equivalents' : self._dimensional_equivalents
+              , '_units'                   : dict( (k,v) for k,v in self._units.items() if not k in names )
+              }
+      self._cache_definitions = None
+      self._write_cache( cache )
+
+  def _restore_definitions(self, cache):
+    definitions = cache['definitions']
+    for name in self._definition_names:
+      setattr( self, name, definitions[name] )
+    self.get_group('root').add_units( *definitions['_root_unit_names'] )
+
+    for block in definitions['_blocks']:
+      ifile = SourceIterator(block)
+      next(ifile)
+      if block[0].startswith('@group'):
+        # units defined inside of groups were restored above
+        self.Group.from_lines( ifile.block_iter(), lambda definition: None )
+      else:
+        self._parsers[ re.split(r' |\(', block[0])[0] ]( ifile )
+
+    self._cache_restored = cache
+
+  def _read_cache(self):
+    if not os.path.isfile( self._cache_file ):
+      return None
+    try:
+      with open( self._cache_file, 'rb' ) as f:
+        cache = pickle.load( f )
+      cache['definitions'] = pickle.loads( cache['definitions'] )
+      return cache
+    except Exception:
+      # a stale or corrupt cache is just rebuilt
+      return None
+
+  def _write_cache(self, cache):
+    tmp = ''
+    try:
+      fd,tmp = tempfile.mkstemp( dir=os.path.dirname(self._cache_file) )
+      with os.fdopen(fd,'wb') as f:
+        pickle.dump( cache, f, pickle.HIGHEST_PROTOCOL )
+      os.rename( tmp, self._cache_file )
+    except Exception as e:
+      if os.path.exists( tmp ):
+        os.remove( tmp )
+      print "WARNING: could not write unit registry cache '%s'. reason:"%self._cache_file,type(e),str(e)
+
+def make_registry( cache_file ):
+  '''Return a CachedUnitRegistry, or a plain UnitRegistry if the cached registry can't be built.
+
+  The cache relies on pint internals (_units, _groups, _systems, _contexts, ...), so a pint
+  version that stores its definitions differently should still get a working registry.'''
+  if cache_file is None or not '.'.join( pint.__version__.split('.')[:2] ) in REGISTRY_CACHE_PINT_VERSIONS:
+    return pint.UnitRegistry()
+  try:
+    return CachedUnitRegistry( cache_file )
+  except Exception as e:
+    print "WARNING: could not use unit registry cache '%s', using a plain registry. reason:"%cache_file,type(e),str(e)
+    # don't try to restore the same file again
+    if os.path.exists( cache_file ):
+      try:
+        os.remove( cache_file )
+      except OSError:
+        pass
+    return pint.UnitRegistry()
+
+def import_with_registry( name, registry ):
+  '''Import a module that builds a default pint UnitRegistry when it is imported, and give it registry instead.
+
+  pint.UnitRegistry() (with no arguments) returns registry while the module is imported. The
+  stand in is a subclass of UnitRegistry, so isinstance and issubclass checks in the module still work.'''
+  UnitRegistry = pint.UnitRegistry
+  # pint's registries have a metaclass that finishes building them after __init__, so
+  # the stand in overrides the call on its metaclass, not __new__.
+  class SharedRegistryMeta(type(UnitRegistry)):
+    def __call__(cls, *args, **kwargs):
+      if args or kwargs:
+        return UnitRegistry( *args, **kwargs )
+      return registry
+    def __instancecheck__(cls, obj):
+      return isinstance( obj, UnitRegistry )
+  pint.UnitRegistry = SharedRegistryMeta( 'UnitRegistry', (UnitRegistry,), {} )
+  try:
+    return importlib.import_module( name )
+  finally:
+    pint.UnitRegistry = UnitRegistry
+
+
+units = make_registry( registry_cache_file() )
+UncertaintyConvention = import_with_registry( 'pyErrorProp', units ).UncertaintyConvention
+uconv = UncertaintyConvention( units )
+UQ_ = uconv.UncertainQuantity
+Q_  = UQ_.Quantity
@@ -1,11 +1,167 @@
 #! /usr/bin/env python
 
+# pyHomework.numpy would shadow numpy otherwise
+from __future__ import absolute_import
+
 import datetime
 import string
 import re
+import os
 import pprint
+import collections
 import pyparsing as pp
+import numpy
+
+from . import Timing
+
+class LRUCache(object):
+  '''A small least-recently-used cache with hit/miss counters.
+
+  If maxbytes is given, the total size of the values (measured with sizeof) is kept
+  under it too, and values larger than maxbytes are not cached at all.'''
+  def __init__(self, maxsize=1024, maxbytes=None, sizeof=len):
+    self.maxsize = maxsize
+    self.maxbytes = maxbytes
+    self.sizeof = sizeof
+    self.nbytes = 0
+    self.hits = 0
+    self.misses = 0
+    self._data = collections.OrderedDict()
 
+  def __len__(self):
+    return len(self._data)
+
+  def __contains__(self, key):
+    return key in self._data
+
+  def get(self, key, default=None):
+    try:
+      value = self._data.pop(key)
+    except KeyError:
+      self.misses += 1
+      return default
+    self._data[key] = value
+    self.hits += 1
+    return value
+
+  def put(self, key, value):
+    self._discard(key)
+    if self.maxbytes is not None:
+      size = self.sizeof(value)
+      if size > self.maxbytes:
+        return value
+      self.nbytes += size
+    self._data[key] = value
+    while len(self._data) > self.maxsize or (self.maxbytes is not None and self.nbytes > self.maxbytes):
+      self._discard( next(iter(self._data)) )
+    return value
+
+  def _discard(self, key):
+    if key in self._data:
+      value = self._data.pop(key)
+      if self.maxbytes is not None:
+        self.nbytes -= self.sizeof(value)
+
+  def items(self):
+    '''Return the (key,value) pairs, from least to most recently used. This doesn't count as a use.'''
+    return self._data.items()
+
+  def clear(self):
+    self._data.clear()
+    self.nbytes = 0
+    self.hits = 0
+    self.misses = 0
+
+
+# the whitespace that pyparsing skips before each element of a grammar
+_white = '[' + re.escape(pp.ParserElement.DEFAULT_WHITE_CHARS) + ']*'
+
+def _ustr(obj):
+  if isinstance(obj,list):
+    return ''.join( _ustr(x) for x in obj )
+  if isinstance(obj,unicode):
+    return obj
+  return str(obj)
+
+class TextTemplate(object):
+  '''A text string compiled into literal and replacement field segments.
+
+  Fields are matched the same way as the pyparsing grammar
+
+    Literal(beg) + SkipTo(Literal(end), failOn=Literal(beg)) + Literal(end)
+
+  used to, so each field holds the innermost text between a pair of delimiters (with
+  leading whitespace removed). Literal segments are strings, fields are (expression, original text)
+  tuples.
+  '''
+
+  # one compiled pattern per delimiter pair
+  _patterns = dict()
+
+  @classmethod
+  def get_pattern(cls, delimiters):
+    if not delimiters in cls._patterns:
+      beg,end = [ re.escape(d) for d in delimiters ]
+      cls._patterns[delimiters] = re.compile( beg + _white + '((?:(?!'+_white+beg+'|'+end+').)*)' + _white + end, re.DOTALL )
+    return cls._patterns[delimiters]
+
+  def __init__(self, text, delimiters=('{','}')):
+    self.segments = []
+    last = 0
+    for m in self.get_pattern( tuple(delimiters) ).finditer( text ):
+      if m.start() > last:
+        self.segments.append( text[last:m.start()] )
+      exp = m.group(1)
+      self.segments.append( (exp, delimiters[0]+exp+delimiters[1]) )
+      last = m.end()
+
+    if last == 0:
+      self.segments = [text]
+    elif last < len(text):
+      self.segments.append( text[last:] )
+
+  @property
+  def has_fields(self):
+    return any( isinstance(seg,tuple) for seg in self.segments )
+
+  def render(self, context, try_eval=False):
+    tokens = []
+    for seg in self.segments:
+      if isinstance(seg,tuple):
+        val = replace_field( seg[0], context, try_eval )
+        if val is None:
+          tokens.append( seg[1] )
+        else:
+          # like pyparsing's transformString, lists are spliced in and empty values are dropped
+          tokens += [ _ustr(x) for x in (val if isinstance(val,list) else [val]) if x ]
+      else:
+        tokens.append( seg )
+    return ''.join(tokens)
+
+_template_cache = LRUCache(4096)
+
+def compile_text(text, delimiters=('{','}')):
+  '''Return the (cached) TextTemplate for a text string.'''
+  key = (text,tuple(delimiters))
+  template = _template_cache.get(key)
+  if template is None:
+    template = _template_cache.put( key, TextTemplate(text,delimiters) )
+  return template
+
+def replace_field(exp, context, try_eval=False):
+  try:
+    s = '{'+exp+'}'
+    return s.format(**context)
+  except Exception as e:
+    print "WARNING: failed to replace '"+exp+"' using string.format(). reason:",type(e),str(e)
+    if try_eval:
+      try:
+        return eval(exp,{'__builtins__':None},context)
+      except Exception as ee:
+        print "WARNING: failed to replace '"+exp+"' using eval()."
+        return None
+
+@Timing.timed('format_text')
 def format_text(text, delimiters=('{','}'), try_eval=False, *args, **kwargs):
 
   context = {}
@@ -13,27 +169,31 @@ def format_text(text, delimiters=('{','}'), try_eval=False, *args, **kwargs):
     context[i] = args[i]
   context.update(kwargs)
 
-  def replaceToken(text, loc, toks):
-    exp = toks[1]
+  return compile_text( text, delimiters ).render( context, try_eval )
+
+def stack( vals ):
+  '''Stack a list of numbers or pint quantities into an array (or a quantity with an array magnitude).'''
+  v0 = vals[0]
+  if hasattr( v0, 'units' ) and hasattr( v0, 'magnitude' ):
+    return v0.__class__( numpy.array( [ v.to(v0.units).magnitude for v in vals ] ), v0.units )
+  return numpy.array( vals )
+
+def get_cache_dir( *subdirs ):
+  '''Return (and create) the directory used to cache data between runs.
+
+  The location can be set with the PYHOMEWORK_CACHE_DIR environment variable. Setting it
+  to an empty string disables caching, in which case None is returned.'''
+  d = os.environ.get('PYHOMEWORK_CACHE_DIR', os.path.join( os.path.expanduser('~'), '.cache', 'pyHomework' ))
+  if d == '':
+    return None
+  d = os.path.join( d, *subdirs )
+  if not os.path.isdir( d ):
     try:
-      s = '{'+exp+'}'
-      return s.format(**context)
-    except Exception as e:
-      print "WARNING: failed to replace '"+exp+"' using string.format(). reason:",type(e),str(e)
-      if try_eval:
-        try:
-          return eval(exp,{'__builtins__':None},context)
-        except Exception as ee:
-          print "WARNING: failed to replace '"+exp+"' using eval()."
-          return None
-
-
-  token = pp.Literal(delimiters[0]) + pp.SkipTo(pp.Literal(delimiters[1]), failOn=pp.Literal(delimiters[0])) + pp.Literal(delimiters[1])
-
-  token.setParseAction(replaceToken)
-  text = token.transformString( text )
-
-  return text
+      os.makedirs( d )
+    except OSError:
+      if not os.path.isdir( d ):
+        return None
+  return d
 
 def toBool( v ):
     if isinstance(v,str):
@@ -0,0 +1,254 @@
+'''Per-student variants of a quiz.
+
+The questions of the quiz are templates: their text refers to scratch variables
+(e.g. {v0}) that are bound to parameter generators, and their numerical answers are
+computed from the same variables. Each student gets a seed, and their variant is made
+by drawing the parameters with that seed. The questions are built once. The answers
+for all of the variants are computed with a single call that gets each parameter as
+an array (one value per variant), and each variant is written by formatting the
+question text in place and restoring it afterwards.
+
+  quiz = BbQuiz()
+  with quiz._add_question('A ball is thrown straight up at {v0}. How high does it go?', fmt=False) as q:
+    with q._add_answer( NumericalAnswer( Q_(1,'m') ) ):
+      pass
+
+  variants = QuizVariants( quiz, seed='quiz-3' )
+  variants.param( q, 'v0', uniform( 5, 15, 'm/s', sigfigs=2 ) )
+  variants.answer( q, lambda v0 : v0**2 / (2*Q_(9.8,'m/s^2')) )
+  variants.write( 'quiz-3', ['alice','bob'] )
+
+Questions that use parameters should be added with fmt=False, so that their fields
+are still in the text when the variants are formatted.
+'''
+
+# pyHomework.numpy would shadow numpy otherwise
+from __future__ import absolute_import
+
+# local modules
+from .HomeworkAssignment import HomeworkAssignment
+from .Answer import NumericalAnswer
+from .Utils import Bunch, stack
+from .Units import Q_
+
+# standard modules
+import os, re, random, hashlib, contextlib
+
+# non-standard modules
+import numpy
+
+def _round( x, sigfigs ):
+  if sigfigs is None:
+    return x
+  return float( '%.*g' % (sigfigs,x) )
+
+def _value( x, units, sigfigs ):
+  x = _round( x, sigfigs )
+  if units is None:
+    return x
+  return Q_(x,units)
+
+# parameter generators. a generator is any function that takes a numpy.random.RandomState
+# and returns one value.
+
+def uniform( low, high, units=None, sigfigs=None ):
+  '''Generator for values drawn uniformly from [low,high), rounded to sigfigs if given.'''
+  def gen( rng ):
+    return _value( rng.uniform(low,high), units, sigfigs )
+  return gen
+
+def randint( low, high, units=None ):
+  '''Generator for integers drawn uniformly from [low,high] (both ends included, like random.randint).'''
+  def gen( rng ):
+    return _value( int(rng.randint(low,high+1)), units, None )
+  return gen
+
+def choice( values ):
+  '''Generator for one of a list of values.'''
+  values = list(values)
+  def gen( rng ):
+    return values[ rng.randint( len(values) ) ]
+  return gen
+
+
+class QuizVariants(object):
+  '''Generates and writes per-student variants of a quiz (or of a quiz in a HomeworkAssignment).'''
+
+  def __init__(self, quiz, seed=0, name='default'):
+    self.assignment = None
+    if isinstance( quiz, HomeworkAssignment ):
+      self.assignment = quiz
+      quiz = quiz.get_quiz(name)
+    self.quiz = quiz
+    self.name = name
+    self.seed = seed
+
+    # (question, name, generator)
+    self._params = []
+    # (question, answer, function)
+    self._answers = []
+
+  def param(self, question, name, gen):
+    '''Bind a scratch variable of a question to a parameter generator.'''
+    self._params = [ p for p in self._params if not (p[0] is question and p[1] == name) ]
+    self._params.append( (question, name, gen) )
+
+  def answer(self, question, func, i=0):
+    '''Compute the i'th answer of a question with a function of its scratch variables.
+
+    The function is called once for all variants, with each parameter given as an array,
+    so it should be written with numpy (or pint) operations. If that fails, it is called
+    for each variant.'''
+    a = question._answers[i]
+    if not isinstance( a, NumericalAnswer ):
+      raise RuntimeError("Only numerical answers can be computed for variants. Answer %d is a %s." % (i,a.__class__.__name__))
+    self._answers = [ x for x in self._answers if not x[1] is a ]
+    self._answers.append( (question, a, func) )
+
+  def student_seed(self, student):
+    '''Return the random seed for a student.
+
+    The seed only depends on the quiz seed and the student, so a student's variant
+    does not change when students are added to or removed from the list.'''
+    return int( hashlib.sha1( '%s:%s' % (self.seed,student) ).hexdigest()[:8], 16 )
+
+  def generate(self, students):
+    '''Draw the parameters and compute the answers for a list of students.
+
+    Returns a list of variants (Bunch instances) with the student, seed, and the values
+    of the parameters and answers in the order they were added.'''
+    seeds = [ self.student_seed(s) for s in students ]
+
+    draws = [ list() for p in self._params ]
+    for seed in seeds:
+      rng = numpy.random.RandomState( seed )
+      for j,(q,name,gen) in enumerate( self._params ):
+        draws[j].append( gen( rng ) )
+
+    answers = [ self._compute( q, func, draws ) for q,a,func in self._answers ]
+
+    variants = list()
+    for k in range(len(students)):
+      variants.append( Bunch( student=students[k]
+                            , seed=seeds[k]
+                            , params=[ d[k] for d in draws ]
+                            , answers=[ x[k] for x in answers ] ) )
+    return variants
+
+  def _compute(self, question, func, draws):
+    '''Compute an answer for every variant. Returns a list with one value per variant.'''
+    n = len( draws[0] ) if len(draws) > 0 else 0
+    columns = [ (name,d) for (q,name,gen),d in zip(self._params,draws) if q is question ]
+    try:
+      kwargs = dict( (name,stack(d)) for name,d in columns )
+      ans = question.call( func, **kwargs )
+      if numpy.ndim( getattr( ans, 'magnitude', ans ) ) == 0:
+        # the answer doesn't depend on the parameters
+        return [ ans ]*n
+      if len(ans) != n:
+        raise ValueError("expected %d answers, got %d" % (n,len(ans)))
+      return [ ans[k] for k in range(n) ]
+    except Exception:
+      return [ question.call( func, **dict( (name,d[k]) for name,d in columns ) ) for k in range(n) ]
+
+  @contextlib.contextmanager
+  def bind(self, variant):
+    '''Set the quiz up for a variant while in the context.
+
+    The question text is formatted with the variant's parameters, the answers are set,
+    and the random module is seeded with the student's seed (so that randomized question
+    and answer order is reproducible). Everything is restored when the context exits.'''
+    state = random.getstate()
+    restore = [ (self.quiz, '_order', list(self.quiz._order)) ]
+
+    params = dict()
+    for (q,name,gen),val in zip(self._params,variant.params):
+      params.setdefault( id(q), (q,dict()) )[1][name] = val
+
+    try:
+      random.seed( variant.seed )
+      for q in self.quiz._questions:
+        for a in q._answers:
+          if hasattr( a, '_order' ):
+            restore.append( (a, '_order', list(a._order)) )
+      for q,kwargs in params.values():
+        self._format( q, kwargs, restore )
+      for (q,a,func),val in zip(self._answers,variant.answers):
+        restore.append( (a, 'quantity', a._quant) )
+        if hasattr( val, 'to' ) and hasattr( a._quant, 'units' ):
+          val = val.to( a._quant.units )
+        a.quantity = val
+      yield self.quiz
+    finally:
+      for obj,attr,val in reversed(restore):
+        setattr( obj, attr, val )
+      random.setstate( state )
+
+  def _format(self, question, kwargs, restore):
+    '''Format a question (and its parts and answer choices) with a variant's parameters.
+
+    The formatted text goes into new lists, and the original lists are added to restore.'''
+    for attr in ['_texts','_pre_instructions','_post_instructions']:
+      restore.append( (question, attr, getattr(question,attr)) )
+      setattr( question, attr, list( getattr(question,attr) ) )
+    question.format_question( **kwargs )
+
+    for a in question._answers:
+      if hasattr( a, '_choices' ):
+        restore.append( (a, '_choices', a._choices) )
+        a._choices = list( a._choices )
+        context = a._attributes()
+        context.update( a._scratch or {} )
+        context.update( kwargs )
+        a.format_answer( **context )
+
+    for p in list(question._parts) + list(question._questions):
+      self._format( p, kwargs, restore )
+
+  def write_variant(self, variant, stream):
+    '''Write the quiz for a variant to a stream.'''
+    with self.bind( variant ):
+      if self.assignment is None:
+        self.quiz.write( stream )
+      else:
+        self.assignment.write_quiz( stream, self.name )
+
+  def key_header(self):
+    index = dict( (id(q),i+1) for i,q in enumerate(self.quiz._questions) )
+    header = ['student','seed']
+    header += [ 'Q%s %s' % (index.get(id(q),'?'),name) for q,name,gen in self._params ]
+    header += [ 'Q%s answer' % index.get(id(q),'?') for q,a,func in self._answers ]
+    return header
+
+  def key_row(self, variant):
+    '''Return the answer key entries for a variant. The answers are formatted by the answer instances.'''
+    row = [ str(variant.student), str(variant.seed) ]
+    row += [ str(p) for p in variant.params ]
+    with self.bind( variant ):
+      row += [ a.quantity for q,a,func in self._answers ]
+    return row
+
+  def write_key(self, variants, stream):
+    '''Write a tab separated answer key table for a list of variants.'''
+    stream.write( '\t'.join( self.key_header() ) + '\n' )
+    for v in variants:
+      stream.write( '\t'.join( self.key_row(v) ) + '\n' )
+
+  def filename(self, basename, student):
+    return '%s-%s.txt' % (basename, re.sub(r'[^\w.-]','_',str(student)))
+
+  def write(self, directory, students, basename='quiz'):
+    '''Write a quiz file for each student and the answer key (<basename>-key.txt) to a directory.
+
+    Returns the variants.'''
+    if not os.path.isdir( directory ):
+      os.makedirs( directory )
+
+    variants = self.generate( students )
+    for v in variants:
+      with open( os.path.join( directory, self.filename( basename, v.student ) ), 'w' ) as f:
+        self.write_variant( v, f )
+    with open( os.path.join( directory, basename+'-key.txt' ), 'w' ) as f:
+      self.write_key( variants, f )
+
+    return variants
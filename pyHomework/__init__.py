@@ -1,21 +1,68 @@
-import sys
-
-try:
-  import sympy
-  from .sympy import *
-  from .sympy.Equations import *
-except Exception as e:
-  print "sympy failed to import. sympy support disabled."
-  print "Error Raised:"
-  print e
- 
-try:
-  from .numpy.quantity_calcs import *
-except Exception as e:
-  print "numpy failed to import. numpy support disabled."
-  print "Error Raised:"
-  print e
+import sys, types, importlib
 
+# Units is imported before anything that imports pyErrorProp, so that pyErrorProp's default
+# unit registry is the shared (cached) registry instead of a second one (see Units.import_with_registry).
+from . import Units
 from .Constants import *
 from .HomeworkAssignment import *
+from .Variants import QuizVariants
+from .Pool import QuestionPool
 
+# the sympy and numpy layers are expensive to import (sympy in particular) and
+# most quiz builds never touch them. the names they provide are listed here and
+# the modules are only imported the first time one of the names is accessed.
+_lazy_modules = { '.sympy.Equations' : ( 'sympy'
+                                       , [ 'sympy', 'sy', 'SymbolCollection', 'merge', 'EquationsCollection'
+                                         , 'expr_eval', 'expr_eval_batch', 'Equality_eval', 'Equality' ] )
+                , '.numpy.quantity_calcs' : ( 'numpy'
+                                            , [ 'numpy', 'np', 'unitof', 'magof', 'dot', 'cross', 'magnitude'
+                                              , 'direction', 'make_vec', 'null', 'xhat', 'yhat', 'zhat' ] )
+                }
+_lazy_names = dict( (name,modname) for modname in _lazy_modules for name in _lazy_modules[modname][1] )
+
+class _LazyModule(types.ModuleType):
+  '''Module type that imports the sympy and numpy layers on first attribute access.'''
+
+  def __getattr__(self,name):
+    if name in _lazy_names:
+      self._load(_lazy_names[name])
+      if name in self.__dict__:
+        return self.__dict__[name]
+
+    raise AttributeError("'module' object has no attribute '%s'" % name)
+
+  def _load(self,modname):
+    if modname in self._loaded:
+      return self._loaded[modname]
+
+    lib,names = _lazy_modules[modname]
+    try:
+      mod = importlib.import_module(modname,__name__)
+      for name in names:
+        if hasattr(mod,name) and not name in self.__dict__:
+          self.__dict__[name] = getattr(mod,name)
+      self._loaded[modname] = True
+    except Exception as e:
+      print "%s failed to import. %s support disabled." % (lib,lib)
+      print "Error Raised:"
+      print e
+      self._loaded[modname] = False
+
+    return self._loaded[modname]
+
+  @property
+  def __all__(self):
+    # star imports pull in everything, so the lazy layers have to be loaded here.
+    names = [ name for name in self.__dict__ if not name.startswith('_') ]
+    for modname in sorted(_lazy_modules):
+      if self._load(modname):
+        names += [ name for name in _lazy_modules[modname][1] if name in self.__dict__ and not name in names ]
+    return names
+
+_module = _LazyModule(__name__, __doc__)
+_module.__dict__.update( sys.modules[__name__].__dict__ )
+# keep a reference to the original module. python 2 clears a module's globals when it is
+# garbage collected, and the functions above still refer to them.
+_module._original = sys.modules[__name__]
+_module._loaded = dict()
+sys.modules[__name__] = _module
@@ -3,12 +3,7 @@ Unit support for numpy array calculations.
 '''
 
 import numpy as np
-from pyErrorProp import UncertaintyConvention
-
-uconv = UncertaintyConvention()
-units = uconv._UNITREGISTRY
-UQ_ = uconv.UncertainQuantity
-Q_  = UQ_.Quantity
+from ..Units import uconv, units, UQ_, Q_
 
 def unitof(q):
   if isinstance(q,Q_):
@@ -22,29 +17,56 @@ def magof(q):
   else:
     return q
 
+def asvec(v):
+  '''Return a vector, or an array of vectors, that numpy can work with. A list of quantities
+  is taken to be the components of a vector and is converted with make_vec.'''
+  if isinstance(v,(list,tuple)) and any( isinstance(x,Q_) for x in v ):
+    return make_vec( v )
+  return v
+
 def dot(v1,v2):
-  w = sum( [ x[0]*x[1] for x in zip(v1,v2) ] )
+  '''Dot product of two vectors. Arrays of vectors (one vector per row) are multiplied row by row.'''
+  v1,v2 = asvec(v1),asvec(v2)
+  w = np.sum( np.multiply( magof(v1), magof(v2) ), axis=-1 )
+  if isinstance(v1,Q_) or isinstance(v2,Q_):
+    return Q_(w,unitof(v1)*unitof(v2))
   return w
 
 def cross(v1,v2):
+  '''Cross product of two vectors. Arrays of vectors (one vector per row) are multiplied row by row.'''
+  v1,v2 = asvec(v1),asvec(v2)
   u1 = unitof( v1 )
   u2 = unitof( v2 )
-  w  = np.cross(v1,v2)
+  w  = np.cross( magof(v1), magof(v2) )
   return w*Q_(1,u1)*Q_(1,u2)
 
 def magnitude( vec ):
   return np.sqrt( dot( vec, vec ) )
 
 def direction( vec ):
-  ret = np.arctan2( vec[1], vec[0] )
-  if ret < Q_(0,'radian'):
-    ret += Q_(2*3.14159,'radian')
-  return ret
+  '''Angle of a vector in the x-y plane, between 0 and 2 pi. Arrays of vectors give an array of angles.'''
+  vec = asvec(vec)
+  if not isinstance(vec,Q_):
+    vec = np.asarray(vec)
+  ret = np.arctan2( vec[...,1], vec[...,0] )
+  negative = magof(ret) < 0
+  if np.ndim( negative ) == 0:
+    if negative:
+      ret += Q_(2*3.14159,'radian')
+    return ret
+  return ret + Q_(2*3.14159,'radian')*negative
 
 def make_vec( components ):
+  '''Make a vector quantity from its components, which are converted to the units of the first one.
+
+  If the components are arrays, an array of vectors (one vector per row) is returned. A list of
+  vectors, each given as a list of components, also gives an array of vectors.'''
+  if isinstance( components[0], (list,tuple) ):
+    u = unitof( components[0][0] )
+    return Q_( np.array( [ [ magof(x.to(u)) for x in row ] for row in components ] ), u )
   u = unitof( components[0] )
   c = [ magof(x.to(u)) for x in components ]
-  return Q_(c,u)
+  return Q_( np.stack( c, axis=-1 ), u )
 
 
 null = np.array( [0,0,0] )
@@ -1,73 +1,225 @@
 import sympy as sy
+import os, sys, string, hashlib, marshal, tempfile, atexit, contextlib
+import cPickle as pickle
+try:
+  import fcntl
+except ImportError:
+  fcntl = None
+
+from ..Utils import LRUCache, get_cache_dir
+from .. import Timing
+from .Utils import expr_eval, expr_eval_batch
+
+# bump this if the layout of the snapshot changes
+SNAPSHOT_VERSION = 1
+
+# solutions found by sy.solve. see cached_solve.
+solve_cache = LRUCache(1024)
+
+def cached_solve( expr, var, **kwargs ):
+  '''Memoized version of sy.solve.
+
+  Solutions are cached on the equation and the variables solved for. sympy expressions
+  hash and compare by their structure, so equal equations built separately share solutions.
+  The solutions in the cache are shared, so the returned list should not be modified.'''
+  # systems of equations and lists of variables are given as lists, which can't be hashed
+  key = ( tuple(expr) if isinstance(expr,list) else expr
+        , tuple(var) if isinstance(var,list) else var
+        , tuple(sorted(kwargs.items())) )
+  solutions = solve_cache.get( key )
+  if solutions is None:
+    with Timing.stage('sympy'):
+      solutions = solve_cache.put( key, sy.solve( expr, var, **kwargs ) )
+  return solutions
+
+class SymbolCollection(object):
+  '''A collection of commonly used sympy symbols.
+
+  The letters a - z and A - Z and the symbols listed in _symbols are attributes. Each
+  symbol is created the first time it is used.'''
+
+  # the sympy.symbols() spec for each symbol.
+               # some greek letters
+  _symbols = { 'phi'  : r'\phi'
+               , 'the'  : r'\theta'
+               , 'psi'  : r'\psi'
+               , 'pi'   : r'\pi'
+               , 'tau'  : r'\tau'
+
+               # some useful special symbols
+               # common unit vectors
+               , 'rhat' : '\hat{r}'
+               , 'ihat' : '\hat{i}'
+               , 'jhat' : '\hat{j}'
+               , 'khat' : '\hat{k}'
+
+               # common indexed variables
+               , 'qi'   : 'q:10'
+               , 'mi'   : 'm:10'
+               , 'Ri'   : 'R:10'
+               , 'xi'   : 'x:10'
+               , 'vi'   : 'v:10'
+
+               # circuits
+               , 'emf'  : '\mathcal{E}'
+               , 'Vi'   : 'V_i'
+               , 'Vo'   : 'V_o'
+               , 'Vp'   : 'V_p'
+               , 'Ii'   : 'I_i'
+               , 'Io'   : 'I_o'
+               , 'Ip'   : 'I_p'
+               , 'Ni'   : 'N_i'
+               , 'No'   : 'N_o'
+               , 'Di'   : 'di'
+               , 'Dt'   : 'dt'
+
+               # optics
+               , 'di'   : 'd_i'
+               , 'do'   : 'd_o'
+
+               , 'ni'   : 'n_i'
+               , 'nr'   : 'n_r'
+               , 'thi'  : r'\theta_i'
+               , 'thr'  : r'\theta_r'
+
+               , 'nl'   : 'n_l'
+               , 'nm'   : 'n_m'
+               , 'Rf'   : 'R_f'
+               , 'Rb'   : 'R_b'
+
+
+               # constants
+               , 'g_'   : 'g_'
+               , 'G_'   : 'G_'
+               , 'k_'   : 'k_'
+               , 'e_'   : 'e_'
+               , 'c_'   : 'c_'
+               , 'pi_'  : '\pi_'
+               , 'ep0_' : '\epsilon_0'
+               , 'mu0_' : '\mu_0'
+               , 'R_'   : 'R_'
+               , 'kB_'  : 'kB_'
+             }
+
+  def __getattr__(self,name):
+    if name in self._symbols:
+      spec = self._symbols[name]
+    elif len(name) == 1 and name in string.ascii_letters:
+      spec = name
+    else:
+      raise AttributeError("'%s' object has no attribute '%s'" % (self.__class__.__name__,name))
+
+    symbol = sy.symbols(spec)
+    self.__dict__[name] = symbol
+    return symbol
+
+  def __dir__(self):
+    return sorted( set( dir(self.__class__) ) | set(self.__dict__) | set(self._symbols) | set(string.ascii_letters) )
+
+def snapshot_file( cls ):
+  '''Return the name of the snapshot file for an EquationsCollection class, or None if caching is disabled.
+
+  The name is keyed on the sympy version and the code that defines the equations and symbols,
+  so changing either one starts a new snapshot.'''
+  d = get_cache_dir('equations')
+  if d is None:
+    return None
+  key = hashlib.sha1( 'v%d sympy-%s python-%d.%d' % ( (SNAPSHOT_VERSION, sy.__version__) + sys.version_info[:2] ) )
+  for name in sorted(cls._equations):
+    key.update( name )
+    key.update( marshal.dumps( cls._equations[name].func_code ) )
+  key.update( repr( sorted( SymbolCollection._symbols.items() ) ) )
+  return os.path.join( d, '%s-%s.pickle' % (cls.__name__, key.hexdigest()) )
+
+def read_snapshot( filename ):
+  if not os.path.isfile( filename ):
+    return None
+  try:
+    with open( filename, 'rb' ) as f:
+      snapshot = pickle.load( f )
+    return { 'equations' : snapshot['equations'], 'solutions' : dict( snapshot['solutions'] ) }
+  except Exception:
+    # a stale or corrupt snapshot is just rebuilt
+    return None
+
+@contextlib.contextmanager
+def snapshot_lock( filename ):
+  '''Hold a lock on a snapshot file while it is merged and written, so processes writing the same snapshot take turns.'''
+  if fcntl is None:
+    yield
+    return
+  try:
+    f = open( filename+'.lock', 'a' )
+  except IOError:
+    yield
+    return
+  with f:
+    fcntl.flock( f.fileno(), fcntl.LOCK_EX )
+    try:
+      yield
+    finally:
+      fcntl.flock( f.fileno(), fcntl.LOCK_UN )
+
+def write_snapshot( filename, snapshot ):
+  tmp = ''
+  try:
+    fd,tmp = tempfile.mkstemp( dir=os.path.dirname(filename) or '.' )
+    with os.fdopen(fd,'wb') as f:
+      # sympy expressions are stored as a list of pairs instead of dict keys, so they are hashed after they are loaded.
+      pickle.dump( { 'equations' : snapshot['equations'], 'solutions' : snapshot['solutions'].items() }, f, pickle.HIGHEST_PROTOCOL )
+    os.rename( tmp, filename )
+  except Exception as e:
+    if os.path.exists( tmp ):
+      os.remove( tmp )
+    print "WARNING: could not write equations snapshot '%s'. reason:"%filename,type(e),str(e)
+
+# the snapshots that have been read, by file name. all collections that use the same file
+# share its snapshot, and they are all saved by one atexit hook.
+_snapshots = dict()
+
+def get_snapshot( filename ):
+  '''Return the snapshot for a file, reading it the first time it is used.'''
+  snapshot = _snapshots.get( filename )
+  if snapshot is None:
+    if not _snapshots:
+      atexit.register( save_snapshots )
+    snapshot = read_snapshot( filename ) or { 'equations' : dict(), 'solutions' : dict() }
+    snapshot['changed'] = False
+    _snapshots[filename] = snapshot
+  return snapshot
+
+def save_snapshot( filename ):
+  '''Save the equations in a snapshot and the solutions found for them.
+
+  The file may have been written by other processes (or collections) since it was read,
+  so what is in it now is merged into the snapshot first. Nothing is written if nothing
+  new has been built or solved.'''
+  snapshot = _snapshots.get( filename )
+  if snapshot is None:
+    return
+
+  equations = set( snapshot['equations'].values() )
+  for key,solutions in solve_cache.items():
+    if key[0] in equations and not key in snapshot['solutions']:
+      snapshot['solutions'][key] = solutions
+      snapshot['changed'] = True
+
+  if not snapshot['changed']:
+    return
 
-class SymbolCollection:
-  def __init__(self):
-    # add a - z and A - Z
-    sys = sy.symbols('a:Z')
-    for s in sys:
-      setattr( self, s.__str__(), s )
-
-    # some greek letters
-
-    self.phi = sy.symbols(r'\phi')
-    self.the = sy.symbols(r'\theta')
-    self.psi = sy.symbols(r'\psi')
-    self.pi  = sy.symbols(r'\pi')
-    self.tau = sy.symbols(r'\tau')
-
-    # some useful special symbols
-    # common unit vectors
-    self.rhat = sy.symbols('\hat{r}')
-    self.ihat = sy.symbols('\hat{i}')
-    self.jhat = sy.symbols('\hat{j}')
-    self.khat = sy.symbols('\hat{k}')
-
-    # common indexed variables
-    self.qi = sy.symbols('q:10')
-    self.mi = sy.symbols('m:10')
-    self.Ri = sy.symbols('R:10')
-    self.xi = sy.symbols('x:10')
-    self.vi = sy.symbols('v:10')
-
-    # circuits
-    self.emf = sy.symbols('\mathcal{E}')
-    self.Vi  = sy.symbols('V_i')
-    self.Vo  = sy.symbols('V_o')
-    self.Vp  = sy.symbols('V_p')
-    self.Ii  = sy.symbols('I_i')
-    self.Io  = sy.symbols('I_o')
-    self.Ip  = sy.symbols('I_p')
-    self.Ni  = sy.symbols('N_i')
-    self.No  = sy.symbols('N_o')
-    self.Di  = sy.symbols('di')
-    self.Dt  = sy.symbols('dt')
-
-    # optics
-    self.di   = sy.symbols('d_i')
-    self.do   = sy.symbols('d_o')
-
-    self.ni   = sy.symbols('n_i')
-    self.nr   = sy.symbols('n_r')
-    self.thi  = sy.symbols(r'\theta_i')
-    self.thr  = sy.symbols(r'\theta_r')
-
-    self.nl   = sy.symbols('n_l')
-    self.nm   = sy.symbols('n_m')
-    self.Rf   = sy.symbols('R_f')
-    self.Rb   = sy.symbols('R_b')
-
-
-    # constants
-    self.g_    = sy.symbols('g_')
-    self.G_    = sy.symbols('G_')
-    self.k_    = sy.symbols('k_')
-    self.e_    = sy.symbols('e_')
-    self.c_    = sy.symbols('c_')
-    self.pi_   = sy.symbols('\pi_')
-    self.ep0_  = sy.symbols('\epsilon_0')
-    self.mu0_  = sy.symbols('\mu_0')
-    self.R_    = sy.symbols('R_')
-    self.kB_    = sy.symbols('kB_')
+  with snapshot_lock( filename ):
+    saved = read_snapshot( filename )
+    if saved is not None:
+      for name,equation in saved['equations'].items():
+        snapshot['equations'].setdefault( name, equation )
+      for key,solutions in saved['solutions'].items():
+        snapshot['solutions'].setdefault( key, solutions )
+    write_snapshot( filename, snapshot )
+  snapshot['changed'] = False
+
+def save_snapshots():
+  for filename in _snapshots.keys():
+    save_snapshot( filename )
 
 def merge(d1,d2):
   d3 = d1.copy()
@@ -75,105 +227,161 @@ def merge(d1,d2):
   return d3
 
 
-class EquationsCollection:
-  def __init__(self):
-    self.s = SymbolCollection()
-    self.c = None
-    s = self.s
-    c = self.c
-    self.consts = dict()
-
-    # GEOMETRY
-    self.ArcLength = sy.Eq( s.s, s.the * s.r )
+class EquationsCollection(object):
+  '''A collection of common equations, written with the symbols in a SymbolCollection.
 
-    self.CircumferenceCircle = sy.Eq( s.C, 2*s.pi_ * s.r )
-    self.CircumferenceSquare = sy.Eq( s.C, 2*s.l + 2*s.w )
+  The equations listed in _equations are attributes. Each one is built the first
+  time it is used.
 
-    self.AreaCircle = sy.Eq( s.A, s.pi_ * s.r * s.r )
-    self.AreaSquare = sy.Eq( s.A, s.l * s.w )
+  The equations and their solutions (see cached_solve) are saved in a snapshot file when
+  the process exits, and loaded the first time an equation is used. snapshot is the name
+  of the file. True uses a file in the cache directory (see snapshot_file) and False disables
+  the snapshot.'''
 
-    self.SurfaceAreaBox      = sy.Eq(s.A, 2*s.h*s.w + 2*s.l*s.w + 2*s.h*s.l)
-    self.SurfaceAreaCube     = self.SurfaceAreaBox.subs(s.h, s.l).subs(s.w, s.l)
-    self.SurfaceAreaCylinder = sy.Eq(s.A, 2*s.pi_*s.r**2 + 2*s.pi_*s.r*s.h)
-    self.SurfaceAreaSphere   = sy.Eq(s.A, 4*s.pi_*s.R**2)
-    self.SurfaceAreaCone     = sy.Eq(s.A, s.pi_*s.r**2 + s.pi_*s.r*s.s)
+  # the function that builds each equation from the symbols (s) and the other equations (e)
+                 # GEOMETRY
+  _equations = { 'ArcLength' : lambda s,e : sy.Eq( s.s, s.the * s.r )
 
-    self.VolumeBox      = sy.Eq(s.V, s.l*s.w*s.h)
-    self.VolumeCube     = self.VolumeBox.subs(s.h, s.l).subs(s.w, s.l)
-    self.VolumeSphere = sy.Eq( s.V, 4*s.pi_*s.R**3/3 )
-    self.VolumeCylinder = sy.Eq( s.V, s.pi_*s.r**2*s.h )
-    self.VolumeCone     = sy.Eq( s.V, s.pi_*s.r**2*s.h/3 )
+               , 'CircumferenceCircle' : lambda s,e : sy.Eq( s.C, 2*s.pi_ * s.r )
+               , 'CircumferenceSquare' : lambda s,e : sy.Eq( s.C, 2*s.l + 2*s.w )
 
+               , 'AreaCircle' : lambda s,e : sy.Eq( s.A, s.pi_ * s.r * s.r )
+               , 'AreaSquare' : lambda s,e : sy.Eq( s.A, s.l * s.w )
 
-    # MISC MATH
+               , 'SurfaceAreaBox'      : lambda s,e : sy.Eq(s.A, 2*s.h*s.w + 2*s.l*s.w + 2*s.h*s.l)
+               , 'SurfaceAreaCube'     : lambda s,e : e.SurfaceAreaBox.subs(s.h, s.l).subs(s.w, s.l)
+               , 'SurfaceAreaCylinder' : lambda s,e : sy.Eq(s.A, 2*s.pi_*s.r**2 + 2*s.pi_*s.r*s.h)
+               , 'SurfaceAreaSphere'   : lambda s,e : sy.Eq(s.A, 4*s.pi_*s.R**2)
+               , 'SurfaceAreaCone'     : lambda s,e : sy.Eq(s.A, s.pi_*s.r**2 + s.pi_*s.r*s.s)
 
-    self.ExpRise                   = sy.Eq( s.x, s.X*(1 - sy.exp(-s.t / s.tau) ) )
-    self.ExpDecay                  = sy.Eq( s.x, s.X*sy.exp(-s.t / s.tau) )
+               , 'VolumeBox'      : lambda s,e : sy.Eq(s.V, s.l*s.w*s.h)
+               , 'VolumeCube'     : lambda s,e : e.VolumeBox.subs(s.h, s.l).subs(s.w, s.l)
+               , 'VolumeSphere'   : lambda s,e : sy.Eq( s.V, 4*s.pi_*s.R**3/3 )
+               , 'VolumeCylinder' : lambda s,e : sy.Eq( s.V, s.pi_*s.r**2*s.h )
+               , 'VolumeCone'     : lambda s,e : sy.Eq( s.V, s.pi_*s.r**2*s.h/3 )
 
 
+                 # MISC MATH
 
+               , 'ExpRise'  : lambda s,e : sy.Eq( s.x, s.X*(1 - sy.exp(-s.t / s.tau) ) )
+               , 'ExpDecay' : lambda s,e : sy.Eq( s.x, s.X*sy.exp(-s.t / s.tau) )
 
-    # PHYSICS I (Mechanics)
 
-    self.KineticEnergy                = sy.Eq( s.K, s.m*s.v*s.v/2 )
-    self.GravitationalPotentialEnergy = sy.Eq( s.U, s.m * s.g_ * s.h )
+                 # PHYSICS I (Mechanics)
 
-    self.KinematicPosition = sy.Eq( s.x, s.xi[0] + s.vi[0]*s.t + (s.a*s.t**2)/2 )
-    self.KinematicVelocity = sy.Eq( s.v, s.vi[0] + s.a*s.t )
+               , 'KineticEnergy'                : lambda s,e : sy.Eq( s.K, s.m*s.v*s.v/2 )
+               , 'GravitationalPotentialEnergy' : lambda s,e : sy.Eq( s.U, s.m * s.g_ * s.h )
 
+               , 'KinematicPosition' : lambda s,e : sy.Eq( s.x, s.xi[0] + s.vi[0]*s.t + (s.a*s.t**2)/2 )
+               , 'KinematicVelocity' : lambda s,e : sy.Eq( s.v, s.vi[0] + s.a*s.t )
 
-    # PHYSICS II (Electricity and Magnatism)
 
-    self.CoulombForce              = sy.Eq( s.F, s.k_*s.qi[1]*s.qi[2]/s.r**2 )
-    self.vCoulombForce             = sy.Eq( s.F, s.k_*s.qi[1]*s.qi[2]*s.rhat/s.r**2 )
+                 # PHYSICS II (Electricity and Magnatism)
 
-    self.PointChargeField          = sy.Eq( s.E, s.k_*s.q/s.r**2 )
-    self.vPointChargeField         = sy.Eq( s.E, s.k_*s.q*s.rhat/s.r**2 )
+               , 'CoulombForce'  : lambda s,e : sy.Eq( s.F, s.k_*s.qi[1]*s.qi[2]/s.r**2 )
+               , 'vCoulombForce' : lambda s,e : sy.Eq( s.F, s.k_*s.qi[1]*s.qi[2]*s.rhat/s.r**2 )
 
-    self.PointChargePotential      = sy.Eq( s.V, s.k_*s.q/s.r )
-    self.PotentialDiffUniformField = sy.Eq( s.V, s.E*s.x )
-    self.ElectricPotentialEnergy   = sy.Eq( s.U, s.q * s.V )
+               , 'PointChargeField'  : lambda s,e : sy.Eq( s.E, s.k_*s.q/s.r**2 )
+               , 'vPointChargeField' : lambda s,e : sy.Eq( s.E, s.k_*s.q*s.rhat/s.r**2 )
 
-    self.CapacitorEquation         = sy.Eq( s.Q, s.C*s.V )
-    self.ParallelPlateCapacitor    = sy.Eq( s.C, s.k*s.ep0_*s.A/s.d )
+               , 'PointChargePotential'      : lambda s,e : sy.Eq( s.V, s.k_*s.q/s.r )
+               , 'PotentialDiffUniformField' : lambda s,e : sy.Eq( s.V, s.E*s.x )
+               , 'ElectricPotentialEnergy'   : lambda s,e : sy.Eq( s.U, s.q * s.V )
 
-    self.MagneticFieldCircularLoop = sy.Eq( s.B, (s.mu0_ * s.R**2 * s.i)  / ( 2*sy.sqrt(s.R**2 + s.z**2 )**3) )
-    self.MagneticFieldLongWire     = sy.Eq( s.B, (s.mu0_ * s.i)  / ( 2*s.pi_*s.r ) )
-    self.MagneticFieldFiniteWire   = sy.Eq( s.B, ( (s.mu0_ * s.i)  / ( 4*s.pi_*s.y ) ) * ( s.b / sy.sqrt(s.b**2 + s.y**2) - s.a / sy.sqrt(s.a**2 + s.y**2) ) )
+               , 'CapacitorEquation'      : lambda s,e : sy.Eq( s.Q, s.C*s.V )
+               , 'ParallelPlateCapacitor' : lambda s,e : sy.Eq( s.C, s.k*s.ep0_*s.A/s.d )
 
-    self.LongInductorInductance    = sy.Eq( s.L, s.mu0_*s.N*s.N*s.A/s.l )
-    self.AvgInducedEmf             = sy.Eq( s.emf, -s.L * s.Di / s.Dt )
-    self.InductorEnergy            = sy.Eq( s.U, s.L * s.i * s.i / 2 )
+               , 'MagneticFieldCircularLoop' : lambda s,e : sy.Eq( s.B, (s.mu0_ * s.R**2 * s.i)  / ( 2*sy.sqrt(s.R**2 + s.z**2 )**3) )
+               , 'MagneticFieldLongWire'     : lambda s,e : sy.Eq( s.B, (s.mu0_ * s.i)  / ( 2*s.pi_*s.r ) )
+               , 'MagneticFieldFiniteWire'   : lambda s,e : sy.Eq( s.B, ( (s.mu0_ * s.i)  / ( 4*s.pi_*s.y ) ) * ( s.b / sy.sqrt(s.b**2 + s.y**2) - s.a / sy.sqrt(s.a**2 + s.y**2) ) )
 
-    self.ElectricalPower           = sy.Eq( s.P, s.I*s.V )
-    self.ResistorPower             = sy.Eq( s.P, s.i*s.i*s.R )
-    self.TransformerPower          = sy.Eq( s.Vi*s.Ii, s.Vo*s.Io )
-    self.TransformerRatio          = sy.Eq( s.Vi/s.Vo, s.Ni/s.No )
+               , 'LongInductorInductance' : lambda s,e : sy.Eq( s.L, s.mu0_*s.N*s.N*s.A/s.l )
+               , 'AvgInducedEmf'          : lambda s,e : sy.Eq( s.emf, -s.L * s.Di / s.Dt )
+               , 'InductorEnergy'         : lambda s,e : sy.Eq( s.U, s.L * s.i * s.i / 2 )
 
-    self.RLCurrentRise             = self.ExpRise.subs(  [(s.x,s.i), (s.X, s.Ip), (s.tau, s.L / s.R )] )
-    self.RLCurrentDecay            = self.ExpDecay.subs( [(s.x,s.i), (s.X, s.Ip), (s.tau, s.L / s.R )] )
+               , 'ElectricalPower'  : lambda s,e : sy.Eq( s.P, s.I*s.V )
+               , 'ResistorPower'    : lambda s,e : sy.Eq( s.P, s.i*s.i*s.R )
+               , 'TransformerPower' : lambda s,e : sy.Eq( s.Vi*s.Ii, s.Vo*s.Io )
+               , 'TransformerRatio' : lambda s,e : sy.Eq( s.Vi/s.Vo, s.Ni/s.No )
 
-    self.RLVoltageRise             = self.RLCurrentRise.subs(  [(s.i,s.v),(s.Ip,s.Vp)] )
-    self.RLVoltageDecay            = self.RLCurrentDecay.subs( [(s.i,s.v),(s.Ip,s.Vp)] )
+               , 'RLCurrentRise'  : lambda s,e : e.ExpRise.subs(  [(s.x,s.i), (s.X, s.Ip), (s.tau, s.L / s.R )] )
+               , 'RLCurrentDecay' : lambda s,e : e.ExpDecay.subs( [(s.x,s.i), (s.X, s.Ip), (s.tau, s.L / s.R )] )
 
-    self.LensEquation          = sy.Eq( 1/s.di + 1/s.do , 1/s.f )
-    self.MagnificationEquation = sy.Eq( s.m , -s.di / s.do )
-    self.SnellsLaw             = sy.Eq( s.ni*sy.sin(s.thi), s.nr*sy.sin(s.thr) )
-    self.LensMakersEquation    = sy.Eq( 1/s.f, ( s.nl / s.nm - 1 ) * ( 1/s.Rf - 1/s.Rb ) )
+               , 'RLVoltageRise'  : lambda s,e : e.RLCurrentRise.subs(  [(s.i,s.v),(s.Ip,s.Vp)] )
+               , 'RLVoltageDecay' : lambda s,e : e.RLCurrentDecay.subs( [(s.i,s.v),(s.Ip,s.Vp)] )
 
+               , 'LensEquation'          : lambda s,e : sy.Eq( 1/s.di + 1/s.do , 1/s.f )
+               , 'MagnificationEquation' : lambda s,e : sy.Eq( s.m , -s.di / s.do )
+               , 'SnellsLaw'             : lambda s,e : sy.Eq( s.ni*sy.sin(s.thi), s.nr*sy.sin(s.thr) )
+               , 'LensMakersEquation'    : lambda s,e : sy.Eq( 1/s.f, ( s.nl / s.nm - 1 ) * ( 1/s.Rf - 1/s.Rb ) )
 
-    # THERMO
 
-    self.IdealGasLaw           = sy.Eq( s.P*s.V, s.N*s.kB_*s.T )
-    self.IdealGasLawChem       = sy.Eq( s.P*s.V, s.n*s.R_*s.T )
-    self.IdealGasEnergy        = sy.Eq( s.U, s.f*s.N*s.kB_*s.T/2 )
+                 # THERMO
 
+               , 'IdealGasLaw'     : lambda s,e : sy.Eq( s.P*s.V, s.N*s.kB_*s.T )
+               , 'IdealGasLawChem' : lambda s,e : sy.Eq( s.P*s.V, s.n*s.R_*s.T )
+               , 'IdealGasEnergy'  : lambda s,e : sy.Eq( s.U, s.f*s.N*s.kB_*s.T/2 )
 
-    # MISC PHYSICS
 
-    self.SchwarzchildRadius = sy.Eq( s.r, 2*s.G_*s.m/s.c_**2)
+                 # MISC PHYSICS
 
+               , 'SchwarzchildRadius' : lambda s,e : sy.Eq( s.r, 2*s.G_*s.m/s.c_**2)
+               }
 
+  def __init__(self, snapshot=True):
+    self.s = SymbolCollection()
+    self.c = None
+    self.consts = dict()
+    self._snapshot_file = snapshot
+    self._snapshot = None
+
+  def __getattr__(self,name):
+    # __getattr__ is only called for attributes that aren't set yet
+    if not name in self._equations:
+      raise AttributeError("'%s' object has no attribute '%s'" % (self.__class__.__name__,name))
+
+    snapshot = self.load_snapshot()
+    if name in snapshot['equations']:
+      equation = snapshot['equations'][name]
+    else:
+      equation = self._equations[name]( self.s, self )
+      snapshot['equations'][name] = equation
+      snapshot['changed'] = True
+    self.__dict__[name] = equation
+    return equation
+
+  @property
+  def snapshot_file(self):
+    if self._snapshot_file is True:
+      self._snapshot_file = snapshot_file( self.__class__ )
+    return self._snapshot_file or None
+
+  def load_snapshot(self):
+    '''Load the snapshot saved by an earlier run, if there is one, and return it.
+
+    The solutions in the snapshot are added to the solve cache, so solving one of the
+    equations again doesn't call sy.solve. Collections that use the same file share
+    the snapshot (see get_snapshot), and it is saved when the process exits.'''
+    if self._snapshot is not None:
+      return self._snapshot
+
+    if self.snapshot_file is None:
+      self._snapshot = { 'equations' : dict(), 'solutions' : dict(), 'changed' : False }
+      return self._snapshot
+
+    self._snapshot = get_snapshot( self.snapshot_file )
+    for key,solutions in self._snapshot['solutions'].items():
+      if not key in solve_cache:
+        solve_cache.put( key, solutions )
+    return self._snapshot
+
+  def save_snapshot(self):
+    '''Save the snapshot file now, instead of waiting for the process to exit.'''
+    if self.snapshot_file is not None:
+      save_snapshot( self.snapshot_file )
+
+  def __dir__(self):
+    return sorted( set( dir(self.__class__) ) | set(self.__dict__) | set(self._equations) )
 
   def set_constants(self, c):
     self.c = c
@@ -195,10 +403,27 @@ class EquationsCollection:
     if not isinstance( vvar, (tuple,list) ):
       return self.eval( expr, [vvar], context, soli )[vvar]
 
+    solutions = cached_solve( expr, vvar, dict=True )[soli]
     ans = dict()
     for var in vvar:
-      solution = sy.solve( expr, vvar, dict=True )[soli][var]
-      ans[var] = expr_eval( solution, merge( context, self.consts ) )
+      ans[var] = expr_eval( solutions[var], merge( context, self.consts ) )
+    return ans
+
+  def eval_batch(self, expr, vvar, contexts, soli = 0 ):
+    '''Like eval, but for a list of contexts. Each variable is evaluated for all of the contexts in one call (see expr_eval_batch).'''
+
+    if not isinstance( vvar, (tuple,list) ):
+      return self.eval_batch( expr, [vvar], contexts, soli )[vvar]
+
+    if isinstance( contexts, dict ):
+      contexts = merge( contexts, self.consts )
+    else:
+      contexts = [ merge( context, self.consts ) for context in contexts ]
+
+    solutions = cached_solve( expr, vvar, dict=True )[soli]
+    ans = dict()
+    for var in vvar:
+      ans[var] = expr_eval_batch( solutions[var], contexts )
     return ans
 
   def consts(self):
@@ -206,29 +431,12 @@ class EquationsCollection:
 
   def subs(self, toexpr, fromexpr, var, soli = 0 ):
     '''Replace var in toexpr by solving fromexpr and substituting.'''
-    sol = sy.solve( fromexpr, var )[soli]
+    sol = cached_solve( fromexpr, var )[soli]
     ret = toexpr.subs( var, sol )
     return ret
 
-def expr_eval( expr, context = {} ):
-  '''Evaluates a sympy expression with the given context.'''
-
-  # if we have a list of expressions, evaluate each
-  if isinstance( expr, list ):
-    results = [ expr_eval(x,context) for x in expr ]
-    return results
-
-  # symbols that we have values for
-  symbols = context.keys()
-  # values of the symbols (these can be pint quantities!)
-  vals = [ context[k] for k in symbols ]
-  # create a lambda function that can be evaluated
-  f = sy.lambdify( symbols, expr, "numpy" )
-  # evaluate and return
-  return f( *vals )
-
 def Equality_eval(self, var, context, soli = 0):
-  solution = sy.solve( self, var )[soli]
+  solution = cached_solve( self, var )[soli]
   ans = expr_eval( solution, context )
   return ans
 
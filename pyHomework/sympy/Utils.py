@@ -1,4 +1,32 @@
+import sympy as sy
+import numpy
 
+from ..Utils import LRUCache, stack
+from .. import Timing
+
+# functions created by sy.lambdify. see compile_expr.
+lambdify_cache = LRUCache(1024)
+
+def compile_expr( expr, symbols ):
+  '''Return a numpy function of symbols that evaluates expr.
+
+  lambdify generates and compiles python code, which costs much more than evaluating
+  the function, so the functions are cached on the expression and the symbols.'''
+  key = ( expr, tuple(symbols) )
+  try:
+    f = lambdify_cache.get( key )
+  except TypeError:
+    # mutable sympy objects (matrices) can't be hashed
+    return sy.lambdify( symbols, expr, "numpy" )
+  if f is None:
+    f = lambdify_cache.put( key, sy.lambdify( symbols, expr, "numpy" ) )
+  return f
+
+def context_symbols( context ):
+  '''Return the symbols of a context in a fixed order, so that equal contexts share compiled functions.'''
+  return tuple( sorted( context.keys(), key=sy.default_sort_key ) )
+
+@Timing.timed('sympy')
 def expr_eval( expr, context = {} ):
   '''Evaluates a sympy expression with the given context.'''
 
@@ -8,14 +36,46 @@ def expr_eval( expr, context = {} ):
     return results
 
   # symbols that we have values for
-  symbols = context.keys()
+  symbols = context_symbols( context )
   # values of the symbols (these can be pint quantities!)
   vals = [ context[k] for k in symbols ]
-  # create a lambda function that can be evaluated
-  f = lambdify( symbols, expr, "numpy" )
+  # get a function that can be evaluated
+  f = compile_expr( expr, symbols )
   # evaluate and return
   return f( *vals )
 
+@Timing.timed('sympy')
+def expr_eval_batch( expr, contexts ):
+  '''Evaluates a sympy expression for many contexts at once.
+
+  contexts is either a list of contexts with the same symbols, or a single context
+  that maps each symbol to an array of values. The expression is compiled once and
+  called once with arrays (or array quantities), so the result is an array with one
+  value for each context. Values that can't be stacked into arrays (uncertain quantities
+  for example) are evaluated one context at a time, with the same compiled function.'''
+
+  if isinstance( expr, list ):
+    return [ expr_eval_batch(x,contexts) for x in expr ]
+
+  if isinstance( contexts, dict ):
+    return expr_eval( expr, contexts )
+
+  if len(contexts) == 0:
+    return numpy.array( [] )
+
+  symbols = context_symbols( contexts[0] )
+  f = compile_expr( expr, symbols )
+  try:
+    vals = [ stack( [ c[k] for c in contexts ] ) for k in symbols ]
+  except Exception:
+    return [ f( *[ c[k] for k in symbols ] ) for c in contexts ]
+
+  ans = f( *vals )
+  if getattr( ans, 'shape', () ) == ():
+    # the expression doesn't depend on the symbols
+    ans = ans*numpy.ones( len(contexts) )
+  return ans
+
 # def eval(self, expr, var, context, soli = 0 ):
   # solution = solve( expr, var )[soli]
   # s = self.s
@@ -3,10 +3,13 @@
 # local modules
 from pyHomework.Quiz import *
 from pyHomework.Emitter import *
+from pyHomework.Utils import get_cache_dir
+from pyHomework import Timing
 
 
 # standard modules
-import sys, os, re, random, StringIO, pprint
+import sys, os, re, random, StringIO, pprint, tempfile, traceback, multiprocessing, hashlib, marshal
+import cPickle as pickle
 from subprocess import call
 import argparse
 
@@ -14,7 +17,6 @@ import argparse
 import dpath.util
 import yaml
 import tempita
-import pyparsing as parse
 
 
 def make_overrides( override ):
@@ -140,11 +142,12 @@ Answers:
 '''
 
     def write(self, filename="/dev/stdout"):
-      engine = tempita.Template(self.template)
-      render_data = { 'questions'    : self.emit(LatexEmitter('compactenum',labels=True))
-                    , 'key'          : self.emit(LatexKeyEmitter()) }
-      render_data.update( self._config )
-      text = engine.substitute( **render_data )
+      with Timing.stage('latex'):
+        engine = tempita.Template(self.template)
+        render_data = { 'questions'    : self.emit(LatexEmitter('compactenum',labels=True))
+                      , 'key'          : self.emit(LatexKeyEmitter()) }
+        render_data.update( self._config )
+        text = engine.substitute( **render_data )
 
       if filename.endswith('.pdf'):
         texfile = get_fn( filename, 'tex' )
@@ -155,8 +158,9 @@ Answers:
         f.write( text )
 
       if filename.endswith( '.pdf' ):
-        call( ['latexmk', '-pdf', texfile ] )
-        call( ['latexmk', '-c', texfile ] )
+        with Timing.stage('latexmk',file=texfile):
+          call( ['latexmk', '-pdf', texfile ] )
+          call( ['latexmk', '-c', texfile ] )
         
 
 
@@ -178,6 +182,19 @@ Answers:
 
 
 
+
+# markdown markup that is replaced with latex macros. these match the same
+# text as pyparsing's QuotedString did.
+markup_patterns = [ (re.compile(r'\*\*(?:[^*\n\r]|(?:\*[^*]))*\*\*'), 2, r'\textbf{%s}')
+                  , (re.compile(r'\*(?:[^*\n\r])*\*')              , 1, r'\emph{%s}')
+                  ]
+
+# line patterns used to build the quiz spec. the last group of each pattern is the rest of the line.
+line_patterns = { 'question'   : re.compile(r'[ \t\r\n]*[0-9]+[ \t\r\n]*\.[ \t\r\n]+(.*)')
+                , 'mc_answer'  : re.compile(r'[ \t\r\n]*[a-zA-Z]+[ \t\r\n]*\.[ \t\r\n]+(.*)')
+                , 'num_answer' : re.compile(r'[ \t\r\n]+answer[ \t\r\n]*:[ \t\r\n]*(.*)')
+                , 'config_var' : re.compile(r'[ \t\r\n]*([a-zA-Z0-9/_]+)[ \t\r\n]*:[ \t\r\n]+(.*)')
+                }
 
 def parse_markdown( fh ):
 
@@ -201,85 +218,78 @@ def parse_markdown( fh ):
   # replace markdown markup with corresponding macros
   #    *...* --> \emph{...}
   #    **...** --> \textbf{...}
-  for qc,rep in [ (r'**', r'\textbf{%s}')
-                , (r'*', r'\emph{%s}')
-                ]:
-    text = parse.QuotedString(quoteChar=qc,convertWhitespaceEscapes=False).setParseAction(lambda toks: rep%toks[0]).transformString( text )
+  for pattern,n,rep in markup_patterns:
+    text = pattern.sub( lambda m: rep%m.group(0)[n:-n], text )
 
   # do we want to replace markdown images?
 
 
-  # parse the file and create a quiz spec
-  parsers = { 'question'   : parse.Suppress(parse.Word(parse.nums)+'.'+parse.White()) + parse.restOfLine
-            , 'mc_answer'  : parse.Suppress(parse.Word(parse.alphas)+'.'+parse.White()) + parse.restOfLine
-            , 'num_answer' : parse.Suppress(parse.White()+parse.Literal('answer')+parse.Optional(parse.White())+':'+parse.Optional(parse.White())) + parse.restOfLine
-            , 'config_var' : parse.Word(parse.alphanums+'/_')+parse.Suppress(':'+parse.White())+parse.restOfLine
-            }
-
-
+  # parse the file and create a quiz spec. each line is matched against the line patterns once,
+  # and questions and answers are stored in dicts keyed by their index (converted to lists at the end),
+  # so finding the next index is just a len().
   spec = dict()
   path = None
   stage = list()
 
   def get(path):
-    vals = dpath.util.values(spec, path)
-    if len(vals) > 0:
-      return vals[0]
-    return {}
+    d = spec
+    for k in path:
+      d = d.get(k)
+      if d is None:
+        return {}
+    return d
 
   def set(path, v):
-    return dpath.util.new(spec, path, v)
-
-  def matches( line ):
-    matches = 0
-    for k in parsers:
-      try:
-        parsers[k].parseString(line)
-        matches += 1
-      except:
-        pass
+    d = spec
+    for k in path[:-1]:
+      d = d.setdefault(k,dict())
+    d[path[-1]] = v
 
-    return matches > 0
+  question   = line_patterns['question'].match
+  mc_answer  = line_patterns['mc_answer'].match
+  num_answer = line_patterns['num_answer'].match
+  config_var = line_patterns['config_var'].match
 
   lines = text.split('\n')
   lines.append("finished: true") # this will make sure that the last stage is cleared.
   for line in lines:
-
+    # tabs are expanded in the parts of a line that are kept, but not in lines that don't match
+    expanded = line.expandtabs()
+    var_m = config_var(expanded)
+    question_m = question(expanded)
+    mc_answer_m = mc_answer(expanded)
+    num_answer_m = num_answer(expanded)
 
     # if we have a match, we need to clear the stage
-    matched = matches(line)
+    matched = var_m or question_m or mc_answer_m or num_answer_m
     if matched and path:
       set( path, "".join(stage) )
       stage = list()
 
-    try: # check for config vars
-      var,val = parsers['config_var'].parseString(line)
+    if var_m: # check for config vars
+      var,val = var_m.groups()
       if not var == 'answer':
         # will just set config parameter directly and continue
         dpath.util.new( spec, var.lower(), val )
         continue
 
-    except:
-      pass
-
-    try: # check for beginning of question
-      line = parsers['question'].parseString(line)[0]
-      path = [ "questions", len(get("questions")), "text" ]
-    except:
-      pass
-
-    try: # check for beginning of multiple-choice answer
-      line = parsers['mc_answer'].parseString(line)[0]
-      path =[ "questions", len(get("questions"))-1, "answer", "choices" ]
+    # each match removes its prefix from the line, and the rest is checked
+    # for the remaining prefixes.
+    if question_m: # check for beginning of question
+      line = question_m.group(1)
+      path = [ "questions", len(get(["questions"])), "text" ]
+      mc_answer_m = mc_answer(line)
+      num_answer_m = num_answer(line)
+
+    if mc_answer_m: # check for beginning of multiple-choice answer
+      line = mc_answer_m.group(1)
+      path =[ "questions", len(get(["questions"]))-1, "answer", "choices" ]
       path.append( len( get(path) ) )
-    except:
-      pass
+      num_answer_m = num_answer(line)
 
-    try: # check for numerical answer
-      line = parsers['num_answer'].parseString(line)[0]
-      path =[ "questions", len(get("questions"))-1, "answer", "value" ]
-    except:
-      pass
+    if num_answer_m: # check for numerical answer
+      line = num_answer_m.group(1)
+      path =[ "questions", len(get(["questions"]))-1, "answer", "value" ]
 
     if line:
       stage.append(line)
@@ -311,6 +321,204 @@ def parse_markdown( fh ):
   return spec
 
 
+# bump this if the parsers change in a way that the code of parse_markdown doesn't show
+SPEC_CACHE_VERSION = 1
+# the number of parsed specs kept in the cache. the least recently used are removed first.
+spec_cache_size = 256
+
+def spec_cache_file( text, ext ):
+  '''Return the name of the parsed spec cache file for the (rendered) contents of a quiz file, or None if caching is disabled.
+
+  The name is keyed on the text and the parser used for ext (and its version), so changing
+  either one parses the file again.'''
+  d = get_cache_dir('quizgen')
+  if d is None:
+    return None
+  key = hashlib.sha1( 'v%d %s python-%d.%d' % ( (SPEC_CACHE_VERSION, ext) + sys.version_info[:2] ) )
+  if ext == '.md':
+    key.update( marshal.dumps( parse_markdown.func_code ) )
+    key.update( repr( [ (p.pattern,n,rep) for p,n,rep in markup_patterns ] ) )
+    key.update( repr( sorted( (k,p.pattern) for k,p in line_patterns.items() ) ) )
+  if ext == '.yaml':
+    key.update( 'yaml-%s' % yaml.__version__ )
+  key.update( text )
+  return os.path.join( d, '%s.pickle' % key.hexdigest() )
+
+def read_spec_cache( filename ):
+  if not os.path.isfile( filename ):
+    return None
+  try:
+    with open( filename, 'rb' ) as f:
+      spec = pickle.load( f )
+    # the modification time records the last use, see evict_spec_cache
+    os.utime( filename, None )
+    return spec
+  except Exception:
+    # a corrupt cache file is just parsed again
+    return None
+
+def write_spec_cache( filename, spec ):
+  tmp = ''
+  try:
+    fd,tmp = tempfile.mkstemp( dir=os.path.dirname(filename) )
+    with os.fdopen(fd,'wb') as f:
+      pickle.dump( spec, f, pickle.HIGHEST_PROTOCOL )
+    os.rename( tmp, filename )
+  except Exception as e:
+    if os.path.exists( tmp ):
+      os.remove( tmp )
+    print "WARNING: could not write spec cache '%s'. reason:"%filename,type(e),str(e)
+    return
+  evict_spec_cache( os.path.dirname(filename) )
+
+def evict_spec_cache( d, size=None ):
+  '''Remove the least recently used files from the spec cache directory until it holds size specs.'''
+  if size is None:
+    size = spec_cache_size
+  files = [ os.path.join(d,fn) for fn in os.listdir(d) if fn.endswith('.pickle') ]
+  if len(files) <= size:
+    return
+  used = list()
+  for fn in files:
+    try:
+      used.append( (os.path.getmtime(fn),fn) )
+    except OSError:
+      # removed by another process
+      pass
+  for t,fn in sorted(used)[:len(used)-size]:
+    try:
+      os.remove( fn )
+    except OSError:
+      pass
+
+def load_spec( fn, args ):
+  '''Read, render (with --render) and parse a quiz file.
+
+  Parsed specs are cached (see spec_cache_file), so files that haven't changed since they
+  were last built are not parsed again. Templates are always rendered, because they can
+  use random numbers, the environment or other files, and the cache is keyed on the result.'''
+  with open(fn,'r') as f:
+    text = f.read()
+
+  if args.render:
+    text = tempita.Template(text).substitute()
+
+  ext = os.path.splitext(fn)[1]
+  cache = None
+  if args.cache:
+    cache = spec_cache_file( text, ext )
+  if cache is not None:
+    spec = read_spec_cache( cache )
+    if spec is not None:
+      return spec
+
+  with tempfile.TemporaryFile() as f:
+    f.write(text)
+    f.seek(0)
+
+    if ext == '.md':
+      spec = parse_markdown(f)
+    if ext == '.yaml':
+      spec = yaml.load(f)
+
+  if cache is not None:
+    write_spec_cache( cache, spec )
+
+  return spec
+
+def process_file( fn, args ):
+  '''Build the quiz in fn and write it. Returns 0 on success, or 1 if the quiz file could not be loaded.'''
+  if args.type.lower() == 'bb':
+    quiz = BbQuiz()
+  elif args.type.lower() == 'latex':
+    quiz = LatexQuiz()
+  elif args.type.lower() == 'pdf':
+    quiz = LatexQuiz()
+  else:
+    quiz = BbQuiz()
+
+
+  with Timing.stage('parse'):
+    spec = load_spec( fn, args )
+
+  try:
+    with Timing.stage('load'):
+      quiz.load( spec )
+  except KeyError as e:
+    print "ERROR: There was a problem parsing the quiz file."
+    print "       Please make sure that the file is formatted correctly."
+    print "       Note: add the --debug option to see the tree that was read"
+    if args.debug:
+      print yaml.dump(spec)
+    return 1
+
+  overrides = make_overrides( args.override )
+  for k,v in overrides.items():
+    v = eval(v)
+    print "Overriding '%s': '%s' -> '%s'" % (k,quiz.config(k,None),v)
+    quiz.config(k,value=v)
+
+  if args.debug:
+    print quiz._config
+
+  outfile = get_fn( fn, args.type )
+  if args.output:
+    outfile = args.output
+
+
+  with Timing.stage('write'):
+    quiz.write(outfile)
+  return 0
+
+def init_job( jobs ):
+  # the workers are forked from the same process, so they would all shuffle the questions the same way.
+  random.seed()
+  # share the cores between the workers instead of running cpu_count tex2im's in each of them.
+  BbQuiz.tex2im_jobs = max( 1, multiprocessing.cpu_count() / jobs )
+  # the events recorded by the main process were copied with it
+  Timing.events( clear=True )
+
+def run_job( job ):
+  '''Run process_file in a pool worker.
+
+  Returns the status and everything that was printed, so that the output for different
+  files is not interleaved, and the timing events recorded for the file (if --profile was given).'''
+  fn,args = job
+  stdout = sys.stdout
+  sys.stdout = StringIO.StringIO()
+  try:
+    try:
+      with Timing.stage('file',file=fn):
+        status = process_file( fn, args )
+    except Exception as e:
+      print "ERROR: could not process '%s'. reason:"%fn,type(e),str(e)
+      if args.debug:
+        print traceback.format_exc()
+      status = 1
+    return status,sys.stdout.getvalue(),Timing.events( clear=True )
+  finally:
+    sys.stdout = stdout
+
+def process_files( fns, args ):
+  '''Process quiz files in a pool of args.jobs processes. Returns the number of files that failed.'''
+  pool = multiprocessing.Pool( args.jobs, init_job, (args.jobs,) )
+  failed = 0
+  try:
+    # imap returns the results in order, so the output is printed in the same order as in serial mode.
+    for fn,(status,output,events) in zip( fns, pool.imap( run_job, [ (fn,args) for fn in fns ] ) ):
+      sys.stdout.write( output )
+      Timing.add_events( events )
+      if status != 0:
+        print "ERROR: '%s' failed." % fn
+        failed += 1
+    pool.close()
+  finally:
+    pool.terminate()
+    pool.join()
+
+  return failed
+
+
 
 
 if __name__ == "__main__":
@@ -323,67 +531,33 @@ if __name__ == "__main__":
   parser.add_argument('--debug', '-d', action='store_true', help="Output debug information.")
   parser.add_argument('--render', '-r', action='store_true', help="Render input file as a Template first.")
   parser.add_argument('--tex2im_opts', help="Extra options that will be passed to tex2im when creating images from LaTeX.")
+  parser.add_argument('--no-cache', dest='cache', action='store_false', help="Parse the quiz files even if they haven't changed since they were last parsed.")
+  parser.add_argument('--profile', action='store_true', help="Print the time spent in each stage of the build (parsing, formatting, emitting, macros, images, latexmk, etc.) and write a trace that can be opened with chrome://tracing.")
+  parser.add_argument('--profile-output', default='QuizGen-profile.json', help="File the --profile trace is written to. Default is QuizGen-profile.json.")
+  parser.add_argument('--jobs', '-j', type=int, default=1, help="Number of quiz files to process in parallel. Default is 1. Files are processed serially if --output is given.")
 
   args = parser.parse_args()
 
+  if args.profile:
+    Timing.enable_report( args.profile_output )
 
   if args.example:
     with open( args.quiz_file[0], 'w' ) as f:
       f.write( example_spec )
     sys.exit(0)
 
-  for fn in args.quiz_file:
-    if args.type.lower() == 'bb':
-      quiz = BbQuiz()
-    elif args.type.lower() == 'latex':
-      quiz = LatexQuiz()
-    elif args.type.lower() == 'pdf':
-      quiz = LatexQuiz()
-    else:
-      quiz = BbQuiz()
-
-
-    with open(fn,'r') as f:
-      text = f.read()
-
-    if args.render:
-      text = tempita.Template(text).substitute()
-
-    with tempfile.TemporaryFile() as f:
-      f.write(text)
-      f.seek(0)
-
-      ext = os.path.splitext(fn)[1]
-      if ext == '.md':
-        spec = parse_markdown(f)
-      if ext == '.yaml':
-        spec = yaml.load(f)
-
-    try:
-      quiz.load( spec )
-    except KeyError as e:
-      print "ERROR: There was a problem parsing the quiz file."
-      print "       Please make sure that the file is formatted correctly."
-      print "       Note: add the --debug option to see the tree that was read"
-      if args.debug:
-        print yaml.dump(spec)
+  if args.jobs > 1 and len(args.quiz_file) > 1 and not args.output:
+    failed = process_files( args.quiz_file, args )
+    if failed:
+      print "ERROR: %d of %d quiz files failed." % (failed,len(args.quiz_file))
       sys.exit(1)
+    sys.exit(0)
 
-    overrides = make_overrides( args.override )
-    for k,v in overrides.items():
-      v = eval(v)
-      print "Overriding '%s': '%s' -> '%s'" % (k,quiz.config(k,None),v)
-      quiz.config(k,value=v)
-
-    if args.debug:
-      print quiz._config
-
-    outfile = get_fn( fn, args.type )
-    if args.output:
-      outfile = args.output
-
-
-    quiz.write(outfile)
+  for fn in args.quiz_file:
+    with Timing.stage('file',file=fn):
+      status = process_file( fn, args )
+    if status != 0:
+      sys.exit(1)
 
 
 
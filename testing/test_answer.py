@@ -67,6 +67,35 @@ def test_numerical_answer_uncertainty():
   a.quantity = 2.0
   assert a.uncertainty == '5.00E-01'
 
+def test_numerical_answer_cache():
+  a = NumericalAnswer( Q_(1.3579,'m/s^2') )
+  assert a.value == '1.36E+00'
+  assert a.units == 'meter / second ** 2'
+  assert a.uncertainty == '1.36E-02'
+  assert sorted( a._derived.keys() ) == ['uncertainty','units','value']
+
+  # each setter clears the cached values
+  a.sigfigs = 4
+  assert not a._derived
+  assert a.value == '1.358E+00'
+  assert a.uncertainty == '1.358E-02'
+
+  a.uncertainty = '10%'
+  assert a.uncertainty == '1.358E-01'
+
+  a.units = 'cm/s^2'
+  assert a.units == 'centimeter / second ** 2'
+  assert a.value == '1.358E+02'
+
+  a.quantity = Q_(2,'m')
+  assert a.quantity == '2.000E+00 meter'
+  assert a.units == 'meter'
+
+  a.uncertainty = '0.1%'
+  assert a.uncertainty == '2.000E-02'
+  a.min_relative_unc = None
+  assert a.uncertainty == '2.000E-03'
+
 def test_numerical_answer_bb_emitter():
   q = 1.23456789
   a = NumericalAnswer(q)
@@ -143,6 +172,30 @@ def test_factory():
   a = make_answer( spec )
   assert a.emit() == 'one -> two -> three'
 
+  a = make_answer( { 'logical' : True } )
+  assert isinstance( a, TrueFalseAnswer )
+  assert a.answer
+
+  a = make_answer( { 'value' : '1.2345 m', 'uncertainty' : '2%' } )
+  assert isinstance( a, NumericalAnswer )
+
+  with pytest.raises(RuntimeError) as e:
+    make_answer( { 'choices' : [ '*one' ], 'value' : 1.0 } )
+  assert str(e.value).startswith("Ambiguous answer spec")
+
+  with pytest.raises(RuntimeError) as e:
+    make_answer( { 'unknown' : 1.0 } )
+  assert str(e.value).startswith("Could not build answer instance")
+
+def test_factory_registration():
+  assert answer_types['value'] is NumericalAnswer
+  assert answer_types['choices'] is MultipleChoiceAnswer
+
+  # subclasses don't take over their parent's spec keys
+  class MyChoices(MultipleChoiceAnswer):
+    pass
+  assert answer_types['choices'] is MultipleChoiceAnswer
+
 def test_multiple_choice_answer():
   a = MultipleChoiceAnswer()
   a.add_choice('one')
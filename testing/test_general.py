@@ -2,6 +2,8 @@ from pyHomework import Constants
 from pyHomework.sympy import Equations
 
 import sympy as sy
+import pytest
+import os
 
 def Close( a, b, tol = 0.01 ):
     if isinstance(a,int):
@@ -41,7 +43,55 @@ def test_constants():
 
 
 def test_quantity_calcs():
-  pass
+  from pyHomework.numpy.quantity_calcs import make_vec, dot, cross, magnitude, direction, Q_
+
+  v = make_vec( [Q_(1,'m'), Q_(200,'cm'), Q_(3,'m')] )
+  assert v.shape == (3,)
+  assert Close( 14, dot(v,v).to('m^2').magnitude )
+  assert Close( 14**0.5, magnitude(v).to('m').magnitude )
+  assert dot( [1,2,3], [1,2,3] ) == 14
+  assert list( cross( [1,0,0], [0,1,0] ).magnitude ) == [0,0,1]
+  assert Close( 5.49778, direction( [1,-1,0] ) )
+
+def test_vectorized_quantity_calcs():
+  import numpy as np
+  from pyHomework.numpy.quantity_calcs import make_vec, dot, cross, magnitude, direction, Q_
+
+  xs = np.array( [ 1., -2.,  3., -1.] )
+  ys = np.array( [ 2.,  1., -4., -1.] )
+  zs = np.array( [ 0.,  5.,  1.,  2.] )
+
+  # components can be arrays or a list of vectors
+  v = make_vec( [Q_(xs,'m'), Q_(100*ys,'cm'), Q_(zs,'m')] )
+  assert v.shape == (4,3)
+  assert str(v.units) == 'meter'
+  assert np.allclose( v.magnitude, make_vec( [ [Q_(x,'m'),Q_(y,'m'),Q_(z,'m')] for x,y,z in zip(xs,ys,zs) ] ).magnitude )
+
+  F = make_vec( [Q_(ys,'N'), Q_(zs,'N'), Q_(xs,'N')] )
+
+  # batched results agree with one vector at a time
+  vs = [ make_vec( [Q_(x,'m'), Q_(y,'m'), Q_(z,'m')] ) for x,y,z in zip(xs,ys,zs) ]
+  Fs = [ make_vec( [Q_(y,'N'), Q_(z,'N'), Q_(x,'N')] ) for x,y,z in zip(xs,ys,zs) ]
+
+  d = dot(v,F)
+  assert d.shape == (4,)
+  assert np.allclose( d.to('J').magnitude, [ dot(a,b).to('J').magnitude for a,b in zip(vs,Fs) ] )
+
+  c = cross(v,F)
+  assert c.shape == (4,3)
+  assert np.allclose( c.to('N m').magnitude, [ cross(a,b).to('N m').magnitude for a,b in zip(vs,Fs) ] )
+
+  m = magnitude(v)
+  assert m.shape == (4,)
+  assert np.allclose( m.to('m').magnitude, [ magnitude(a).to('m').magnitude for a in vs ] )
+
+  t = direction(v)
+  assert t.shape == (4,)
+  assert np.allclose( t.to('radian').magnitude, [ direction(a).to('radian').magnitude for a in vs ] )
+  assert np.all( t.magnitude >= 0 )
+
+  # plain arrays work too
+  assert np.allclose( direction( np.array( [[1,1,0],[1,-1,0]] ) ), [0.785398, 5.49778] )
 
 
 def test_equations():
@@ -51,6 +101,36 @@ def test_equations():
   # assert 'U == g_*h*m'    == str(eqs.GravitationalPotentialEnergy)
 
 
+def test_lazy_equations():
+  e = Equations.EquationsCollection(snapshot=False)
+  s = e.s
+
+  # nothing is built until it is used
+  assert not 'LensEquation' in vars(e)
+  assert not 'f' in vars(s)
+  assert 'LensEquation' in dir(e)
+  assert 'thi' in dir(s) and 'Z' in dir(s)
+
+  eq = e.LensEquation
+  assert eq is e.LensEquation
+  assert 'LensEquation' in vars(e)
+  assert eq == sy.Eq( 1/sy.Symbol('d_i') + 1/sy.Symbol('d_o'), 1/sy.Symbol('f') )
+  assert s.a == sy.Symbol('a')
+  assert s.qi == sy.symbols('q:10')
+
+  # equations built from other equations
+  assert e.RLVoltageRise == e.ExpRise.subs( [(s.x,s.v), (s.X,s.Vp), (s.tau,s.L/s.R)] )
+
+  # attributes can still be replaced
+  e.LensEquation = sy.Eq( s.x, s.y )
+  assert e.LensEquation == sy.Eq( s.x, s.y )
+
+  with pytest.raises(AttributeError):
+    e.Missing
+  with pytest.raises(AttributeError):
+    s.missing
+
+
 def test_sympy_solve():
   import pint
   units = pint.UnitRegistry()
@@ -64,3 +144,260 @@ def test_sympy_solve():
 
   assert Close( 0.5*2.*3.*3./100./100., K.to('kg m^2 / s^2').magnitude )
 
+
+def test_solve_cache():
+  e = Equations.EquationsCollection(snapshot=False)
+  s = e.s
+  cache = Equations.solve_cache
+  cache.clear()
+
+  assert Close( 9., e.eval( e.KineticEnergy, s.K, { s.m : 2., s.v : 3. } ) )
+  assert cache.misses == 1 and cache.hits == 0
+  assert Close( 16., e.eval( e.KineticEnergy, s.K, { s.m : 2., s.v : 4. } ) )
+  assert cache.misses == 1 and cache.hits == 1
+
+  # all of the variables come from one solve
+  ans = e.eval( [ sy.Eq( s.x + s.y, s.a ), sy.Eq( s.x - s.y, 1 ) ], [s.x,s.y], { s.a : 3. } )
+  assert Close( 2., ans[s.x] ) and Close( 1., ans[s.y] )
+  assert cache.misses == 2
+
+  # equal equations share solutions
+  eq = sy.Eq( s.K, s.m*s.v*s.v/2 )
+  assert Close( 9., eq.eval( s.K, { s.m : 2., s.v : 3. } ) )
+  assert cache.misses == 3
+  assert Close( 9., sy.Eq( s.K, s.m*s.v*s.v/2 ).eval( s.K, { s.m : 2., s.v : 3. } ) )
+  assert cache.misses == 3 and cache.hits == 2
+
+  # the cache is bounded
+  maxsize = cache.maxsize
+  try:
+    cache.maxsize = 2
+    for v in [s.m, s.v, s.K]:
+      e.subs( e.GravitationalPotentialEnergy, e.KineticEnergy, v )
+    assert len(cache) == 2
+  finally:
+    cache.maxsize = maxsize
+    cache.clear()
+
+
+def test_equations_snapshot(tmpdir, monkeypatch):
+  snapshot = str(tmpdir.join('equations.pickle'))
+  e = Equations.EquationsCollection(snapshot=snapshot)
+  s = e.s
+  Equations.solve_cache.clear()
+
+  assert Close( 9., e.eval( e.KineticEnergy, s.K, { s.m : 2., s.v : 3. } ) )
+  assert Close( 2., e.eval( e.LensEquation, s.di, { s.do : 2., s.f : 1. } ) )
+  e.save_snapshot()
+  assert os.path.isfile( snapshot )
+
+  # a new collection gets the equations and solutions from the snapshot
+  Equations.solve_cache.clear()
+  def solve(*args,**kwargs):
+    raise RuntimeError("sy.solve was called")
+  monkeypatch.setattr( Equations.sy, 'solve', solve )
+  e = Equations.EquationsCollection(snapshot=snapshot)
+  assert Close( 9., e.eval( e.KineticEnergy, s.K, { s.m : 2., s.v : 3. } ) )
+  assert Close( 2., e.eval( e.LensEquation, s.di, { s.do : 2., s.f : 1. } ) )
+  with pytest.raises(RuntimeError):
+    e.eval( e.LensEquation, s.f, { s.do : 2., s.di : 2. } )
+  monkeypatch.undo()
+
+  # nothing new was solved, so the snapshot isn't written again
+  os.utime( snapshot, (0,0) )
+  e.save_snapshot()
+  assert os.path.getmtime( snapshot ) == 0
+
+  # a corrupt snapshot is ignored
+  tmpdir.join('equations.pickle').write('garbage')
+  Equations._snapshots.clear()
+  e = Equations.EquationsCollection(snapshot=snapshot)
+  assert e.KineticEnergy == sy.Eq( s.K, s.m*s.v**2/2 )
+
+  # the snapshot file changes with the sympy version and the equation definitions
+  monkeypatch.setenv( 'PYHOMEWORK_CACHE_DIR', str(tmpdir.join('cache')) )
+  fn = Equations.EquationsCollection().snapshot_file
+  assert fn.startswith( str(tmpdir.join('cache')) )
+  class MyEquations(Equations.EquationsCollection):
+    _equations = dict( Equations.EquationsCollection._equations, KineticEnergy = lambda s,e : sy.Eq( s.K, s.m*s.v**2 ) )
+  assert Equations.snapshot_file( MyEquations ) != Equations.snapshot_file( Equations.EquationsCollection )
+  monkeypatch.setattr( Equations.sy, '__version__', '0.0' )
+  assert Equations.EquationsCollection().snapshot_file != fn
+
+  monkeypatch.setenv( 'PYHOMEWORK_CACHE_DIR', '' )
+  assert Equations.EquationsCollection().snapshot_file is None
+  Equations.solve_cache.clear()
+  Equations._snapshots.clear()
+
+def test_equations_snapshot_merge(tmpdir, monkeypatch):
+  snapshot = str(tmpdir.join('equations.pickle'))
+  Equations.solve_cache.clear()
+  Equations._snapshots.clear()
+
+  # collections that use the same file share one snapshot
+  e1 = Equations.EquationsCollection(snapshot=snapshot)
+  e2 = Equations.EquationsCollection(snapshot=snapshot)
+  s = e1.s
+  assert Close( 9., e1.eval( e1.KineticEnergy, s.K, { s.m : 2., s.v : 3. } ) )
+  assert Close( 2., e2.eval( e2.LensEquation, s.di, { s.do : 2., s.f : 1. } ) )
+  assert e1.load_snapshot() is e2.load_snapshot()
+  Equations.save_snapshots()
+  assert sorted( Equations.read_snapshot( snapshot )['equations'] ) == ['KineticEnergy','LensEquation']
+
+  # another process that read the file before it was written doesn't lose what is in it
+  Equations._snapshots.clear()
+  tmpdir.join('equations.pickle').remove()
+  e3 = Equations.EquationsCollection(snapshot=snapshot)
+  assert e3.load_snapshot()['equations'] == {}
+  Equations._snapshots.clear()
+  e4 = Equations.EquationsCollection(snapshot=snapshot)
+  e4.eval( e4.KineticEnergy, s.K, { s.m : 2., s.v : 3. } )
+  e4.save_snapshot()
+  Equations._snapshots[snapshot] = e3.load_snapshot()
+  e3.eval( e3.LensEquation, s.di, { s.do : 2., s.f : 1. } )
+  e3.save_snapshot()
+
+  # so the next run doesn't solve anything
+  Equations._snapshots.clear()
+  Equations.solve_cache.clear()
+  def solve(*args,**kwargs):
+    raise RuntimeError("sy.solve was called")
+  monkeypatch.setattr( Equations.sy, 'solve', solve )
+  e = Equations.EquationsCollection(snapshot=snapshot)
+  assert Close( 9., e.eval( e.KineticEnergy, s.K, { s.m : 2., s.v : 3. } ) )
+  assert Close( 2., e.eval( e.LensEquation, s.di, { s.do : 2., s.f : 1. } ) )
+  Equations.solve_cache.clear()
+  Equations._snapshots.clear()
+
+
+def test_expr_eval_batch():
+  import random
+  from pyHomework.sympy import Utils
+  e = Equations.EquationsCollection(snapshot=False)
+  s = e.s
+  cache = Utils.lambdify_cache
+  cache.clear()
+
+  contexts = [ { s.m : random.uniform(1,10), s.v : random.uniform(1,10) } for i in range(500) ]
+  K = e.eval_batch( e.KineticEnergy, s.K, contexts )
+  assert len(K) == 500
+  for k,context in zip(K,contexts):
+    assert Close( context[s.m]*context[s.v]**2/2, k )
+  assert cache.misses == 1
+
+  # single evaluations share the compiled function
+  for context in contexts[:10]:
+    assert Close( e.eval( e.KineticEnergy, s.K, context ), context[s.m]*context[s.v]**2/2 )
+  assert cache.misses == 1 and cache.hits == 10
+
+  # arrays of values
+  K = e.eval_batch( e.KineticEnergy, s.K, { s.m : 2., s.v : Utils.numpy.array([1.,2.,3.]) } )
+  assert list(K) == [1.,4.,9.]
+
+  # quantities
+  import pint
+  units = pint.UnitRegistry()
+  Q = units.Quantity
+  K = Equations.expr_eval_batch( s.m*s.v**2/2, [ { s.m : Q(2.,'kg'), s.v : Q(v,'m/s') } for v in [100.,200.] ] )
+  assert Close( 4., K[1].to('J').magnitude/1e4 )
+
+  # constant expressions give a value for each context
+  assert list( Equations.expr_eval_batch( sy.Integer(3), contexts[:2] ) ) == [3,3]
+  cache.clear()
+
+
+def test_lazy_imports():
+  import os, sys, subprocess
+  cwd = os.path.dirname( os.path.abspath( __file__ ) )
+  def run( code ):
+    return subprocess.check_output( [sys.executable, '-c', code], cwd=cwd ).split()
+
+  # sympy and numpy layers are not loaded until they are needed
+  assert run("import sys, pyHomework; print 'pyHomework.sympy.Equations' in sys.modules, 'pyHomework.numpy.quantity_calcs' in sys.modules") == ['False','False']
+  assert run("import sys, pyHomework; pyHomework.EquationsCollection; print 'pyHomework.sympy.Equations' in sys.modules, 'pyHomework.numpy.quantity_calcs' in sys.modules") == ['True','False']
+  assert run("import sys, pyHomework; pyHomework.dot; print 'pyHomework.sympy.Equations' in sys.modules, 'pyHomework.numpy.quantity_calcs' in sys.modules") == ['False','True']
+
+  # star imports still get everything
+  assert run("from pyHomework import *; print EquationsCollection.__name__, SymbolCollection.__name__, expr_eval.__name__, dot.__name__, cross.__name__") == ['EquationsCollection','SymbolCollection','expr_eval','dot','cross']
+
+def test_shared_unit_registry():
+  from pyHomework.Answer import units, uconv, Q_
+  from pyHomework.numpy import quantity_calcs
+
+  assert units is quantity_calcs.units
+  assert uconv is quantity_calcs.uconv
+
+  # quantities from the two modules can be mixed
+  d = Q_(1,'m') + quantity_calcs.Q_(2,'cm')
+  assert Close( 1.02, d.to('m').magnitude )
+
+def test_cached_unit_registry(tmpdir):
+  from pyHomework.Units import CachedUnitRegistry
+  cache_file = str(tmpdir.join('registry.pickle'))
+
+  cold = CachedUnitRegistry( cache_file )
+  assert not cold.from_cache
+  assert tmpdir.join('registry.pickle').check()
+
+  warm = CachedUnitRegistry( cache_file )
+  assert warm.from_cache
+
+  assert set(cold._units) == set(warm._units)
+  assert sorted(cold._groups) == sorted(warm._groups)
+  assert sorted(cold._systems) == sorted(warm._systems)
+  assert sorted(cold._contexts) == sorted(warm._contexts)
+  assert cold._groups['root'].members == warm._groups['root'].members
+
+  assert Close( 1609.344, warm.Quantity(1,'mile').to('m').magnitude )
+  assert Close( 37.4, warm.Quantity(3,'degC').to('degF').magnitude )
+  assert Close( 599.584916, warm.Quantity(500,'nm').to('THz','sp').magnitude )
+
+  # a corrupt cache is rebuilt
+  with open( cache_file, 'w' ) as f:
+    f.write('garbage')
+  assert not CachedUnitRegistry( cache_file ).from_cache
+  assert CachedUnitRegistry( cache_file ).from_cache
+
+def test_cached_unit_registry_fallback(tmpdir, monkeypatch):
+  import pint
+  from pyHomework.Units import CachedUnitRegistry, make_registry
+  cache_file = str(tmpdir.join('registry.pickle'))
+
+  assert type( make_registry( None ) ) is pint.UnitRegistry
+
+  # pint versions the cache hasn't been checked against get a plain registry
+  monkeypatch.setattr( pint, '__version__', '0.7.2' )
+  assert type( make_registry( cache_file ) ) is pint.UnitRegistry
+  assert not tmpdir.join('registry.pickle').check()
+  monkeypatch.undo()
+
+  # pint internals that don't match what the cache expects give a plain registry
+  monkeypatch.setattr( CachedUnitRegistry, '_definition_names', CachedUnitRegistry._definition_names + ['_missing'] )
+  ureg = make_registry( cache_file )
+  assert type( ureg ) is pint.UnitRegistry
+  assert Close( 1609.344, ureg.Quantity(1,'mile').to('m').magnitude )
+  monkeypatch.undo()
+
+  assert make_registry( cache_file ).from_cache is False
+  def restore(self, cache):
+    raise AttributeError("'UnitRegistry' object has no attribute '_groups'")
+  monkeypatch.setattr( CachedUnitRegistry, '_restore_definitions', restore )
+  ureg = make_registry( cache_file )
+  assert type( ureg ) is pint.UnitRegistry
+  assert Close( 37.4, ureg.Quantity(3,'degC').to('degF').magnitude )
+  # the cache that couldn't be restored is removed, so it is rebuilt next time
+  assert not tmpdir.join('registry.pickle').check()
+
+def test_import_with_registry(tmpdir, monkeypatch):
+  import pint, sys
+  from pyHomework.Units import import_with_registry, units
+  # a module that builds a default registry when it is imported, like pyErrorProp
+  tmpdir.join('registry_at_import.py').write("from pint import UnitRegistry\nUR = UnitRegistry()\nother = UnitRegistry( on_redefinition='ignore' )\nis_registry = isinstance( UR, UnitRegistry )\n")
+  monkeypatch.syspath_prepend( str(tmpdir) )
+  UnitRegistry = pint.UnitRegistry
+  m = import_with_registry( 'registry_at_import', units )
+  del sys.modules['registry_at_import']
+  assert m.UR is units
+  assert type( m.other ) is UnitRegistry
+  assert m.is_registry
+  assert pint.UnitRegistry is UnitRegistry
@@ -382,3 +382,70 @@ MC\tFor problem #3: q3_q2\tc\tcorrect\td\tincorrect
 NUM\tFor problem #3a: q3a_q1 Give your answer in meter / second.\t1.36E+00\t1.36E-02
 NUM\tFor problem #4: q4_q1 Give your answer in meter / second ** 2.\t1.36E+00\t5.79E-02
 '''.strip()).substitute(**refs)
+
+def test_incremental_build(tmpdir, monkeypatch):
+  import os
+  # a fake latexmk that logs its arguments and writes a pdf and aux file to the output directory
+  bindir = tmpdir.mkdir('bin')
+  latexmk = bindir.join('latexmk')
+  latexmk.write(r'''#! /bin/sh
+echo "$@" >> '%s'
+for a in "$@"; do
+  case "$a" in
+    -outdir=*) outdir="${a#-outdir=}";;
+    *.tex) job=$(basename "$a" .tex);;
+  esac
+done
+printf '%%s\n' '\newlabel{1}{{2}{1}}' > "$outdir/$job.aux"
+echo "pdf" > "$outdir/$job.pdf"
+''' % tmpdir.join('calls'))
+  latexmk.chmod(0755)
+  monkeypatch.setenv('PATH', str(bindir)+os.pathsep+os.environ['PATH'])
+  monkeypatch.chdir(tmpdir)
+
+  ass = HomeworkAssignment()
+  ass.add_question()
+  ass.add_text("Question \#1")
+
+  ass.build_PDF('hw.pdf')
+  assert tmpdir.join('hw.pdf').check()
+  assert tmpdir.join('hw-build','hw.aux').check()
+  assert ass._latex_refs[1] == '2'
+  assert len(tmpdir.join('calls').readlines()) == 1
+
+  # nothing changed, so latexmk isn't run again
+  ass._latex_refs.clear()
+  ass.build_PDF('hw.pdf')
+  assert ass._latex_refs[1] == '2'
+  assert len(tmpdir.join('calls').readlines()) == 1
+
+  # the PDF or .tex file were changed by something else, so they are rebuilt
+  tmpdir.join('hw.pdf').write('replaced')
+  ass.build_PDF('hw.pdf')
+  assert len(tmpdir.join('calls').readlines()) == 2
+  assert tmpdir.join('hw.pdf').read() == 'pdf\n'
+  tmpdir.join('hw.tex').write('edited', mode='a')
+  ass.build_PDF('hw.pdf')
+  assert len(tmpdir.join('calls').readlines()) == 3
+  ass.build_PDF('hw.pdf')
+  assert len(tmpdir.join('calls').readlines()) == 3
+
+  ass.add_question()
+  ass.add_text("Question \#2")
+  ass.build_PDF('hw.pdf')
+  assert len(tmpdir.join('calls').readlines()) == 4
+
+  # figures are usually given without an extension. LaTeX finds the file, and so does the build hash.
+  tmpdir.join('fig.png').write('one')
+  ass.add_figure('fig')
+  ass.build_PDF('hw.pdf')
+  assert len(tmpdir.join('calls').readlines()) == 5
+  ass.build_PDF('hw.pdf')
+  assert len(tmpdir.join('calls').readlines()) == 5
+  tmpdir.join('fig.png').write('two')
+  ass.build_PDF('hw.pdf')
+  assert len(tmpdir.join('calls').readlines()) == 6
+  # a file with an extension that LaTeX tries first changes the figure too
+  tmpdir.join('fig.pdf').write('three')
+  ass.build_PDF('hw.pdf')
+  assert len(tmpdir.join('calls').readlines()) == 7
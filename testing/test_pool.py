@@ -0,0 +1,69 @@
+import pytest
+import random
+
+from pyHomework.Quiz import Quiz, BbQuiz
+from pyHomework.Pool import QuestionPool
+
+def make_spec(i):
+  return { 'text' : 'Question %d.' % i
+         , 'answer' : { 'choices' : [ '*yes', 'no' ] } }
+
+def make_pool( filename=':memory:' ):
+  pool = QuestionPool( filename )
+  pool.add_many( [ make_spec(i) for i in range(0,30) ], tags=['kinematics'], difficulty=1 )
+  pool.add_many( [ make_spec(i) for i in range(30,40) ], tags=['kinematics','vectors'], difficulty=2 )
+  pool.add_many( [ dict( make_spec(i), tags=['energy'], difficulty=3 ) for i in range(40,50) ] )
+  return pool
+
+def test_pool_select():
+  pool = make_pool()
+  assert len(pool) == 50
+  assert pool.tags() == { 'kinematics' : 40, 'vectors' : 10, 'energy' : 10 }
+
+  assert pool.count() == 50
+  assert pool.count( tags='kinematics' ) == 40
+  assert pool.count( tags=['kinematics','vectors'] ) == 10
+  assert pool.count( tags=['vectors','energy'] ) == 0
+  assert pool.count( difficulty=3 ) == 10
+  assert pool.count( difficulty=(2,None) ) == 20
+  assert pool.count( tags='kinematics', difficulty=(None,1) ) == 30
+
+  ids = pool.select( tags='energy' )
+  assert [ s['text'] for s in pool.get( ids[::-1] ) ] == [ 'Question %d.' % i for i in reversed(range(40,50)) ]
+
+  pool.remove( ids[:5] )
+  assert pool.count( tags='energy' ) == 5
+  assert pool.tags()['energy'] == 5
+
+def test_pool_draw():
+  pool = make_pool()
+
+  specs = pool.draw( 5, tags='vectors' )
+  assert len(specs) == 5
+  assert len( set( s['text'] for s in specs ) ) == 5
+  assert all( 30 <= int(s['text'].split()[1][:-1]) < 40 for s in specs )
+  assert isinstance( specs[0]['text'], str )
+
+  # draws are repeatable
+  random.seed(2)
+  first = pool.draw( 10, difficulty=(1,2) )
+  random.seed(2)
+  assert pool.draw( 10, difficulty=(1,2) ) == first
+  assert pool.draw( 10, difficulty=(1,2), rng=random.Random(2) ) == first
+
+  with pytest.raises(RuntimeError):
+    pool.draw( 11, tags='vectors' )
+
+  quiz = BbQuiz()
+  specs = pool.draw_into( quiz, 3, tags='energy' )
+  assert len( list( quiz.questions ) ) == 3
+  assert quiz.emit().startswith( 'MC\t' + specs[0]['text'] )
+
+def test_pool_file(tmpdir):
+  fn = str( tmpdir.join('pool.db') )
+  with make_pool( fn ) as pool:
+    pass
+
+  with QuestionPool( fn ) as pool:
+    assert len(pool) == 50
+    assert pool.count( tags='energy', difficulty=3 ) == 10
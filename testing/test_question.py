@@ -427,3 +427,74 @@ def test_function_calling():
   assert q.ecall( lambda a,b,c : 2*a + 2*b + 2*c ).value.magnitude == 12
   assert utils.Close( q.ecall( lambda a,b,c : 2*a + 2*b + 2*c ).error.magnitude , (3*(2*0.01)**2)**0.5 )
   
+
+def test_scratch_access():
+  q = Question('value {scratch.x}')
+  q.scratch.x = 5
+  q.format_text()
+  assert q.text_str == 'value 5'
+
+  a = MultipleChoiceAnswer()
+  a.scratch.x = 'one'
+  a.add_choices('''
+  *{scratch.x}
+  two
+  ''')
+  a.format_answer()
+  assert a._choices[0] == 'one'
+
+  # functions can take the scratch pad as an argument, even before it is used
+  q = Question()
+  def f(scratch):
+    scratch.y = 2
+    return 1
+  assert q.call(f) == 1
+  assert q.scratch.y == 2
+  assert q.call( lambda scratch, y : scratch.y + y ) == 4
+
+def test_compact_representation():
+  q = Question('Text.')
+  p = Question()
+
+  # empty lists and the scratch pad are shared/created only when needed
+  assert p._answers is q._answers
+  assert p._scratch is None
+  with pytest.raises(AttributeError):
+    p.missing
+  assert p._scratch is None
+
+  with q._add_part('Part {x}.') as pp:
+    pp.scratch.x = 1
+  assert len(q._parts) == 1
+  assert len(p._parts) == 0
+  assert pp._scratch == {'x':1}
+  assert pp.text_str == 'Part 1.'
+
+  # answers only get a copy of the scratch pad if there is something in it
+  with p._add_answer( NumericalAnswer(1) ) as a:
+    pass
+  assert a._scratch is None
+  p.scratch.y = 2
+  with p._add_answer( NumericalAnswer(1) ) as a:
+    pass
+  assert a.scratch == {'y':2}
+
+  # other attributes can still be set, and are used when formatting
+  p.z = 3
+  p.add_text('z is {z}.')
+  p.format_text()
+  assert p.text_str == 'z is 3.'
+  p.join_str = '\n'
+  assert Question.join_str == ' '
+
+  # the copy constructor shares the lists with the original
+  c = Question(p)
+  c.add_text('More.')
+  assert p.text_str == 'z is 3.\nMore.'
+  assert c.join_str == '\n'
+
+  # answer defaults are shared by the class
+  m = MultipleChoiceAnswer()
+  assert m.randomize is False
+  m.randomize = True
+  assert MultipleChoiceAnswer().randomize is False
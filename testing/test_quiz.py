@@ -1,10 +1,13 @@
 
 import pytest
 import yaml
+import StringIO
+import os
 
 from pyHomework.Quiz import Quiz, BbQuiz
 from pyHomework.Answer import *
 from pyHomework.Emitter import *
+from pyHomework.Utils import LRUCache
 
 from pyErrorProp import *
 
@@ -230,3 +233,251 @@ def test_with_interface():
   text = q.emit(BbEmitter)
 
   assert text == 'MA\tthree\te\tcorrect\tf\tcorrect\nMC\tone\ta\tincorrect\tb\tcorrect\nMC\ttwo\tc\tcorrect\td\tincorrect'
+
+def test_emitter_dispatch():
+  class Base(object): pass
+  class Child(Base): pass
+  class Other(object): pass
+
+  class MyEmitter(Emitter):
+    def Base(self,obj):
+      return 'base'
+    @staticmethod
+    def Other(obj):
+      return 'other'
+
+  class MyChildEmitter(MyEmitter):
+    def Child(self,obj):
+      return 'child'
+
+  e = MyEmitter()
+  assert e(Child()) == 'base'
+  assert e(Base()) == 'base'
+  assert e(Other()) == 'other'
+  assert e(1) == ''
+  assert MyEmitter._dispatch[Child] == MyEmitter._dispatch[Base]
+
+  # each emitter class resolves its own handlers
+  e = MyChildEmitter()
+  assert e(Child()) == 'child'
+  assert e(Base()) == 'base'
+  assert Child not in Emitter._dispatch
+
+def test_emitter_streaming():
+  class Node(object): pass
+
+  class MyEmitter(Emitter):
+    @streaming
+    def Node(self,obj):
+      return iter(['a','b','c'])
+
+  class MyStringEmitter(MyEmitter):
+    def Node(self,obj):
+      return 'string'
+
+  assert MyEmitter()(Node()) == 'abc'
+  assert list(MyEmitter().fragments(Node())) == ['a','b','c']
+  # a string handler in a subclass overrides a streaming handler
+  assert MyStringEmitter()(Node()) == 'string'
+  assert list(MyStringEmitter().fragments(Node())) == ['string']
+
+  q = Quiz()
+  for i in range(3):
+    with q._add_question('Question %d.'%i, fmt=False) as qq:
+      a = MultipleChoiceAnswer()
+      a.add_choices('''
+      *yes
+      no
+      ''')
+      with qq._add_answer( a, fmt=False ):
+        pass
+      with qq._add_part('Part %d.'%i, fmt=False):
+        pass
+
+  # the string api gives the joined fragments
+  for emitter in [ BbEmitter(), LatexEmitter(), LatexEmitter('enumerate',labels=True), LatexKeyEmitter() ]:
+    fragments = list( q.emit_fragments(emitter) )
+    assert len(fragments) > 3
+    assert ''.join(fragments) == q.emit(emitter)
+
+  text = q.emit(LatexEmitter('enumerate'))
+  assert text.startswith('\\begin{enumerate}\n\\item Question 0.\n\\begin{enumerate}\n\\item yes\n\\item no\n\\end{enumerate}\n\\begin{enumerate}\n\\item Part 0.\n\\end{enumerate}\n\\item Question 1.')
+  assert text.endswith('\\item Part 2.\n\\end{enumerate}\n\\end{enumerate}')
+
+  stream = StringIO.StringIO()
+  LatexEmitter().write( q, stream )
+  assert stream.getvalue() == q.emit(LatexEmitter)
+
+  # functions are still supported by emit_fragments
+  assert list( q.emit_fragments( lambda quiz : 'text' ) ) == ['text']
+
+  # BbQuiz writes each question separately
+  class Stream(object):
+    def __init__(self):
+      self.writes = []
+    def write(self,text):
+      self.writes.append(text)
+
+  q = BbQuiz()
+  for i in range(3):
+    with q._add_question(r'Question \emph{%d}.'%i, fmt=False) as qq:
+      a = MultipleChoiceAnswer()
+      a.add_choices('''
+      *yes
+      no
+      ''')
+      with qq._add_answer( a, fmt=False ):
+        pass
+  stream = Stream()
+  q.write( stream )
+  assert len(stream.writes) == 5
+  assert ''.join(stream.writes) == '\n'.join( 'MC\tQuestion <em>%d</em>.\tyes\tcorrect\tno\tincorrect' % i for i in range(3) )
+
+def test_bb_macros():
+  class MyQuiz(BbQuiz):
+    def macro_both(self,args,opts):
+      return r'\emph{%s} \textbf{%s}' % (args[0],args[1])
+    def macro_opts(self,args,opts):
+      return '|'.join(opts)
+
+  q = MyQuiz()
+
+  assert q.expand_macros(r'an \emph{important} \textbf{\emph{point}}.') == 'an <em>important</em> <strong><em>point</em></strong>.'
+  # macros can return other macros
+  assert q.expand_macros(r'\both{one}{two}') == '<em>one</em> <strong>two</strong>'
+  # undefined macros and their arguments are left alone
+  assert q.expand_macros(r'\vec{\emph{F}} = m\vec{a}') == r'\vec{\emph{F}} = m\vec{a}'
+  assert q.expand_macros(r'\opts[a, b=1][c]{x}') == 'a|b=1|c'
+  # brackets inside of quotes don't need to match
+  assert q.expand_macros(r'\opts[alt="a]b"]') == 'alt="a]b"'
+  # macros are expanded from the outside in. a macro gets the raw text of its arguments,
+  # and the macros in its replacement are expanded after it.
+  q.macro_raw = lambda args,opts : '[%s]' % args[0].replace('\\','/')
+  assert q.expand_macros(r'\raw{\textbf{x}}') == r'[/textbf{x}]'
+  assert q.expand_macros(r'\textbf{\raw{\emph{x}}}') == r'<strong>[/emph{x}]</strong>'
+  # so math is rendered from the LaTeX, not from html
+  latex = []
+  q.macro_math = lambda args,opts : latex.append( args[0] ) or '<img>'
+  assert q.expand_macros(r'\math{\textbf{F} = m\textbf{a}}') == '<img>'
+  assert latex == [ r'\textbf{F} = m\textbf{a}' ]
+  del q.macro_raw, q.macro_math
+
+  # a group that a replacement leaves open is closed by the text that follows it
+  assert q.expand_macros(r'\textbf{"{\emph{"}"}') == '<strong>"{<em>"</strong>"</em>'
+  # a group that is never closed is not an argument, and a macro without its argument is left alone
+  assert q.expand_macros(r'\emph{\textbf{x}') == r'\emph{<strong>x</strong>'
+  assert q.expand_macros(r'\emph{x}{') == r'<em>x</em>{'
+  assert q.expand_macros(r'\emph and \textbf') == r'\emph and \textbf'
+
+  stream = StringIO.StringIO()
+  with q._add_question(r'Which is $x$ \emph{not}?', fmt=False) as qq:
+    a = MultipleChoiceAnswer()
+    a.add_choices('''
+    *\\textbf{this}
+    that
+    ''')
+    with qq._add_answer( a, fmt=False ):
+      pass
+  q.macro_math = lambda args,opts : '[%s]' % args[0]
+  q.write( stream )
+  assert stream.getvalue() == 'MC\tWhich is [x] <em>not</em>?\t<strong>this</strong>\tcorrect\tthat\tincorrect'
+
+def test_bb_tex2im(tmpdir, monkeypatch):
+  # a fake tex2im that logs its arguments and copies a png to the output file
+  bindir = tmpdir.mkdir('bin')
+  tex2im = bindir.join('tex2im')
+  tex2im.write('''#! /bin/sh
+echo "$@" >> '%s'
+case "$4" in *fail*) exit 1;; esac
+cp '%s' "$2"
+''' % (tmpdir.join('calls'), os.path.abspath('test1.png')))
+  tex2im.chmod(0755)
+  monkeypatch.setenv('PATH', str(bindir)+os.pathsep+os.environ['PATH'])
+
+  q = BbQuiz()
+  q.tex2im_cache_dir = str(tmpdir.mkdir('cache'))
+  with q._add_question(r'Is $x^2$ the same as \emph{\math{y}} or \math{fail}?', fmt=False) as qq:
+    a = MultipleChoiceAnswer()
+    a.add_choices('''
+    *yes
+    no
+    ''')
+    with qq._add_answer( a, fmt=False ):
+      pass
+
+  stream = StringIO.StringIO()
+  q.write( stream )
+  text = stream.getvalue()
+  assert text.count('<img src="data:image/png;base64,') == 2
+  assert '$fail$' in text
+  assert len(tmpdir.join('calls').readlines()) == 3
+  assert len(tmpdir.join('cache').listdir('*.png')) == 2
+
+  # images are only rendered once
+  stream = StringIO.StringIO()
+  q.write( stream )
+  assert stream.getvalue() == text
+  assert len(tmpdir.join('calls').readlines()) == 3
+
+def test_bb_img_html(tmpdir):
+  import base64, shutil
+  fn = str(tmpdir.join('image.png'))
+  shutil.copy( 'test1.png', fn )
+
+  q = BbQuiz()
+  q.image_cache = LRUCache(2)
+  html = q.make_img_html( fn, opts='alt="test"' )
+  with open(fn,'rb') as f:
+    assert html == '<img src="data:image/png;base64,%s" alt="test">' % base64.b64encode(f.read())
+  assert len(q.image_cache) == 1
+
+  # the encoded image is cached
+  assert q.make_img_html( fn, opts='alt="test"' ) == html
+  assert q.image_cache.hits == 1
+
+  # encoding in chunks gives the same result
+  q.image_cache.clear()
+  q.image_chunk_size = 10
+  assert q.make_img_html( fn, opts='alt="test"' ) == html
+
+  # changing the file invalidates the cache
+  shutil.copy( 'test2.png', fn )
+  html2 = q.make_img_html( fn, 'png' )
+  with open(fn,'rb') as f:
+    assert html2 == '<img src="data:image/png;base64,%s" >' % base64.b64encode(f.read())
+
+  # images larger than the cache are not kept
+  q.image_cache = LRUCache(2, maxbytes=100, sizeof=lambda chunks : sum( len(c) for c in chunks ))
+  assert q.make_img_html( fn, 'png' ) == html2
+  assert len(q.image_cache) == 0
+
+def test_bb_img_stream(tmpdir):
+  import base64, shutil
+  fn = str(tmpdir.join('image.png'))
+  shutil.copy( 'test1.png', fn )
+  with open(fn,'rb') as f:
+    html = '<img src="data:image/png;base64,%s" alt="%s">' % (base64.b64encode(f.read()),fn)
+
+  q = BbQuiz()
+  q.image_cache = LRUCache(2)
+  q.image_chunk_size = 30
+  with q._add_question(r'Look at \textbf{this} \includegraphics{%s}. Or \includegraphics{%s}'%(fn,fn), fmt=False) as qq:
+    a = MultipleChoiceAnswer()
+    a.add_choices('''
+    *yes
+    no
+    ''')
+    with qq._add_answer( a, fmt=False ):
+      pass
+
+  class Stream(object):
+    def __init__(self):
+      self.writes = []
+    def write(self, text):
+      self.writes.append(text)
+  stream = Stream()
+  q.write( stream )
+  assert ''.join(stream.writes) == 'MC\tLook at <strong>this</strong> %s. Or %s\tyes\tcorrect\tno\tincorrect' % (html,html)
+  # the images are written to the stream in chunks, not as part of the question text
+  assert max( len(w) for w in stream.writes ) < len(html)/4
+  assert q._images is None
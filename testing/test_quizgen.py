@@ -0,0 +1,151 @@
+import os, imp, StringIO
+
+QuizGen = imp.load_source( 'QuizGen', os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), '..', 'scripts', 'QuizGen.py' ) )
+
+def test_parse_markdown():
+  spec = QuizGen.parse_markdown( StringIO.StringIO( QuizGen.example_spec ) )
+
+  assert spec['title'] == 'Quiz'
+  assert spec['configuration'] == { 'make_key' : 'True', 'randomize' : { 'questions' : 'True', 'answers' : 'False' } }
+  assert len(spec['questions']) == 8
+
+  q = spec['questions'][0]
+  assert q['text'] == '(Multiple Choice) What is the correct answer?'
+  assert q['answer'] == { 'choices' : [ '^this is the correct answer', 'this is not the correct answer', 'this is also not the correct answer' ] }
+
+  q = spec['questions'][3]
+  assert q['text'] == '(Numerical Answer) Enter any number between 8 and 12.'
+  assert q['answer'] == { 'value' : '10 +/- 2' }
+
+  # continuation lines are joined to the question text
+  q = spec['questions'][5]
+  assert q['text'].startswith( r'Images can be included with the include graphics command: \includegraphics{./filename.png}   They are embedded' )
+
+  # markup is replaced with macros
+  q = spec['questions'][7]
+  assert q['text'] == r'\textbf{Some} markdown \emph{is} supported (not much), as well as the $\text{\LaTeX}$ math.'
+  assert q['answer'] == { 'choices' : [ '$y = mx + b$', r'^$\nabla \phi = \vec{E}$' ] }
+
+def test_parse_markdown_large():
+  text = '\n'.join( '%d. Question %d?\n    a. ^yes\n    b. no\n' % (i+1,i) for i in range(5000) )
+  spec = QuizGen.parse_markdown( StringIO.StringIO( text ) )
+
+  assert len(spec['questions']) == 5000
+  assert spec['questions'][4999] == { 'text' : 'Question 4999?', 'answer' : { 'choices' : [ '^yes', 'no' ] } }
+
+def test_parallel_jobs(tmpdir):
+  import argparse
+  args = argparse.Namespace( type='bb', render=False, override=None, debug=False, output=None, jobs=2, cache=False )
+
+  fns = []
+  for i in range(4):
+    fn = tmpdir.join('quiz-%d.md'%i)
+    fn.write( '\n'.join( '%d. Quiz %d question %d?\n    a. ^yes\n    b. no\n' % (j+1,i,j) for j in range(10) ) )
+    fns.append( str(fn) )
+  bad = tmpdir.join('bad.md')
+  bad.write( '    a. an answer without a question\n' )
+
+  for fn in fns:
+    assert QuizGen.process_file( fn, args ) == 0
+  serial = [ open( QuizGen.get_fn( fn, 'bb' ) ).read() for fn in fns ]
+  for fn in fns:
+    os.remove( QuizGen.get_fn( fn, 'bb' ) )
+
+  assert QuizGen.process_files( fns + [str(bad)], args ) == 1
+  parallel = [ open( QuizGen.get_fn( fn, 'bb' ) ).read() for fn in fns ]
+
+  assert parallel == serial
+  assert 'Quiz 3 question 9?' in parallel[3]
+
+def test_spec_cache(tmpdir, monkeypatch):
+  import argparse
+  monkeypatch.setenv( 'PYHOMEWORK_CACHE_DIR', str(tmpdir.join('cache')) )
+  args = argparse.Namespace( render=False, cache=True )
+
+  fn = tmpdir.join('quiz.md')
+  fn.write( QuizGen.example_spec )
+  spec = QuizGen.load_spec( str(fn), args )
+  assert len( tmpdir.join('cache','quizgen').listdir() ) == 1
+
+  # unchanged files are not parsed again (parsed specs are always written to the cache)
+  calls = []
+  write_spec_cache = QuizGen.write_spec_cache
+  monkeypatch.setattr( QuizGen, 'write_spec_cache', lambda fn,spec : calls.append(fn) or write_spec_cache(fn,spec) )
+  assert QuizGen.load_spec( str(fn), args ) == spec
+  assert calls == []
+
+  # changed files are
+  fn.write( QuizGen.example_spec.replace('Quiz','Test') )
+  assert QuizGen.load_spec( str(fn), args )['title'] == 'Test'
+  assert len(calls) == 1
+
+  # the key covers the text and the parser
+  key = QuizGen.spec_cache_file( 'text', '.md' )
+  assert key != QuizGen.spec_cache_file( 'text.', '.md' )
+  assert key != QuizGen.spec_cache_file( 'text', '.yaml' )
+  monkeypatch.setattr( QuizGen, 'SPEC_CACHE_VERSION', 0 )
+  assert key != QuizGen.spec_cache_file( 'text', '.md' )
+
+  # the least recently used specs are removed
+  monkeypatch.setattr( QuizGen, 'spec_cache_size', 3 )
+  fns = []
+  for i in range(5):
+    fns.append( tmpdir.join('quiz-%d.md'%i) )
+    fns[-1].write( '1. Question %d?\n    a. ^yes\n' % i )
+    QuizGen.load_spec( str(fns[-1]), args )
+  cached = tmpdir.join('cache','quizgen').listdir()
+  assert len(cached) == 3
+
+  # a hit counts as a use
+  for f in cached:
+    os.utime( str(f), (0,0) )
+  QuizGen.load_spec( str(fns[2]), args )
+  QuizGen.load_spec( str(fns[0]), args )
+  assert len( tmpdir.join('cache','quizgen').listdir() ) == 3
+  assert QuizGen.spec_cache_file( fns[2].read(), '.md' ) in [ str(f) for f in tmpdir.join('cache','quizgen').listdir() ]
+
+  # a corrupt cache file is ignored
+  monkeypatch.setattr( QuizGen, 'spec_cache_size', 256 )
+  tmpdir.join('cache','quizgen').join( os.path.basename( QuizGen.spec_cache_file( fn.read(), '.md' ) ) ).write('garbage')
+  assert QuizGen.load_spec( str(fn), args )['title'] == 'Test'
+
+  # templates are rendered every time, so values that change between runs are picked up
+  render = argparse.Namespace( render=True, cache=True )
+  tmpl = tmpdir.join('template.md')
+  tmpl.write( "{{py: import os}}\ntitle : {{os.environ['QUIZ_TITLE']}}\n\n1. Question?\n    a. ^yes\n" )
+  monkeypatch.setenv( 'QUIZ_TITLE', 'First' )
+  assert QuizGen.load_spec( str(tmpl), render )['title'] == 'First'
+  monkeypatch.setenv( 'QUIZ_TITLE', 'Second' )
+  assert QuizGen.load_spec( str(tmpl), render )['title'] == 'Second'
+  calls[:] = []
+  assert QuizGen.load_spec( str(tmpl), render )['title'] == 'Second'
+  assert calls == []
+
+  # and caching can be disabled
+  monkeypatch.setenv( 'PYHOMEWORK_CACHE_DIR', '' )
+  assert QuizGen.spec_cache_file( 'text', '.md' ) is None
+  assert QuizGen.load_spec( str(fn), args )['title'] == 'Test'
+
+def test_profile_jobs(tmpdir):
+  import argparse
+  from pyHomework import Timing
+  args = argparse.Namespace( type='bb', render=False, override=None, debug=False, output=None, jobs=2, cache=False )
+
+  fns = []
+  for i in range(4):
+    fn = tmpdir.join('quiz-%d.md'%i)
+    fn.write( '1. Question %d?\n    a. ^yes\n    b. no\n' % i )
+    fns.append( str(fn) )
+
+  Timing.enable()
+  try:
+    assert QuizGen.process_files( fns, args ) == 0
+    events = Timing.events()
+  finally:
+    Timing.disable()
+
+  # the events recorded by the workers are sent back with the results
+  files = [ e for e in events if e[0] == 'file' ]
+  assert sorted( e[-1]['file'] for e in files ) == fns
+  assert os.getpid() not in [ e[4] for e in files ]
+  assert set( ['parse','load','write','emit','macros'] ) <= set( e[0] for e in events )
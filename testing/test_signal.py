@@ -0,0 +1,91 @@
+import pytest
+import gc
+
+from pyHomework.Signal import Signal
+from pyHomework.Emitter import *
+from pyHomework.Quiz import Quiz
+
+class Listener(object):
+  def __init__(self, name):
+    self.name = name
+  def slot(self, x):
+    return '%s:%s' % (self.name, x)
+
+def test_signal_connect():
+  sig = Signal()
+  assert not sig
+  assert sig(1) == []
+
+  a = Listener('a')
+  b = Listener('b')
+  f = lambda x : 'f:%s' % x
+  sig.connect( a.slot )
+  sig.connect( f )
+  sig.connect( b.slot )
+  sig.connect( lambda x : None )
+  assert len(sig) == 4
+  assert a.slot in sig
+  assert f in sig
+  # None results are left out
+  assert sig(1) == [ 'a:1', 'f:1', 'b:1' ]
+
+  # connecting again moves the slot to the end
+  sig.connect( a.slot )
+  assert len(sig) == 4
+  assert sig(2) == [ 'f:2', 'b:2', 'a:2' ]
+
+  sig.disconnect( f )
+  sig.disconnect( b.slot )
+  # disconnecting a slot that isn't connected does nothing
+  sig.disconnect( f )
+  sig.disconnect( Listener('c').slot )
+  assert sig(3) == [ 'a:3' ]
+
+  sig.disconnectAll()
+  assert len(sig) == 0
+
+def test_signal_dead_slots():
+  sig = Signal()
+  listeners = [ Listener(str(i)) for i in range(5) ]
+  for l in listeners:
+    sig.connect( l.slot )
+
+  # methods don't keep their objects alive, and the slots of dead objects are removed
+  del listeners[1]
+  del listeners[2]
+  gc.collect()
+  assert len(sig) == 3
+  assert sig(0) == [ '0:0', '2:0', '4:0' ]
+
+  # slots can disconnect themselves (and others) while the signal is called, without skipping any
+  calls = []
+  sig = Signal()
+  def first(x):
+    calls.append('first')
+    sig.disconnect( first )
+    sig.disconnect( third )
+  def second(x):
+    calls.append('second')
+  def third(x):
+    calls.append('third')
+  for f in [first,second,third]:
+    sig.connect( f )
+  sig(0)
+  assert calls == [ 'first', 'second', 'third' ]
+  assert len(sig) == 1
+
+def test_emitter_signals():
+  e1 = LatexEmitter()
+  e2 = LatexEmitter()
+  assert e1.sig_post_question is e1.sig_post_question
+  assert e1.sig_post_question is not e2.sig_post_question
+
+  quiz = Quiz()
+  for i in range(2):
+    with quiz._add_question('Q%d' % i):
+      pass
+
+  e1.sig_post_question.connect( lambda i,question : 'after %d' % i if question is not None else None )
+  e1.sig_pre_question.connect( lambda i,question : 'end' if question is None else None )
+  assert quiz.emit(e1) == '\\begin{easylist}\n@ Q0\nafter 1\n@ Q1\nafter 2\nend\n\\end{easylist}'
+  assert quiz.emit(e2) == '\\begin{easylist}\n@ Q0\n@ Q1\n\\end{easylist}'
@@ -0,0 +1,87 @@
+import pytest
+import json, time, StringIO
+
+from pyHomework import Timing
+from pyHomework.Quiz import *
+from pyHomework.Utils import format_text
+
+@pytest.fixture
+def timing():
+  Timing.enable()
+  yield Timing
+  Timing.disable()
+
+@Timing.timed('sleep')
+def sleep( t ):
+  time.sleep( t )
+  return t
+
+def test_timing_disabled():
+  assert not Timing.enabled()
+  with Timing.stage('outer'):
+    assert sleep( 0 ) == 0
+  assert Timing.events() == []
+  assert Timing.summary() == {}
+
+def test_timing_stages(timing, tmpdir):
+  with Timing.stage('outer', note='test'):
+    sleep( 0.02 )
+    sleep( 0.01 )
+    with Timing.stage('inner'):
+      time.sleep( 0.01 )
+
+  stages = Timing.summary()
+  assert sorted( stages ) == ['inner','outer','sleep']
+  assert stages['sleep'][0] == 2
+  assert stages['sleep'][1] >= 0.03
+  calls,total,self_time = stages['outer']
+  assert calls == 1
+  assert total >= 0.04
+  # the self time doesn't include the stages inside of it
+  assert self_time < 0.01
+  assert abs( total - self_time - stages['sleep'][1] - stages['inner'][1] ) < 1e-6
+
+  out = StringIO.StringIO()
+  Timing.print_summary( out )
+  lines = out.getvalue().splitlines()
+  assert lines[0].split()[0] == 'stage'
+  assert lines[1].split()[0] == 'sleep'
+  assert lines[-1].startswith( 'wall time' )
+
+  fn = str( tmpdir.join('trace.json') )
+  Timing.write_trace( fn )
+  with open( fn ) as f:
+    trace = json.load( f )
+  events = trace['traceEvents']
+  assert [ e['name'] for e in events ] == ['sleep','sleep','inner','outer']
+  assert all( e['ph'] == 'X' for e in events )
+  assert events[-1]['ts'] == 0
+  assert events[-1]['args'] == { 'note' : 'test' }
+  assert events[-1]['dur'] >= 4e4
+
+  assert len( Timing.events( clear=True ) ) == 4
+  assert Timing.events() == []
+
+def test_timing_build(timing):
+  assert format_text( '{x} and {y}', x=1, y=2 ) == '1 and 2'
+
+  quiz = BbQuiz()
+  quiz.load( { 'questions' : [ { 'text' : r'Pick \emph{one}.', 'answer' : { 'choices' : [ '*a', 'b' ] } } ] } )
+  quiz.write( StringIO.StringIO() )
+
+  stages = Timing.summary()
+  assert stages['format_text'][0] >= 1
+  assert stages['emit'][0] == 1
+  assert stages['macros'][0] == 1
+
+def test_timing_report_once(tmpdir):
+  import os, sys, subprocess
+  # PYHOMEWORK_PROFILE and --profile both ask for a report. it is only made once, to the last file given.
+  env = dict( os.environ, PYHOMEWORK_PROFILE=str(tmpdir.join('env.json')) )
+  code = "from pyHomework import Timing\nwith Timing.stage('x'):\n  pass\nTiming.enable_report(%r)\n" % str(tmpdir.join('option.json'))
+  out = subprocess.check_output( [sys.executable, '-c', code], env=env, cwd=os.path.dirname( os.path.abspath(__file__) ) )
+  assert out.count( 'wall time' ) == 1
+  assert out.count( 'profile trace written' ) == 1
+  assert not tmpdir.join('env.json').check()
+  with open( str(tmpdir.join('option.json')) ) as f:
+    assert [ e['name'] for e in json.load( f )['traceEvents'] ] == ['x']
@@ -49,3 +49,47 @@ def test_legacy_text_formatting():
   text = r'''A = <A>. B < <B:.2f>. C > <C>'''
   assert r"A = 1 meter. B < 2.00 meter / second. C > <C>" == format_text( text, delimiters = ('<','>'), **context )
 
+
+def test_compiled_text():
+  t = compile_text( r'''\vec{A} = { A }. \vec{B} = {{B}}.''' )
+  assert t.segments == [ r'\vec', ('A','{A}'), ' = ', ('A ','{A }'), r'. \vec', ('B','{B}'), ' = {', ('B','{B}'), '}.' ]
+
+  # templates are only compiled once
+  assert t is compile_text( r'''\vec{A} = { A }. \vec{B} = {{B}}.''' )
+  assert t is not compile_text( r'''\vec{A} = { A }. \vec{B} = {{B}}.''', delimiters=('<','>') )
+
+  assert t.render( {'A' : 1, 'B' : 2} ) == r'''\vec1 = {A }. \vec2 = {2}.'''
+
+  # eval is only tried if string formatting fails
+  assert format_text( '<A+1> <A>', delimiters=('<','>'), try_eval=True, A = 1 ) == '2 1'
+  assert format_text( '<A+1> <A>', delimiters=('<','>'), A = 1 ) == '<A+1> 1'
+
+def test_lru_cache():
+  c = LRUCache(2)
+  c.put('a',1)
+  c.put('b',2)
+  assert c.get('a') == 1
+  c.put('c',3)
+  assert 'a' in c
+  assert 'b' not in c
+  assert c.get('b') is None
+  assert len(c) == 2
+  assert c.hits == 1
+  assert c.misses == 1
+
+  # the total size of the values can be limited too
+  c = LRUCache(10, maxbytes=6)
+  c.put('a','xx')
+  c.put('b','yyy')
+  assert c.nbytes == 5
+  c.put('c','zz')
+  assert 'a' not in c
+  assert c.nbytes == 5
+  # values that are too large are not cached
+  c.put('d','1234567')
+  assert 'd' not in c
+  assert len(c) == 2
+  c.put('b','y')
+  assert c.nbytes == 3
+  c.clear()
+  assert c.nbytes == 0
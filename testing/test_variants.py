@@ -0,0 +1,110 @@
+import pytest
+import os
+
+from pyHomework.Quiz import BbQuiz
+from pyHomework.Answer import *
+from pyHomework.Variants import QuizVariants, uniform, randint, choice
+
+from utils import Close
+
+def make_quiz():
+  quiz = BbQuiz()
+  with quiz._add_question('A ball is thrown straight up at {v0:~}. How high does it go?', fmt=False) as q:
+    with q._add_answer( NumericalAnswer( Q_(1,'m') ) ):
+      pass
+
+  with quiz._add_question('What is {a} times {b}?', fmt=False) as q2:
+    with q2._add_answer( NumericalAnswer( Q_(1,'') ) ):
+      pass
+
+  variants = QuizVariants( quiz, seed='test' )
+  variants.param( q, 'v0', uniform( 5, 15, 'm/s', sigfigs=2 ) )
+  variants.answer( q, lambda v0 : v0**2 / (2*Q_(9.8,'m/s^2')) )
+  variants.param( q2, 'a', randint( 2, 9 ) )
+  variants.param( q2, 'b', choice( [10,100,1000] ) )
+  variants.answer( q2, lambda a,b : a*b )
+
+  return quiz,variants
+
+def test_variants_generate():
+  quiz,variants = make_quiz()
+
+  vs = variants.generate( ['alice','bob','carol'] )
+  assert [ v.student for v in vs ] == ['alice','bob','carol']
+  assert len( set( v.seed for v in vs ) ) == 3
+
+  for v in vs:
+    v0,a,b = v.params
+    assert 5 <= v0.to('m/s').magnitude < 15
+    assert 2 <= a <= 9
+    assert b in [10,100,1000]
+
+    # the answers were computed in batch, but agree with the formula for each variant
+    assert Close( (v0**2/(2*Q_(9.8,'m/s^2'))).to('m').magnitude, v.answers[0].to('m').magnitude )
+    assert v.answers[1] == a*b
+
+  # a student's variant doesn't depend on the other students
+  v = variants.generate( ['zed','bob'] )[1]
+  assert v.seed == vs[1].seed
+  assert v.params == vs[1].params
+
+def test_variants_bind():
+  quiz,variants = make_quiz()
+  q = quiz._questions[0]
+  text = q.emit(BbEmitter)
+  assert '{v0:~}' in text
+
+  v = variants.generate( ['alice'] )[0]
+  with variants.bind( v ):
+    text = q.emit(BbEmitter)
+    assert '{v0:~}' not in text
+    assert '{:~}'.format( v.params[0] ) in text
+    assert q._answers[0].quantity == '{:.2E}'.format( v.answers[0].to('m') )
+
+  # the templates are restored
+  assert '{v0:~}' in q.emit(BbEmitter)
+  assert q._answers[0].quantity == '1.00E+00 meter'
+
+def test_variants_randomized_order_is_reproducible():
+  quiz,variants = make_quiz()
+  for i in range(5):
+    with quiz._add_question('Question %d' % i) as q:
+      a = MultipleChoiceAnswer()
+      a.add_choices('''
+      *one
+      two
+      three
+      four
+      ''')
+      with q._add_answer( a ):
+        pass
+  quiz.config('/randomize/questions',True)
+  quiz.config('/randomize/answers',True)
+
+  v = variants.generate( ['alice'] )[0]
+  with variants.bind( v ):
+    first = quiz.emit()
+  with variants.bind( v ):
+    assert quiz.emit() == first
+
+def test_variants_write(tmpdir):
+  quiz,variants = make_quiz()
+
+  d = str( tmpdir.join('out') )
+  vs = variants.write( d, ['alice','bob o.'] )
+
+  assert sorted( os.listdir(d) ) == ['quiz-alice.txt','quiz-bob_o..txt','quiz-key.txt']
+
+  with open( os.path.join(d,'quiz-alice.txt') ) as f:
+    text = f.read()
+  assert '{:~}'.format( vs[0].params[0] ) in text
+  assert 'What is %d times %d?' % tuple( vs[0].params[1:] ) in text
+
+  with open( os.path.join(d,'quiz-key.txt') ) as f:
+    lines = f.read().splitlines()
+  assert lines[0].split('\t') == ['student','seed','Q1 v0','Q2 a','Q2 b','Q1 answer','Q2 answer']
+  assert len(lines) == 3
+  row = lines[2].split('\t')
+  assert row[0] == 'bob o.'
+  assert row[1] == str(vs[1].seed)
+  assert row[-1] == '{:.2E}'.format( float(vs[1].answers[1]) )